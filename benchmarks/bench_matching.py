@@ -0,0 +1,145 @@
+"""
+Micro-benchmarks do matching (o caminho de `_buscar_vagas_compativeis`) em
+catálogos sintéticos de vários tamanhos.
+
+Uso:
+    python benchmarks/bench_matching.py [--sizes 100,10000,1000000] [--queries 200]
+    python benchmarks/bench_matching.py --save-baseline bench_matching.json
+    python benchmarks/bench_matching.py --baseline bench_matching.json   # sai com 1 se houver regressão
+
+`_buscar_vagas_compativeis` só monta o texto da experiência e chama
+`JobIndex.search_batch` no índice carregado; o benchmark mede esse mesmo
+caminho direto no JobIndex, sem subir o bot.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, Any, List
+
+import numpy as np
+import pandas as pd
+
+from common import latency_summary, print_table, check_baseline, save_results, REPO_ROOT
+from job_index import JobIndex, experience_text, stop_words
+
+
+CATALOG_PATH = os.path.join(REPO_ROOT, 'vagas_tecnologia_atualizado.csv')
+VERBOS = ['planejar', 'gerenciar', 'desenvolver', 'manter', 'otimizar', 'monitorar', 'projetar', 'testar']
+OBJETOS = ['aplicações', 'sistemas', 'redes', 'dados', 'infraestrutura', 'produtos', 'APIs', 'pipelines']
+
+
+def synthetic_catalog(size: int, seed: int = 42) -> pd.DataFrame:
+    """Jobs drawn from the titles, skills, modalities and cities of the real catalog"""
+    real = pd.read_csv(CATALOG_PATH, encoding='utf-8')
+    rng = np.random.default_rng(seed)
+    titles = real['nome_vaga'].unique()
+    skills = np.array(sorted({s.strip() for row in real['skills_necessarias'] for s in row.split(',')}))
+    modalidades = real['modalidade'].unique()
+    locais = real['local'].unique()
+
+    nomes = titles[rng.integers(0, len(titles), size)]
+    verbos = np.array(VERBOS)[rng.integers(0, len(VERBOS), size)]
+    objetos = np.array(OBJETOS)[rng.integers(0, len(OBJETOS), size)]
+    # Nomes de empresa dão ao vocabulário uma cauda longa, como em um catálogo real
+    empresas = pd.Series(rng.integers(0, max(1, size // 50), size)).map('empresa{}'.format)
+    skills_vaga = [', '.join(rng.choice(skills, rng.integers(3, 7), replace=False)) for _ in range(size)]
+    salarios = rng.integers(3000, 25000, size)
+
+    return pd.DataFrame({
+        'id_vaga': np.arange(1, size + 1),
+        'nome_vaga': nomes,
+        'descricao': [f"{n} na {e} responsável por {v} {o}. Necessário conhecimento em {s}."
+                      for n, e, v, o, s in zip(nomes, empresas, verbos, objetos, skills_vaga)],
+        'skills_necessarias': skills_vaga,
+        'salario': [f"R$ {s // 1000},{s % 1000:03d},00" for s in salarios],
+        'modalidade': modalidades[rng.integers(0, len(modalidades), size)],
+        'local': locais[rng.integers(0, len(locais), size)],
+    })
+
+
+def synthetic_experiences(catalog: pd.DataFrame, total: int, seed: int = 7) -> List[Dict[str, Any]]:
+    rng = np.random.default_rng(seed)
+    rows = catalog.iloc[rng.integers(0, len(catalog), total)]
+    return [
+        {
+            'cargo': nome,
+            'responsabilidades': f"Responsável por {VERBOS[i % len(VERBOS)]} {OBJETOS[i % len(OBJETOS)]}",
+            'habilidades': [s.strip() for s in skills.split(',')][:4],
+            'resultados': 'Reduzi custos em 20%',
+        }
+        for i, (nome, skills) in enumerate(zip(rows['nome_vaga'], rows['skills_necessarias']))
+    ]
+
+
+def bench_size(size: int, queries: int, batch_size: int) -> Dict[str, Dict[str, Any]]:
+    catalog = synthetic_catalog(size)
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'vagas.csv')
+        catalog.to_csv(csv_path, index=False)
+        start = time.perf_counter()
+        index = JobIndex.build(csv_path, stop_words=stop_words)
+        build_seconds = time.perf_counter() - start
+    del catalog
+
+    textos = [experience_text(exp) for exp in synthetic_experiences(index.vagas_df, queries)]
+    filtros = {'modalidade': 'Remoto', 'local': 'Recife', 'salario_minimo': 8000}
+    results = {f'build/{size}': {'n': 1, 'p50_ms': round(build_seconds * 1000, 3),
+                                 'p95_ms': round(build_seconds * 1000, 3), 'nnz': int(index.matrix.nnz)}}
+
+    index.search(textos[0])  # aquecimento
+    for case, run in (
+        ('busca', lambda texto: index.search(texto, top_n=5)),
+        ('busca_filtrada', lambda texto: index.search(texto, top_n=5, filtros=filtros)),
+    ):
+        latencias = []
+        for texto in textos:
+            start = time.perf_counter()
+            run(texto)
+            latencias.append(time.perf_counter() - start)
+        results[f'{case}/{size}'] = latency_summary(latencias)
+
+    # Lote: custo por consulta quando várias buscas são feitas juntas
+    latencias = []
+    for i in range(0, len(textos), batch_size):
+        lote = textos[i:i + batch_size]
+        start = time.perf_counter()
+        index.search_batch(lote, top_n=5)
+        latencias.extend([(time.perf_counter() - start) / len(lote)] * len(lote))
+    results[f'busca_lote{batch_size}/{size}'] = latency_summary(latencias)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Job matching micro-benchmarks on synthetic catalogs')
+    parser.add_argument('--sizes', default='100,10000,1000000', help='comma-separated catalog sizes')
+    parser.add_argument('--queries', type=int, default=200, help='searches per case')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--save-baseline', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare p95 against a saved run and fail on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p95 slowdown (0.25 = 25%%)')
+    args = parser.parse_args()
+
+    results = {}
+    for size in (int(s) for s in args.sizes.split(',')):
+        print(f"catálogo sintético de {size} vagas...", file=sys.stderr)
+        results.update(bench_size(size, args.queries, args.batch_size))
+
+    print_table([{'caso': case, **stats} for case, stats in results.items()],
+                ['caso', 'n', 'p50_ms', 'p95_ms', 'p99_ms', 'media_ms'])
+
+    if args.save_baseline:
+        save_results(results, args.save_baseline)
+    if args.baseline:
+        # A construção (uma amostra, com a importação do scikit-learn e a escrita do CSV) só é
+        # relatada: ruidosa demais para o gate de regressão
+        regressions = check_baseline({case: stats for case, stats in results.items() if not case.startswith('build/')},
+                                     args.baseline, tolerance=args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSÃO {regression}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+"""
+Partida a frio e memória por worker.
+
+Mede, em processos novos:
+  - importar o main.py até o bot ficar pronto, com o snapshot do índice já
+    salvo e sem ele (reconstrução a partir do CSV);
+  - a memória de N workers que importam tudo sozinhos contra N workers criados
+    por fork de um mestre com PRELOAD_APP=1 (o mecanismo do gunicorn.conf.py),
+    com WEB_CONCURRENCY=N como no gunicorn: sessões sem cache e MessageSids
+    em SQLite compartilhado.
+
+Uso:
+    python benchmarks/bench_startup.py [--runs 5] [--workers 4] [--catalog-size 100000]
+    python benchmarks/bench_startup.py --baseline bench_startup.json   # sai com 1 se houver regressão
+
+Memória por worker: USS (páginas só dele), PSS (compartilhadas divididas
+entre os processos) e RSS, lidos de /proc/<pid>/smaps_rollup. Cada worker
+faz uma busca e uma extração local antes da leitura, para tocar o índice.
+Sessões, candidatos e índices ficam em um diretório temporário.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, Any, List
+
+from common import latency_summary, print_table, check_baseline, save_results, REPO_ROOT
+
+
+HEAVY_MODULES = ['pandas', 'sklearn', 'openai']
+CATALOG_NAME = 'vagas_tecnologia_atualizado.csv'
+
+
+def memory_kb() -> Dict[str, int]:
+    """USS/PSS/RSS of this process in KB"""
+    fields = {}
+    try:
+        with open('/proc/self/smaps_rollup', 'r') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == 'kB':
+                    fields[parts[0].rstrip(':')] = int(parts[1])
+    except FileNotFoundError:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {'uss_kb': rss, 'pss_kb': rss, 'rss_kb': rss}
+    return {
+        'uss_kb': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+        'pss_kb': fields.get('Pss', 0),
+        'rss_kb': fields.get('Rss', 0),
+    }
+
+
+def warm_up(bot) -> None:
+    bot.job_index.search('desenvolvedor python com experiência em apis e docker', top_n=5)
+    bot.local_extractor.extract('Trabalhei como Desenvolvedor Backend usando Python e Docker')
+
+
+def child_import():
+    """Import main (the bot is built at import time) and report the time and memory"""
+    start = time.perf_counter()
+    import main
+    seconds = time.perf_counter() - start
+    warm_up(main.bot)
+    print(json.dumps({'segundos': seconds, 'pesados': [m for m in HEAVY_MODULES if m in sys.modules],
+                      **memory_kb()}))
+
+
+def child_preload(workers: int):
+    """Preload like the gunicorn master, fork the workers and report each one's memory"""
+    import gc
+    gc.disable()
+    os.environ['PRELOAD_APP'] = '1'
+    start = time.perf_counter()
+    import main
+    master_seconds = time.perf_counter() - start
+    master = memory_kb()
+
+    pipes, pids = [], []
+    for _ in range(workers):
+        gc.freeze()
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            gc.enable()
+            start = time.perf_counter()
+            main.init_bot()
+            seconds = time.perf_counter() - start
+            warm_up(main.bot)
+            with os.fdopen(write_fd, 'w') as out:
+                out.write(json.dumps({'segundos': seconds, **memory_kb()}))
+            # Espera os irmãos medirem também, para o PSS refletir o compartilhamento
+            time.sleep(2)
+            os._exit(0)
+        os.close(write_fd)
+        pipes.append(read_fd)
+        pids.append(pid)
+
+    results = []
+    for read_fd in pipes:
+        with os.fdopen(read_fd, 'r') as f:
+            results.append(json.loads(f.read()))
+    for pid in pids:
+        os.waitpid(pid, 0)
+    print(json.dumps({'mestre_segundos': master_seconds, 'mestre': master, 'workers': results}))
+
+
+def run_child(workdir: str, mode: str, env: Dict[str, str], workers: int = 0) -> Dict[str, Any]:
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', mode, '--workers', str(workers)],
+        cwd=workdir, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    # O bot pode imprimir mensagens antes; o resultado é a última linha
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def prepare_workdir(catalog_size: int) -> str:
+    workdir = tempfile.mkdtemp(prefix='bench_startup_')
+    catalog_path = os.path.join(workdir, CATALOG_NAME)
+    if catalog_size:
+        from bench_matching import synthetic_catalog
+        synthetic_catalog(catalog_size).to_csv(catalog_path, index=False)
+    else:
+        shutil.copy(os.path.join(REPO_ROOT, CATALOG_NAME), catalog_path)
+    return workdir
+
+
+def memory_summary(samples: List[Dict[str, int]]) -> Dict[str, Any]:
+    return {
+        'n': len(samples),
+        **{key: int(sum(s[key] for s in samples) / len(samples)) for key in ('uss_kb', 'pss_kb', 'rss_kb')},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold start time and per-worker memory')
+    parser.add_argument('--runs', type=int, default=5, help='cold imports per case')
+    parser.add_argument('--workers', type=int, default=4, help='workers in the memory comparison')
+    parser.add_argument('--catalog-size', type=int, default=0,
+                        help='synthetic catalog size (0 = the real catalog)')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--save-baseline', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare against a saved run and fail on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown/growth (0.25 = 25%%)')
+    args = parser.parse_args()
+
+    if args.child == 'import':
+        return child_import()
+    if args.child == 'preload':
+        return child_preload(args.workers)
+
+    workdir = prepare_workdir(args.catalog_size)
+    env = {
+        **os.environ,
+        'PYTHONPATH': os.pathsep.join([REPO_ROOT, os.environ.get('PYTHONPATH', '')]),
+        'OPENAI_API_KEY': os.getenv('OPENAI_API_KEY', 'fake'),
+        'SESSION_PATH': os.path.join(workdir, 'bot_state.db'),
+        'CANDIDATE_STORE': os.path.join(workdir, 'candidate_store'),
+        'LLM_CACHE_PATH': os.path.join(workdir, 'llm_cache.db'),
+        'MESSAGE_DEDUP_PATH': os.path.join(workdir, 'mensagens.db'),
+        'CATALOG_OOC_PATH': os.path.join(workdir, 'vagas_ooc'),
+        'CATALOG_POLL_INTERVAL': '0',
+        'PRELOAD_APP': '0',
+        'WEB_CONCURRENCY': '1',
+    }
+    index_paths = [os.path.join(workdir, 'vagas_index.pkl'), os.path.join(workdir, 'vagas_ooc')]
+
+    def remove_snapshots():
+        for path in index_paths:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+
+    partidas: Dict[str, List[Dict[str, Any]]] = {'sem_snapshot': [], 'com_snapshot': []}
+    for _ in range(args.runs):
+        remove_snapshots()
+        partidas['sem_snapshot'].append(run_child(workdir, 'import', env))
+        partidas['com_snapshot'].append(run_child(workdir, 'import', env))
+
+    results: Dict[str, Any] = {}
+    rows = []
+    for case, runs in partidas.items():
+        results[f'partida/{case}'] = latency_summary(run['segundos'] for run in runs)
+        rows.append({'caso': case, **results[f'partida/{case}'], 'pesados': ','.join(runs[-1]['pesados']) or '-'})
+    print_table(rows, ['caso', 'n', 'p50_ms', 'p95_ms', 'max_ms', 'pesados'])
+
+    # Workers independentes (cada um importa tudo) contra workers criados por fork do mestre
+    # Mesma configuração que o gunicorn.conf.py monta para N workers
+    workers_env = {**env, 'WEB_CONCURRENCY': str(args.workers)}
+    independentes = []
+    for _ in range(args.workers):
+        independentes.append(run_child(workdir, 'import', workers_env))
+    preload = run_child(workdir, 'preload', workers_env, workers=args.workers)
+    results['memoria/independente'] = memory_summary(independentes)
+    results['memoria/preload'] = memory_summary(preload['workers'])
+    results['partida/worker_preload'] = latency_summary(w['segundos'] for w in preload['workers'])
+
+    print()
+    print_table([{'caso': case.split('/')[1], **stats} for case, stats in results.items() if case.startswith('memoria/')],
+                ['caso', 'n', 'uss_kb', 'pss_kb', 'rss_kb'])
+    total_independente = sum(w['pss_kb'] for w in independentes)
+    total_preload = sum(w['pss_kb'] for w in preload['workers']) + preload['mestre']['pss_kb']
+    print(f"\n{args.workers} workers: PSS total {total_independente / 1024:.0f} MB independentes, "
+          f"{total_preload / 1024:.0f} MB com preload (mestre incluído); mestre carregou em "
+          f"{preload['mestre_segundos'] * 1000:.0f} ms e cada worker ficou pronto em "
+          f"{results['partida/worker_preload']['p50_ms']:.0f} ms após o fork (arquivos em {workdir})")
+
+    if args.save_baseline:
+        save_results(results, args.save_baseline)
+    if args.baseline:
+        regressions = check_baseline({k: v for k, v in results.items() if k.startswith('partida/')}, args.baseline,
+                                     tolerance=args.tolerance)
+        regressions += check_baseline({k: v for k, v in results.items() if k.startswith('memoria/')}, args.baseline,
+                                      metric='uss_kb', tolerance=args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSÃO {regression}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
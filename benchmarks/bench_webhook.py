@@ -0,0 +1,172 @@
+"""
+Replay de carga do webhook: milhares de telefones simulados percorrem o fluxo
+completo (apresentar -> ... -> selecionar_vaga) com posts no formato do
+Twilio contra o `app` Flask, com o OpenAI substituído pelo servidor falso.
+
+Uso:
+    python benchmarks/bench_webhook.py [--phones 2000] [--concurrency 16] [--llm-latency 0.2]
+    python benchmarks/bench_webhook.py --baseline bench_webhook.json   # sai com 1 se houver regressão
+
+Relata p50/p95/p99 por passo da conversa, vazão e o crescimento do store de
+sessões e do store de candidatos. Sessões, candidatos e cache de extração
+ficam em um diretório temporário; nada do diretório do bot é alterado.
+"""
+import argparse
+import contextlib
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Tuple
+
+from common import latency_summary, dir_size, print_table, check_baseline, save_results, REPO_ROOT
+
+
+# Resposta a "mais uma experiência?": o "não", às vezes com preferências de vaga
+SEM_MAIS_EXPERIENCIAS = ['não', 'não, remoto', 'não, Recife', 'não, híbrido em São Paulo', 'não, remoto acima de 8 mil',
+                         'não, presencial, Curitiba, 5000']
+RESPONSABILIDADES = ['desenvolvia APIs', 'mantinha pipelines de dados', 'gerenciava a infraestrutura em nuvem',
+                     'testava as aplicações', 'planejava as sprints do time']
+
+
+def conversation(i: int, titles: List[str], skills: List[str], rng: random.Random) -> List[Tuple[str, str]]:
+    """(passo, mensagem) of one candidate walking the whole flow"""
+    experiencia = (
+        f"Trabalhei como {rng.choice(titles)} por {rng.randint(1, 8)} anos, onde {rng.choice(RESPONSABILIDADES)} "
+        f"usando {', '.join(rng.sample(skills, 3))}. Reduzi o tempo de entrega em {rng.randint(5, 60)}%."
+    )
+    return [
+        ('apresentar', 'Olá'),
+        ('email', f'candidato{i}@bench.example.com'),
+        ('nome_completo', f'Candidato {i} da Silva'),
+        ('data_nascimento', f'{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(1960, 2004)}'),
+        ('experiencia', experiencia),
+        ('confirmar_experiencia', rng.choice(SEM_MAIS_EXPERIENCIAS)),
+        ('selecionar_vaga', '1'),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Webhook load replay with a stubbed OpenAI backend')
+    parser.add_argument('--phones', type=int, default=2000, help='simulated phone numbers (one conversation each)')
+    parser.add_argument('--concurrency', type=int, default=16, help='conversations in flight at the same time')
+    parser.add_argument('--llm-latency', type=float, default=0.0, help='fake LLM latency per call (seconds)')
+    parser.add_argument('--llm-port', type=int, default=8099)
+    parser.add_argument('--extraction-mode', default='llm', help='EXTRACTION_MODE of the bot (llm, hybrid, local)')
+    parser.add_argument('--samples', type=int, default=10, help='store size samples during the run')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--save-baseline', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare p95 against a saved run and fail on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p95 slowdown (0.25 = 25%%)')
+    args = parser.parse_args()
+
+    import fake_llm
+
+    workdir = tempfile.mkdtemp(prefix='bench_webhook_')
+    session_path = os.path.join(workdir, 'bot_state.db')
+    store_path = os.path.join(workdir, 'candidate_store')
+    llm_server = fake_llm.serve(args.llm_port, latency=args.llm_latency)
+    os.environ.update({
+        'OPENAI_API_BASE': f'http://127.0.0.1:{args.llm_port}/v1',
+        'OPENAI_API_KEY': os.getenv('OPENAI_API_KEY', 'fake'),
+        'SESSION_PATH': session_path,
+        'CANDIDATE_STORE': store_path,
+        'LLM_CACHE_PATH': os.path.join(workdir, 'llm_cache.db'),
+        # Só o CSV do catálogo é lido do repositório; tudo o que o bot grava vai para o workdir
+        'CATALOG_PATH': os.path.join(REPO_ROOT, 'vagas_tecnologia_atualizado.csv'),
+        'CATALOG_INDEX_PATH': os.path.join(workdir, 'vagas_index.pkl'),
+        'CATALOG_OOC_PATH': os.path.join(workdir, 'vagas_ooc'),
+        'CANDIDATE_INDEX_PATH': os.path.join(workdir, 'candidatos_index.pkl'),
+        'SESSION_LEGACY_JSON': os.path.join(workdir, 'bot_state.json'),
+        'MESSAGE_DEDUP_PATH': os.path.join(workdir, 'mensagens.db'),
+        'EXTRACTION_MODE': args.extraction_mode,
+        'ASYNC_REPLIES': '0',
+        'MESSAGE_SENDER': 'stub',
+    })
+    import main as bot_module
+
+    app, bot = bot_module.app, bot_module.bot
+    rng = random.Random(args.seed)
+    skills, titles = bot.job_index.catalog_terms()
+    skills = sorted(skills)
+    conversations = [conversation(i, titles, skills, rng) for i in range(args.phones)]
+
+    latencies: Dict[str, List[float]] = {step: [] for step, _ in conversations[0]}
+    errors = {'http': 0, 'fluxo_incompleto': 0}
+    lock = threading.Lock()
+    sizes = []
+    done = [0]
+    sample_every = max(1, args.phones // args.samples)
+    local = threading.local()
+
+    def sample_sizes():
+        bot.session_store.flush()
+        sizes.append({'conversas': done[0], 'sessoes_bytes': dir_size(session_path) + dir_size(f'{session_path}-wal'),
+                      'candidatos_bytes': dir_size(store_path)})
+
+    def run(i: int):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+        phone = f'whatsapp:+5581{i:09d}'
+        step_latencies = []
+        reply = b''
+        for seq, (step, body) in enumerate(conversations[i]):
+            start = time.perf_counter()
+            response = client.post('/', data={'From': phone, 'Body': body, 'MessageSid': f'SMbench{i}x{seq}'})
+            step_latencies.append((step, time.perf_counter() - start))
+            reply = response.data
+            if response.status_code != 200:
+                with lock:
+                    errors['http'] += 1
+        with lock:
+            for step, seconds in step_latencies:
+                latencies[step].append(seconds)
+            if 'candidatou'.encode() not in reply:
+                errors['fluxo_incompleto'] += 1
+            done[0] += 1
+            if done[0] % sample_every == 0:
+                sample_sizes()
+
+    # As mensagens de depuração do bot atrapalhariam a saída e a medição
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(run, range(args.phones)))
+        elapsed = time.perf_counter() - start
+        sample_sizes()
+
+    llm_server.shutdown()
+    results: Dict[str, Any] = {step: latency_summary(values) for step, values in latencies.items()}
+    results['total'] = latency_summary(v for values in latencies.values() for v in values)
+
+    print_table([{'passo': step, **stats} for step, stats in results.items()],
+                ['passo', 'n', 'p50_ms', 'p95_ms', 'p99_ms', 'media_ms', 'max_ms'])
+    messages = results['total']['n']
+    print(f"\n{args.phones} conversas, {messages} mensagens em {elapsed:.1f}s: "
+          f"{messages / elapsed:.1f} mensagens/s, {args.phones / elapsed:.1f} conversas/s "
+          f"(concorrência {args.concurrency}, LLM falso {args.llm_latency * 1000:.0f} ms)")
+    print(f"erros: {errors}; extração: {dict(bot.extraction_paths)}; llm: {bot.llm_client.stats()['chamadas']} chamadas")
+    print()
+    print_table(sizes, ['conversas', 'sessoes_bytes', 'candidatos_bytes'])
+    final = sizes[-1]
+    print(f"por conversa: sessões {final['sessoes_bytes'] / args.phones:.0f} B, "
+          f"candidatos {final['candidatos_bytes'] / args.phones:.0f} B (arquivos em {workdir})")
+
+    results['vazao'] = {'mensagens_por_s': round(messages / elapsed, 2), 'erros': errors, 'tamanhos': sizes}
+    if args.save_baseline:
+        save_results(results, args.save_baseline)
+    if args.baseline:
+        regressions = check_baseline({k: v for k, v in results.items() if k != 'vazao'}, args.baseline,
+                                     tolerance=args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSÃO {regression}")
+        sys.exit(1 if regressions or errors['http'] else 0)
+    bot.session_store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+import json
+import os
+import sys
+from typing import Dict, Any, List, Iterable
+
+import numpy as np
+
+# Os benchmarks importam os módulos da raiz do repositório
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def latency_summary(seconds: Iterable[float]) -> Dict[str, float]:
+    """p50/p95/p99/mean/max in milliseconds"""
+    values = np.asarray(list(seconds), dtype=np.float64) * 1000
+    if not len(values):
+        return {'n': 0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        'n': int(len(values)),
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'media_ms': round(float(values.mean()), 3),
+        'max_ms': round(float(values.max()), 3),
+    }
+
+
+def dir_size(path: str) -> int:
+    """Total bytes of a file, or of every file under a directory"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def print_table(rows: List[Dict[str, Any]], columns: List[str]):
+    widths = [max(len(column), *(len(str(row.get(column, ''))) for row in rows)) for column in columns]
+    print('  '.join(column.rjust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        print('  '.join(str(row.get(column, '')).rjust(width) for column, width in zip(columns, widths)))
+
+
+def check_baseline(results: Dict[str, Dict[str, Any]], baseline_path: str, metric: str = 'p95_ms',
+                   tolerance: float = 0.25) -> List[str]:
+    """
+    Compare `metric` of every case against a saved run. Returns the cases that
+    got slower than the baseline by more than `tolerance` (0.25 = 25%).
+    """
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = []
+    for case, stats in results.items():
+        before = baseline.get(case, {}).get(metric)
+        after = stats.get(metric)
+        if before and after and after > before * (1 + tolerance):
+            regressions.append(f"{case}: {metric} {before:.3f} -> {after:.3f} (+{(after / before - 1) * 100:.0f}%)")
+    return regressions
+
+
+def save_results(results: Dict[str, Any], path: str):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
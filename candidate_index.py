@@ -0,0 +1,208 @@
+import os
+import pickle
+import threading
+import time
+import uuid
+from typing import List, Dict, Any, Optional
+
+import scipy.sparse as sp
+
+from candidate_store import CandidateStore
+from job_index import JobIndex, candidate_profile_text, top_k
+
+
+class CandidateIndex:
+    """
+    Índice reverso: vetores de perfil dos candidatos salvos, no mesmo espaço
+    TF-IDF do índice de vagas, para responder "melhores candidatos para a vaga X".
+
+    Cada candidato (mesma chave do CandidateStore) ocupa uma linha. Registros
+    anexados ao store depois do último `seq` lido entram como linhas pendentes
+    e são vetorizados em lote na consulta seguinte; um novo cadastro da mesma
+    chave marca a linha antiga como removida. O índice é revetorizado por
+    inteiro quando a versão do catálogo muda ou quando há muitas linhas removidas.
+    """
+
+    def __init__(self, store: CandidateStore, path: Optional[str] = None, refresh_interval: float = 60.0):
+        self.store = store
+        self.path = path
+        self.refresh_interval = refresh_interval
+
+        self._keys: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._texts: List[Optional[str]] = []
+        self._info: List[Optional[Dict[str, Any]]] = []  # None = linha substituída por um cadastro mais novo
+        self._last_seq = 0  # último registro do store já indexado
+        self._dead = set()
+        self._matrix = None
+        self._version = None
+        self._last_refresh = 0.0
+        self._refresh_requested = False
+        self._unsaved = False  # mudanças que ainda não estão no arquivo salvo
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    def _load(self):
+        if self.path is None:
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                data = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return
+        self._keys = data['keys']
+        self._texts = data['texts']
+        self._info = data['info']
+        self._last_seq = data['last_seq']
+        self._version = data['version']
+        self._matrix = data['matrix']
+        self._dead = {row for row, info in enumerate(self._info) if info is None}
+        self._rows = {key: row for row, key in enumerate(self._keys) if row not in self._dead}
+
+    def save(self):
+        if self.path is None:
+            return
+        with self._lock:
+            data = {
+                'keys': self._keys,
+                'texts': self._texts,
+                'info': self._info,
+                'last_seq': self._last_seq,
+                'version': self._version,
+                'matrix': self._matrix,
+            }
+            tmp_path = f"{self.path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+            self._unsaved = False
+
+    def refresh(self, blocking: bool = True) -> int:
+        """
+        Queue the registrations appended to the store since the last refresh.
+        With `blocking=False` (the webhook) it gives up when a query is busy with the
+        index, e.g. re-vectorizing everything, and the next query refreshes instead.
+        """
+        if not self._lock.acquire(blocking=blocking):
+            self._refresh_requested = True
+            return 0
+        added = 0
+        try:
+            if not self._loaded:
+                # Ainda não carregado: a primeira consulta lê tudo de uma vez
+                return 0
+            for seq, record in self.store.iter_latest(since_seq=self._last_seq):
+                self.add(record['data'], key=record['key'])
+                self._last_seq = seq
+                added += 1
+            self._last_refresh = time.monotonic()
+            self._refresh_requested = False
+            if added:
+                self._unsaved = True
+        finally:
+            self._lock.release()
+        return added
+
+    def add(self, candidate_data: Dict[str, Any], key: str):
+        """Add or replace one candidate"""
+        text = candidate_profile_text(candidate_data)
+        info = {
+            'email': candidate_data.get('email'),
+            'nome_completo': candidate_data.get('nome_completo'),
+            'telefone': candidate_data.get('telefone'),
+        }
+        with self._lock:
+            previous = self._rows.get(key)
+            if previous is not None:
+                self._info[previous] = None
+                self._texts[previous] = None
+                self._dead.add(previous)
+            self._rows[key] = len(self._keys)
+            self._keys.append(key)
+            self._texts.append(text)
+            self._info.append(info)
+
+    def _ensure_ready(self, job_index: JobIndex):
+        with self._lock:
+            if not self._loaded:
+                self._load()
+                self._loaded = True
+                # Cadastros anexados depois do arquivo salvo (ou todos, sem arquivo)
+                self._refresh_requested = True
+            # Outros processos também gravam no store: leitura periódica dos novos registros
+            if self._refresh_requested or time.monotonic() - self._last_refresh >= self.refresh_interval:
+                self.refresh()
+
+            indexed = 0 if self._matrix is None else self._matrix.shape[0]
+            if self._version != job_index.version or len(self._dead) > 0.2 * max(1, len(self._keys)):
+                self._compact(job_index)
+                self._unsaved = True
+            elif indexed < len(self._keys):
+                # Linhas pendentes já substituídas (texto None) entram vazias: ficam zeradas em `_dead`
+                pending = job_index.vectorizer.transform([text or '' for text in self._texts[indexed:]])
+                self._matrix = pending if self._matrix is None else sp.vstack([self._matrix, pending], format='csr')
+                self._unsaved = True
+            if self._unsaved:
+                self.save()
+
+    def _compact(self, job_index: JobIndex):
+        """Drop replaced rows and vectorize every profile with the current catalog vocabulary"""
+        alive = [row for row in range(len(self._keys)) if row not in self._dead]
+        self._keys = [self._keys[row] for row in alive]
+        self._texts = [self._texts[row] for row in alive]
+        self._info = [self._info[row] for row in alive]
+        self._rows = {key: row for row, key in enumerate(self._keys)}
+        self._dead = set()
+        self._matrix = job_index.vectorizer.transform(self._texts) if self._texts else None
+        self._version = job_index.version
+
+    def top_candidates(self, id_vaga: Any, job_index: JobIndex, top_n: int = 10) -> Optional[List[Dict[str, Any]]]:
+        """Best saved candidates for a job, or None when the job is not in the catalog"""
+        row = job_index.row_of(id_vaga)
+        if row is None:
+            return None
+        with self._lock:
+            self._ensure_ready(job_index)
+            matrix = self._matrix
+            # Cópias: um add() concorrente marca linhas antigas como None
+            info = list(self._info)
+            dead = list(self._dead)
+        if matrix is None:
+            return []
+
+        similaridades = (matrix @ job_index.row_vector(row).T).toarray().T
+        similaridades[0, dead] = 0
+        top = top_k(similaridades, top_n)[0]
+        return [
+            {**info[idx], 'similaridade': float(similaridades[0, idx])}
+            for idx in top if similaridades[0, idx] > 0
+        ]
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from job_index import stop_words
+
+    parser = argparse.ArgumentParser(description='Best saved candidates for a job')
+    parser.add_argument('id_vaga')
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--store', default='candidate_store')
+    parser.add_argument('--catalog', default='vagas_tecnologia_atualizado.csv')
+    parser.add_argument('--index', default='vagas_index.pkl')
+    parser.add_argument('--candidate-index', default='candidatos_index.pkl')
+    args = parser.parse_args()
+
+    job_index = JobIndex.load_or_build(args.catalog, args.index, stop_words=stop_words)
+    candidate_index = CandidateIndex(CandidateStore(args.store), path=args.candidate_index, refresh_interval=0)
+    start = time.perf_counter()
+    candidatos = candidate_index.top_candidates(args.id_vaga, job_index, top_n=args.top)
+    elapsed = (time.perf_counter() - start) * 1000
+    if candidatos is None:
+        parser.error(f"vaga {args.id_vaga} não encontrada no catálogo")
+    for posicao, candidato in enumerate(candidatos, 1):
+        print(f"{posicao:>3}. {candidato['similaridade']:.3f}  {candidato['nome_completo']} <{candidato['email']}>")
+    print(f"{len(candidatos)} de {len(candidate_index)} candidatos ({elapsed:.1f} ms)")
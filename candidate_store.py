@@ -0,0 +1,363 @@
+"""
+Armazenamento de candidatos em segmentos JSONL só-de-anexação, particionados
+em shards, com um índice SQLite por email e telefone.
+
+Layout:
+    <root>/shard-07/segment-000003.jsonl   uma linha JSON por cadastro
+    <root>/index.db                        último cadastro de cada candidato
+
+Uso:
+    python candidate_store.py migrate [candidates]
+    python candidate_store.py export saida.jsonl|saida.csv
+    python candidate_store.py compact
+    python candidate_store.py reindex
+    python candidate_store.py lookup <email|telefone>
+"""
+import csv
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager, closing
+from datetime import datetime
+from typing import Dict, Any, Optional, Iterator, Tuple, List, Type
+
+try:
+    import fcntl
+except ImportError:  # Windows: só há o lock entre threads
+    fcntl = None
+
+
+SEGMENT_PATTERN = re.compile(r'^segment-(\d{6})\.jsonl$')
+
+
+def normalize_email(email: Optional[str]) -> Optional[str]:
+    return email.strip().casefold() if email else None
+
+
+def normalize_phone(phone: Optional[str]) -> Optional[str]:
+    digits = ''.join(filter(str.isdigit, phone or ''))
+    return digits or None
+
+
+class CandidateStore:
+    """
+    Cada cadastro é uma linha anexada ao segmento ativo de um shard (escolhido
+    pelo hash do email), e o índice aponta para (shard, segmento, offset) do
+    último cadastro de cada candidato. Segmentos passam de `max_segment_bytes`
+    e são rotacionados; `compact` reescreve só os registros vivos.
+
+    Leitores não bloqueiam a compactação: ela grava as novas posições no índice
+    antes de apagar os segmentos antigos, então quem leu uma posição antiga e
+    não encontra mais o segmento relê a entrada do índice e tenta de novo.
+    """
+
+    def __init__(self, root: str, shards: int = 16, max_segment_bytes: int = 64 * 1024 * 1024,
+                 encoder: Type[json.JSONEncoder] = json.JSONEncoder):
+        self.root = root
+        self.shards = shards
+        self.max_segment_bytes = max_segment_bytes
+        self.encoder = encoder
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._local = threading.local()
+
+        os.makedirs(root, exist_ok=True)
+        conn = self._connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS records (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT NOT NULL UNIQUE,
+                email TEXT,
+                phone TEXT,
+                shard INTEGER NOT NULL,
+                segment INTEGER NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                saved_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS records_email ON records (email);
+            CREATE INDEX IF NOT EXISTS records_phone ON records (phone);
+            CREATE INDEX IF NOT EXISTS records_location ON records (shard, segment, offset);
+        """)
+
+    def _index_path(self) -> str:
+        return os.path.join(self.root, 'index.db')
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self._index_path(), timeout=30, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _shard_dir(self, shard: int) -> str:
+        return os.path.join(self.root, f"shard-{shard:02d}")
+
+    def segment_path(self, shard: int, segment: int) -> str:
+        return os.path.join(self._shard_dir(shard), f"segment-{segment:06d}.jsonl")
+
+    def _segments(self, shard: int) -> List[int]:
+        try:
+            names = os.listdir(self._shard_dir(shard))
+        except FileNotFoundError:
+            return []
+        return sorted(int(m.group(1)) for m in map(SEGMENT_PATTERN.match, names) if m)
+
+    @contextmanager
+    def _shard_lock(self, shard: int):
+        """Lock between threads and, where fcntl exists, between processes (gunicorn workers)"""
+        with self._locks[shard]:
+            os.makedirs(self._shard_dir(shard), exist_ok=True)
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self._shard_dir(shard), '.lock'), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def candidate_key(candidate_data: Dict[str, Any]) -> str:
+        """Stable identity of a candidate: email, else phone"""
+        key = normalize_email(candidate_data.get('email')) or normalize_phone(candidate_data.get('telefone'))
+        if not key:
+            raise ValueError("Candidato sem email nem telefone")
+        return key
+
+    def _shard_of(self, key: str) -> int:
+        return zlib.crc32(key.encode('utf-8')) % self.shards
+
+    def append(self, candidate_data: Dict[str, Any], saved_at: Optional[str] = None) -> str:
+        """Append one registration and point the index to it. Returns its location."""
+        key = self.candidate_key(candidate_data)
+        saved_at = saved_at or datetime.now().isoformat(timespec='seconds')
+        line = json.dumps({'key': key, 'saved_at': saved_at, 'data': candidate_data},
+                          ensure_ascii=False, cls=self.encoder).encode('utf-8') + b'\n'
+        shard = self._shard_of(key)
+
+        with self._shard_lock(shard):
+            segments = self._segments(shard)
+            segment = segments[-1] if segments else 1
+            path = self.segment_path(shard, segment)
+            if os.path.exists(path) and os.path.getsize(path) + len(line) > self.max_segment_bytes:
+                segment += 1
+                path = self.segment_path(shard, segment)
+            with open(path, 'a+b') as f:
+                offset = f.seek(0, os.SEEK_END)
+                if offset:
+                    # Escrita anterior interrompida: fecha a linha truncada para não emendar nela
+                    f.seek(offset - 1)
+                    if f.read(1) != b'\n':
+                        f.write(b'\n')
+                        offset += 1
+                f.write(line)
+            self._index_record(key, candidate_data, shard, segment, offset, len(line), saved_at)
+
+        return f"shard-{shard:02d}/segment-{segment:06d}.jsonl@{offset}"
+
+    def _index_record(self, key: str, candidate_data: Dict[str, Any], shard: int, segment: int,
+                      offset: int, length: int, saved_at: str):
+        self._connection().execute("""
+            INSERT OR REPLACE INTO records (key, email, phone, shard, segment, offset, length, saved_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (key, normalize_email(candidate_data.get('email')), normalize_phone(candidate_data.get('telefone')),
+              shard, segment, offset, length, saved_at))
+
+    def read(self, shard: int, segment: int, offset: int, length: int) -> Dict[str, Any]:
+        """Read one record given its index entry"""
+        with open(self.segment_path(shard, segment), 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.read(length))
+
+    def _read_indexed(self, key: str, shard: int, segment: int, offset: int, length: int) -> Dict[str, Any]:
+        """Read a record found in the index, following it once if `compact` moved it in the meantime"""
+        try:
+            return self.read(shard, segment, offset, length)
+        except FileNotFoundError:
+            # Conexão nova: a da thread pode estar presa ao snapshot de um cursor ainda aberto
+            with closing(sqlite3.connect(self._index_path(), timeout=30)) as conn:
+                row = conn.execute('SELECT shard, segment, offset, length FROM records WHERE key = ?',
+                                   (key,)).fetchone()
+            if row is None or row == (shard, segment, offset, length):
+                raise
+            return self.read(*row)
+
+    def _lookup(self, column: str, value: Optional[str]) -> Optional[Dict[str, Any]]:
+        if not value:
+            return None
+        row = self._connection().execute(
+            f'SELECT key, shard, segment, offset, length FROM records WHERE {column} = ? ORDER BY seq DESC LIMIT 1',
+            (value,)
+        ).fetchone()
+        return self._read_indexed(*row)['data'] if row else None
+
+    def get_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        return self._lookup('email', normalize_email(email))
+
+    def get_by_phone(self, phone: str) -> Optional[Dict[str, Any]]:
+        return self._lookup('phone', normalize_phone(phone))
+
+    def iter_index(self, since_seq: int = 0) -> Iterator[Tuple]:
+        """(seq, key, shard, segment, offset, length) of the latest record of each candidate, in seq order"""
+        return self._connection().execute(
+            'SELECT seq, key, shard, segment, offset, length FROM records WHERE seq > ? ORDER BY seq', (since_seq,)
+        )
+
+    def iter_latest(self, since_seq: int = 0) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Stream (seq, record) for the latest registration of every candidate"""
+        for seq, key, shard, segment, offset, length in self.iter_index(since_seq):
+            yield seq, self._read_indexed(key, shard, segment, offset, length)
+
+    def __len__(self) -> int:
+        return self._connection().execute('SELECT COUNT(*) FROM records').fetchone()[0]
+
+    def compact(self) -> Dict[str, int]:
+        """Rewrite every shard keeping only the records the index points to"""
+        stats = {'registros_mantidos': 0, 'bytes_antes': 0, 'bytes_depois': 0}
+        conn = self._connection()
+        for shard in range(self.shards):
+            with self._shard_lock(shard):
+                old_segments = self._segments(shard)
+                if not old_segments:
+                    continue
+                stats['bytes_antes'] += sum(os.path.getsize(self.segment_path(shard, s)) for s in old_segments)
+
+                rows = conn.execute(
+                    'SELECT seq, segment, offset, length FROM records WHERE shard = ? ORDER BY seq', (shard,)
+                ).fetchall()
+                segment = old_segments[-1] + 1
+                out = open(self.segment_path(shard, segment), 'wb')
+                sources = {}
+                updates = []
+                try:
+                    for seq, old_segment, offset, length in rows:
+                        if old_segment not in sources:
+                            sources[old_segment] = open(self.segment_path(shard, old_segment), 'rb')
+                        source = sources[old_segment]
+                        source.seek(offset)
+                        line = source.read(length)
+                        if out.tell() + length > self.max_segment_bytes and out.tell() > 0:
+                            out.close()
+                            segment += 1
+                            out = open(self.segment_path(shard, segment), 'wb')
+                        updates.append((segment, out.tell(), seq))
+                        out.write(line)
+                finally:
+                    out.close()
+                    for source in sources.values():
+                        source.close()
+
+                with conn:
+                    conn.execute('BEGIN IMMEDIATE')
+                    conn.executemany('UPDATE records SET segment = ?, offset = ? WHERE seq = ?', updates)
+                for old_segment in old_segments:
+                    os.remove(self.segment_path(shard, old_segment))
+                stats['registros_mantidos'] += len(updates)
+                stats['bytes_depois'] += sum(os.path.getsize(self.segment_path(shard, s)) for s in self._segments(shard))
+        return stats
+
+    def reindex(self) -> Dict[str, int]:
+        """
+        Rebuild the index from the segments (recovery after a crash between append and
+        index write). Lines that do not decode, such as torn writes, are dropped and counted.
+        """
+        conn = self._connection()
+        stats = {'registros': 0, 'linhas_descartadas': 0}
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('DELETE FROM records')
+            for shard in range(self.shards):
+                for segment in self._segments(shard):
+                    with open(self.segment_path(shard, segment), 'rb') as f:
+                        offset = 0
+                        for line in f:
+                            # Linha sem '\n' no fim: escrita interrompida, descartada
+                            try:
+                                if not line.endswith(b'\n'):
+                                    raise ValueError('linha incompleta')
+                                record = json.loads(line)
+                                self._index_record(record['key'], record['data'], shard, segment,
+                                                   offset, len(line), record['saved_at'])
+                                stats['registros'] += 1
+                            except (ValueError, KeyError, TypeError):
+                                stats['linhas_descartadas'] += 1
+                            offset += len(line)
+        return stats
+
+    def export(self, output_path: str) -> int:
+        """Bulk export of the latest registration of each candidate (JSONL or flat CSV)"""
+        count = 0
+        tmp_path = f"{output_path}.tmp"
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+            if output_path.endswith('.csv'):
+                writer = csv.writer(f)
+                writer.writerow(['email', 'nome_completo', 'data_nascimento', 'telefone', 'saved_at', 'experiencias'])
+                for _, record in self.iter_latest():
+                    data = record['data']
+                    writer.writerow([data.get('email'), data.get('nome_completo'), data.get('data_nascimento'),
+                                     data.get('telefone'), record['saved_at'],
+                                     json.dumps(data.get('experiencias') or [], ensure_ascii=False)])
+                    count += 1
+            else:
+                for _, record in self.iter_latest():
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                    count += 1
+        os.replace(tmp_path, output_path)
+        return count
+
+    def migrate_from_dir(self, candidates_dir: str) -> int:
+        """
+        Import the legacy one-file-per-candidate directory, oldest file first so the
+        newest registration of each candidate wins. The directory is left untouched.
+        """
+        entries = []
+        with os.scandir(candidates_dir) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith('.json'):
+                    entries.append((entry.stat().st_mtime, entry.path))
+        entries.sort()
+
+        count = 0
+        for mtime, path in entries:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    candidate_data = json.load(f)
+                self.append(candidate_data, saved_at=datetime.fromtimestamp(mtime).isoformat(timespec='seconds'))
+                count += 1
+            except (OSError, ValueError) as e:
+                print(f"Ignorando {path}: {e}")
+        return count
+
+
+if __name__ == '__main__':
+    import sys
+
+    store = CandidateStore(os.getenv('CANDIDATE_STORE', 'candidate_store'))
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    start = time.perf_counter()
+
+    if command == 'migrate':
+        total = store.migrate_from_dir(sys.argv[2] if len(sys.argv) > 2 else 'candidates')
+        print(f"{total} cadastros migrados; {len(store)} candidatos no índice")
+    elif command == 'export' and len(sys.argv) > 2:
+        print(f"{store.export(sys.argv[2])} candidatos exportados para {sys.argv[2]}")
+    elif command == 'compact':
+        print(store.compact())
+    elif command == 'reindex':
+        stats = store.reindex()
+        print(f"{stats['registros']} registros reindexados, {stats['linhas_descartadas']} linhas inválidas descartadas")
+    elif command == 'lookup' and len(sys.argv) > 2:
+        value = sys.argv[2]
+        data = store.get_by_email(value) if '@' in value else store.get_by_phone(value)
+        print(json.dumps(data, ensure_ascii=False, indent=2) if data else "Candidato não encontrado")
+    else:
+        print(__doc__)
+        sys.exit(1)
+    print(f"({time.perf_counter() - start:.2f}s)")
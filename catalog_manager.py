@@ -0,0 +1,153 @@
+import os
+import threading
+import traceback
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Tuple, Type, Iterator, Callable
+
+from job_index import JobIndex, file_version
+
+try:
+    import fcntl
+except ImportError:  # Windows: só há o lock entre threads
+    fcntl = None
+
+
+@contextmanager
+def index_file_lock(index_path: str) -> Iterator[None]:
+    """Lock between processes (where fcntl exists) around loading or rebuilding the saved index"""
+    if fcntl is None:
+        yield
+        return
+    with open(f"{index_path}.lock", 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class CatalogManager:
+    """
+    Mantém o snapshot atual do índice de vagas e o reconstrói em segundo plano
+    quando o CSV do catálogo muda.
+
+    As requisições leem `current` uma única vez e continuam usando esse snapshot
+    até o fim; a troca para o novo índice é uma simples atribuição de referência,
+    então ninguém bloqueia enquanto a reconstrução acontece. `on_swap` recebe o
+    novo índice na thread de reconstrução, antes da troca, para preparar
+    estruturas derivadas dele (ex.: o dicionário do extrator local).
+    """
+
+    def __init__(self, csv_path: str, index_path: str, stop_words: Optional[List[str]] = None,
+                 poll_interval: float = 30.0, index_class: Type = JobIndex, index: Optional[Any] = None,
+                 on_swap: Optional[Callable[[Any], None]] = None):
+        self.csv_path = csv_path
+        self.index_path = index_path
+        self.stop_words = stop_words
+        self.poll_interval = poll_interval
+        # JobIndex (em memória) ou StreamingJobIndex (arquivos mapeados em memória)
+        self.index_class = index_class
+        self.on_swap = on_swap
+
+        if index is None:
+            self._fingerprint = self._stat()
+            with index_file_lock(index_path):
+                self._index = index_class.load_or_build(csv_path, index_path, stop_words=stop_words)
+        else:
+            # Já carregado por quem cria o gerenciador (ex.: o processo mestre, antes do fork):
+            # o primeiro ciclo de polling confere se o CSV mudou desde então
+            self._fingerprint = None
+            self._index = index
+        self._rebuild_lock = threading.Lock()
+        self._rebuild_pending = False
+        self._rebuilding = False
+        self._stop_event = threading.Event()
+        self._poll_thread = None
+        self.last_error = None
+
+    @property
+    def current(self) -> JobIndex:
+        return self._index
+
+    @property
+    def version(self) -> str:
+        return self._index.version
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.csv_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def start(self):
+        """Start polling the catalog file for changes"""
+        if self.poll_interval <= 0 or self._poll_thread is not None:
+            return
+        self._poll_thread = threading.Thread(target=self._poll, name='catalog-poll', daemon=True)
+        self._poll_thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _poll(self):
+        while not self._stop_event.wait(self.poll_interval):
+            fingerprint = self._stat()
+            if fingerprint is not None and fingerprint != self._fingerprint:
+                self.reload()
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        Schedule a background rebuild of the index.
+        Returns False when a rebuild is already running (it will run once more afterwards).
+        """
+        with self._rebuild_lock:
+            if self._rebuilding:
+                self._rebuild_pending = True
+                return False
+            self._rebuilding = True
+
+        threading.Thread(target=self._rebuild, args=(force,), name='catalog-rebuild', daemon=True).start()
+        return True
+
+    def _rebuild(self, force: bool):
+        while True:
+            try:
+                fingerprint = self._stat()
+                # Só o mtime mudou (ex.: `touch`): não há o que reconstruir
+                if force or file_version(self.csv_path) != self._index.version:
+                    # Todo processo tem o próprio poller: só um reconstrói de cada vez, e quem
+                    # chega depois carrega o arquivo que o primeiro acabou de salvar
+                    with index_file_lock(self.index_path):
+                        if force:
+                            index = self.index_class.build_and_save(self.csv_path, self.index_path,
+                                                                    stop_words=self.stop_words)
+                        else:
+                            index = self.index_class.load_or_build(self.csv_path, self.index_path,
+                                                                   stop_words=self.stop_words)
+                    if self.on_swap is not None:
+                        self.on_swap(index)
+                    self._index = index
+                    print(f"Catálogo recarregado: versão {index.version} ({len(index)} vagas)")
+                self._fingerprint = fingerprint
+                self.last_error = None
+            except Exception as e:
+                # Mantém o snapshot antigo; o próximo ciclo de polling tenta de novo
+                self.last_error = str(e)
+                traceback.print_exc()
+
+            with self._rebuild_lock:
+                if not self._rebuild_pending:
+                    self._rebuilding = False
+                    return
+                self._rebuild_pending = False
+                force = False
+
+    def status(self) -> Dict[str, Any]:
+        index = self._index
+        return {
+            'versao': index.version,
+            'vagas': len(index),
+            'recarregando': self._rebuilding,
+            'ultimo_erro': self.last_error,
+        }
@@ -0,0 +1,123 @@
+"""
+Servidor falso compatível com /v1/chat/completions, para testar o bot e o
+LLMClient sem chamar a API real (latência, erros e travamentos simulados).
+
+Uso:
+    python fake_llm.py [--port 8099] [--latency 0.5] [--error-rate 0.2] [--hang-rate 0.1]
+    OPENAI_API_BASE=http://127.0.0.1:8099/v1 OPENAI_API_KEY=fake python main.py
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any
+
+
+ITEM_PATTERN = re.compile(r'^### Item (\d+)\n', re.MULTILINE)
+SKILLS = ['Python', 'Java', 'JavaScript', 'SQL', 'React', 'AWS', 'Docker', 'Kubernetes', 'Machine Learning',
+          'Power BI', 'Excel', 'Node.js', 'C++', 'CSS', 'HTML']
+
+
+def fake_experience(text: str) -> Dict[str, Any]:
+    """Deterministic extraction good enough to exercise the matching flow"""
+    # A mensagem do candidato fica entre a instrução e a lista de campos do EXPERIENCE_PROMPT
+    message = text.split('estruturada:', 1)[-1].split('Por favor, preencha', 1)[0]
+    cargo = re.search(r'\b(?i:cargo|como|fui|sou)\s*[:\-]?\s*([A-ZÀ-Ý][\wÀ-ÿ]*(?:\s+(?:de\s+)?[A-ZÀ-Ý][\wÀ-ÿ]*)*)',
+                      message)
+    return {
+        'cargo': cargo.group(1) if cargo else 'Desenvolvedor',
+        'responsabilidades': message.strip()[:200],
+        'habilidades': [skill for skill in SKILLS if re.search(rf'(?i)(?<![\w+]){re.escape(skill)}(?![\w+])', message)],
+        'resultados': 'Resultados não detalhados',
+    }
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    error_rate = 0.0
+    hang_rate = 0.0
+    hang_seconds = 60.0
+    requests = 0
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, payload: Dict[str, Any]):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        with FakeLLMHandler.lock:
+            FakeLLMHandler.requests += 1
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+
+        draw = random.random()
+        if draw < self.hang_rate:
+            time.sleep(self.hang_seconds)
+        elif draw < self.hang_rate + self.error_rate:
+            self._send(503, {'error': {'message': 'fake overload', 'type': 'server_error'}})
+            return
+        time.sleep(self.latency)
+
+        if not self.path.endswith('/chat/completions'):
+            self._send(404, {'error': {'message': f'unknown path {self.path}', 'type': 'invalid_request_error'}})
+            return
+        prompt = request.get('messages', [{}])[-1].get('content', '')
+        partes = ITEM_PATTERN.split(prompt)  # [instrução, n1, texto1, n2, texto2, ...]
+        if len(partes) > 1:
+            # Prompt em lote: um objeto por "### Item N", na ordem
+            textos = partes[2::2]
+            textos[-1] = textos[-1].split('\n\nPara cada item', 1)[0]
+            content = json.dumps(
+                [{'item': int(n), **fake_experience(f'estruturada:{texto}')} for n, texto in zip(partes[1::2], textos)],
+                ensure_ascii=False
+            )
+        else:
+            content = json.dumps(fake_experience(prompt), ensure_ascii=False)
+        self._send(200, {
+            'id': f'fake-{FakeLLMHandler.requests}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'fake'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+        })
+
+
+def serve(port: int = 8099, latency: float = 0.0, error_rate: float = 0.0, hang_rate: float = 0.0,
+          hang_seconds: float = 60.0) -> ThreadingHTTPServer:
+    """Start the fake server in a daemon thread (handy inside tests and benchmarks)"""
+    handler = type('ConfiguredFakeLLMHandler', (FakeLLMHandler,), {
+        'latency': latency, 'error_rate': error_rate, 'hang_rate': hang_rate, 'hang_seconds': hang_seconds,
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='fake-llm', daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fake OpenAI chat completions server')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with 503')
+    parser.add_argument('--hang-rate', type=float, default=0.0, help='fraction of requests that hang')
+    parser.add_argument('--hang-seconds', type=float, default=60.0)
+    args = parser.parse_args()
+
+    server = serve(args.port, args.latency, args.error_rate, args.hang_rate, args.hang_seconds)
+    print(f"LLM falso em http://127.0.0.1:{args.port}/v1 (Ctrl+C para sair)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
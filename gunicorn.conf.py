@@ -0,0 +1,58 @@
+"""
+Configuração do gunicorn com partida rápida:
+
+    gunicorn -c gunicorn.conf.py main:app
+
+O processo mestre importa o app e carrega o snapshot do catálogo uma única vez
+(preload_app); o worker nasce por fork e compartilha essas páginas por
+copy-on-write, então um worker reiniciado (timeout, max_requests) fica pronto
+sem recarregar o catálogo. O worker cria o próprio bot em post_fork, porque
+conexões SQLite e threads (flush de sessões, polling do catálogo) não
+sobrevivem ao fork. PRELOAD_APP=0 volta ao modo em que o worker importa e
+monta tudo sozinho.
+
+WEB_CONCURRENCY define o número de workers (padrão 1), com threads (gthread) em
+cada um. Com mais de um, o main.py lê o mesmo WEB_CONCURRENCY e troca o que só
+valeria dentro de um processo: as sessões vão direto ao SQLite, sem o cache
+com escrita adiada, e os MessageSids recentes ficam em um SQLite compartilhado
+(MESSAGE_DEDUP_PATH), já que o reenvio do Twilio pode cair em outro worker.
+Continuam por processo: os locks e a fila assíncrona por telefone (mensagens
+simultâneas do mesmo número em workers diferentes não são serializadas), as
+métricas do /metrics (cada coleta vê só o worker que a atendeu) e o profiler
+do /admin/perfil.
+"""
+import gc
+import os
+
+# Lido pelo main.py na importação: só carrega o catálogo, sem criar o bot
+os.environ.setdefault('PRELOAD_APP', '1')
+preload_app = os.environ['PRELOAD_APP'] == '1'
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_CONCURRENCY', '1'))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+# Acima do prazo total de uma chamada ao LLM (LLM_DEADLINE)
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+
+if preload_app:
+    # Sem coletas no mestre enquanto o app carrega: nenhum "buraco" de objetos
+    # liberados no meio das páginas que os workers vão compartilhar
+    gc.disable()
+
+
+def pre_fork(server, worker):
+    if preload_app:
+        # Objetos do mestre vão para a geração permanente: o GC dos workers não
+        # escreve nos cabeçalhos deles e as páginas continuam compartilhadas
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    # `-w` na linha de comando não chega ao main.py: o número de workers vem só do WEB_CONCURRENCY
+    if server.cfg.workers != workers:
+        raise RuntimeError(f"{server.cfg.workers} workers com WEB_CONCURRENCY={workers}: use só WEB_CONCURRENCY")
+    gc.enable()
+    if preload_app:
+        import main
+        main.init_bot()
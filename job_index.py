@@ -0,0 +1,463 @@
+import hashlib
+import os
+import pickle
+import re
+import unicodedata
+import uuid
+from collections import Counter
+from typing import List, Dict, Any, Optional, Iterable, Tuple, Mapping, TYPE_CHECKING
+
+import numpy as np
+import scipy.sparse as sp
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+stop_words = ['a', 'o', 'é', 'de', 'que', 'em', 'um', 'para', 'com', 'não', 'por', 'uma']
+
+# Colunas do catálogo usadas para montar o texto de cada vaga
+TEXT_COLUMNS = ['nome_vaga', 'descricao', 'skills_necessarias']
+RESULT_COLUMNS = ['id_vaga', 'nome_vaga', 'descricao', 'skills_necessarias', 'salario', 'modalidade', 'local']
+
+# Incrementar quando o formato do arquivo salvo mudar, para forçar a reconstrução
+INDEX_FORMAT = 3
+
+# Tokenização padrão do TfidfVectorizer
+TOKEN_PATTERN = r'(?u)\b\w\w+\b'
+
+# Cargos no dicionário do extrator local: os mais frequentes do catálogo (uma
+# alternância regex com centenas de milhares de títulos leva segundos para compilar)
+MAX_TITLE_TERMS = int(os.getenv('CATALOG_MAX_TITLES', '5000'))
+
+NO_PREFERENCE_ANSWERS = {'nao', 'n', 'sem preferencia', 'nenhuma', 'tanto faz'}
+
+
+def file_version(path: str) -> str:
+    """Short content hash identifying a version of the catalog file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+def normalize_key(value: Any) -> str:
+    """Accent- and case-insensitive key used by the inverted indexes"""
+    value = unicodedata.normalize('NFKD', str(value))
+    value = ''.join(ch for ch in value if not unicodedata.combining(ch))
+    return ' '.join(value.casefold().split())
+
+
+def parse_salario(valor: Any) -> float:
+    """
+    Converte salários como "R$ 7,683,00" ou "R$ 7.683,00" em 7683.0.
+    O último separador seguido de exatamente dois dígitos é tratado como decimal.
+    """
+    texto = re.sub(r'[^\d,.]', '', str(valor))
+    if not re.search(r'\d', texto):
+        return float('nan')
+    match = re.match(r'^(.*)[,.](\d{2})$', texto)
+    inteiro, centavos = match.groups() if match else (texto, '00')
+    inteiro = re.sub(r'\D', '', inteiro) or '0'
+    return float(f"{inteiro}.{centavos}")
+
+
+# Valor na resposta de preferências: só conta como salário com "R$", "mil"/"k" ou
+# pelo menos três dígitos (em "remoto, 2 anos" não há salário)
+SALARY_PATTERN = re.compile(r'(r\$\s*)?(\d[\d.,]*\d|\d)\s*(mil|k)?(?!\w)')
+
+
+def parse_salario_preferencia(texto: str) -> Optional[float]:
+    """Minimum salary mentioned in a normalized preference answer ("8,5 mil" = 8500), or None"""
+    for match in SALARY_PATTERN.finditer(texto):
+        moeda, numero, multiplicador = match.groups()
+        if not (moeda or multiplicador or len(re.sub(r'\D', '', numero)) >= 3):
+            continue
+        if not multiplicador:
+            return parse_salario(numero)
+        # Antes do multiplicador, um separador seguido de um ou dois dígitos é a parte decimal
+        decimal = re.match(r'^(.*)[,.](\d{1,2})$', numero)
+        inteiro, fracao = decimal.groups() if decimal else (numero, '0')
+        inteiro = re.sub(r'\D', '', inteiro) or '0'
+        return float(f"{inteiro}.{fracao}") * 1000
+    return None
+
+
+def experience_text(experiencia: Dict[str, Any]) -> str:
+    """Text of one extracted experience, as matched against the job texts"""
+    return ' '.join([
+        experiencia.get('cargo', ''),
+        experiencia.get('responsabilidades', ''),
+        ' '.join(experiencia.get('habilidades', [])),
+        experiencia.get('resultados', '')
+    ]).lower()
+
+
+def candidate_profile_text(candidate_data: Dict[str, Any]) -> str:
+    """Profile text of a saved candidate, built from all of their experiences"""
+    return ' '.join(experience_text(experiencia) for experiencia in candidate_data.get('experiencias') or [])
+
+
+def _present(values: Iterable[Any]) -> List[str]:
+    # Equivalente a dropna().astype(str) sem o pandas (NaN é o único valor diferente de si mesmo)
+    return [str(value) for value in values if value is not None and value == value]
+
+
+def frequent_terms(counts: Counter, spelling: Dict[str, str], limit: int) -> List[str]:
+    """The `limit` most frequent terms (counted by casefold), in their first spelling"""
+    return [spelling[key] for key, _ in counts.most_common(limit or None)]
+
+
+def catalog_terms(vagas: Mapping[str, Iterable[Any]], max_titles: int = MAX_TITLE_TERMS) -> Tuple[List[str], List[str]]:
+    """Distinct skills and the most frequent job titles of a catalog (the local extractor dictionary)"""
+    skills = [skill.strip() for row in _present(vagas['skills_necessarias']) for skill in row.split(',')]
+    titles, spelling = Counter(), {}
+    for title in _present(vagas['nome_vaga']):
+        title = title.strip()
+        spelling.setdefault(title.casefold(), title)
+        titles[title.casefold()] += 1
+    return list(dict.fromkeys(skills)), frequent_terms(titles, spelling, max_titles)
+
+
+def _inverted_index(values: Iterable[Iterable[str]]) -> Dict[str, np.ndarray]:
+    postings = {}
+    for row, keys in enumerate(values):
+        for key in keys:
+            if key:
+                postings.setdefault(key, []).append(row)
+    return {key: np.asarray(rows, dtype=np.int64) for key, rows in postings.items()}
+
+
+class QueryVectorizer:
+    """
+    transform() de um TfidfVectorizer já ajustado, com o vocabulário e o IDF
+    copiados dele: o índice salvo não guarda objetos do scikit-learn e carrega
+    sem importá-lo (que sozinho leva mais de um segundo na partida).
+    """
+
+    def __init__(self, vocabulary: Dict[str, int], idf: np.ndarray, stop_words: Optional[Iterable[str]] = None,
+                 token_pattern: str = TOKEN_PATTERN):
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.stop_words = frozenset(stop_words or ())
+        self.token_pattern = token_pattern
+        self._tokens = re.compile(token_pattern)
+
+    @classmethod
+    def from_tfidf(cls, vectorizer) -> 'QueryVectorizer':
+        return cls(
+            {term: int(column) for term, column in vectorizer.vocabulary_.items()},
+            vectorizer.idf_,
+            stop_words=vectorizer.get_stop_words(),
+            token_pattern=vectorizer.token_pattern
+        )
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = dict(self.__dict__)
+        del state['_tokens']
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self.__dict__.update(state)
+        self._tokens = re.compile(self.token_pattern)
+
+    def transform(self, textos: List[str]) -> sp.csr_matrix:
+        """Same output as TfidfVectorizer.transform: raw counts times IDF, rows l2-normalized"""
+        rows, columns = [], []
+        for row, texto in enumerate(textos):
+            for token in self._tokens.findall(texto.lower()):
+                column = self.vocabulary.get(token)
+                if column is not None and token not in self.stop_words:
+                    rows.append(row)
+                    columns.append(column)
+        matrix = sp.csr_matrix((np.ones(len(columns)), (rows, columns)), shape=(len(textos), len(self.idf)))
+        matrix.sum_duplicates()
+        matrix.data *= self.idf[matrix.indices]
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        matrix.data /= np.repeat(norms, np.diff(matrix.indptr))
+        return matrix
+
+
+class JobIndex:
+    """
+    Índice TF-IDF do catálogo de vagas.
+
+    O vocabulário e a matriz esparsa das vagas são calculados uma única vez
+    e persistidos em disco; uma busca só vetoriza o texto do candidato e faz
+    um produto esparso contra a matriz já normalizada.
+
+    Índices invertidos de habilidade, modalidade e cidade e os salários já
+    convertidos em número restringem as linhas candidatas antes do cálculo
+    de similaridade.
+
+    O arquivo salvo é um snapshot só com arrays do numpy/scipy (colunas das
+    vagas, matriz, filtros e o QueryVectorizer): carregá-lo não lê o CSV nem
+    importa pandas ou scikit-learn, que só entram na reconstrução.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], vectorizer: QueryVectorizer, matrix, version: str,
+                 filters: Optional[Dict[str, Any]] = None):
+        self._columns = columns
+        self.vectorizer = vectorizer
+        self.matrix = matrix
+        self.version = version
+        if filters is None:
+            filters = self._build_filters(columns)
+        self.salarios = filters['salarios']
+        self.salario_order = filters['salario_order']
+        self.skills_index = filters['skills']
+        self.modalidade_index = filters['modalidade']
+        self.local_index = filters['local']
+        self._row_by_id = {str(id_vaga): row for row, id_vaga in enumerate(self._columns['id_vaga'].tolist())}
+        self._vagas_df = None
+
+    @property
+    def vagas_df(self) -> 'pd.DataFrame':
+        """The catalog as a DataFrame, rebuilt from the columns on first use"""
+        if self._vagas_df is None:
+            import pandas as pd
+            self._vagas_df = pd.DataFrame({column: self._columns[column] for column in RESULT_COLUMNS})
+        return self._vagas_df
+
+    @staticmethod
+    def _build_filters(columns: Dict[str, np.ndarray]) -> Dict[str, Any]:
+        def filled(values):
+            # Equivalente a fillna('').astype(str)
+            return [str(value) if value is not None and value == value else '' for value in values]
+
+        salarios = np.array([parse_salario(valor) for valor in columns['salario'].tolist()], dtype=np.float64)
+        return {
+            'salarios': salarios,
+            # Ordem crescente de salário (NaN no fim) para achar "salário >= X" por busca binária
+            'salario_order': np.argsort(salarios, kind='stable'),
+            'skills': _inverted_index([normalize_key(skill) for skill in row.split(',')]
+                                      for row in filled(columns['skills_necessarias'])),
+            'modalidade': _inverted_index([normalize_key(value)] for value in filled(columns['modalidade'])),
+            'local': _inverted_index([normalize_key(value)] for value in filled(columns['local'])),
+        }
+
+    @classmethod
+    def build(cls, csv_path: str, stop_words: Optional[List[str]] = None) -> 'JobIndex':
+        """Read the catalog CSV and fit the vocabulary over the job texts"""
+        import pandas as pd
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        version = file_version(csv_path)
+        vagas_df = pd.read_csv(csv_path, encoding='utf-8')
+
+        vagas_texto = vagas_df[TEXT_COLUMNS[0]].astype(str)
+        for column in TEXT_COLUMNS[1:]:
+            vagas_texto = vagas_texto + ' ' + vagas_df[column].astype(str)
+        vagas_texto = vagas_texto.str.lower()
+
+        # TfidfVectorizer normaliza as linhas (l2), então o produto escalar já é a similaridade do cosseno
+        vectorizer = TfidfVectorizer(stop_words=stop_words)
+        matrix = vectorizer.fit_transform(vagas_texto.tolist()).tocsr()
+
+        columns = {column: vagas_df[column].to_numpy() for column in RESULT_COLUMNS}
+        return cls(columns, QueryVectorizer.from_tfidf(vectorizer), matrix, version)
+
+    def save(self, path: str):
+        """Persist the index, replacing any previous file atomically"""
+        # Nome único: outro processo pode estar salvando o mesmo índice ao mesmo tempo
+        tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({
+                'format': INDEX_FORMAT,
+                'version': self.version,
+                'columns': self._columns,
+                'vectorizer': self.vectorizer,
+                'matrix': self.matrix,
+                'filters': {
+                    'salarios': self.salarios,
+                    'salario_order': self.salario_order,
+                    'skills': self.skills_index,
+                    'modalidade': self.modalidade_index,
+                    'local': self.local_index,
+                },
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'JobIndex':
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+        if data.get('format') != INDEX_FORMAT:
+            raise KeyError('format')
+        return cls(data['columns'], data['vectorizer'], data['matrix'], data['version'], filters=data['filters'])
+
+    @classmethod
+    def load_or_build(cls, csv_path: str, index_path: str, stop_words: Optional[List[str]] = None) -> 'JobIndex':
+        """
+        Load the saved index when it matches the current catalog file,
+        otherwise rebuild it and save it for the next startup.
+        """
+        try:
+            index = cls.load(index_path)
+            if index.version == file_version(csv_path):
+                return index
+        except (FileNotFoundError, EOFError, KeyError, pickle.UnpicklingError):
+            pass
+
+        return cls.build_and_save(csv_path, index_path, stop_words=stop_words)
+
+    @classmethod
+    def build_and_save(cls, csv_path: str, index_path: str, stop_words: Optional[List[str]] = None) -> 'JobIndex':
+        index = cls.build(csv_path, stop_words=stop_words)
+        index.save(index_path)
+        return index
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    def catalog_terms(self) -> Tuple[List[str], List[str]]:
+        return catalog_terms(self._columns)
+
+    def row_of(self, id_vaga: Any) -> Optional[int]:
+        """Row of a job in the matrix, or None when the id is not in this catalog version"""
+        return self._row_by_id.get(str(id_vaga))
+
+    def row_vector(self, row: int):
+        """TF-IDF vector (1 x vocabulary) of one job"""
+        return self.matrix[row]
+
+    def _postings(self, inverted: Dict[str, np.ndarray], values: Any) -> np.ndarray:
+        """Union of the rows of every requested value"""
+        if isinstance(values, str):
+            values = [values]
+        rows = [inverted.get(normalize_key(value)) for value in values]
+        rows = [r for r in rows if r is not None]
+        if not rows:
+            return np.empty(0, dtype=np.int64)
+        return rows[0] if len(rows) == 1 else np.unique(np.concatenate(rows))
+
+    def candidate_rows(self, filtros: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """
+        Sorted rows that satisfy every filter, or None when there is no filter.
+        Supported keys: 'modalidade', 'local', 'habilidades' (any of) and 'salario_minimo'.
+        """
+        if not filtros:
+            return None
+
+        row_sets = []
+        if filtros.get('modalidade'):
+            row_sets.append(self._postings(self.modalidade_index, filtros['modalidade']))
+        if filtros.get('local'):
+            row_sets.append(self._postings(self.local_index, filtros['local']))
+        if filtros.get('habilidades'):
+            row_sets.append(self._postings(self.skills_index, filtros['habilidades']))
+        if filtros.get('salario_minimo') is not None:
+            sorted_salarios = self.salarios[self.salario_order]
+            start = np.searchsorted(sorted_salarios, float(filtros['salario_minimo']), side='left')
+            valid = np.count_nonzero(~np.isnan(sorted_salarios))
+            row_sets.append(np.sort(self.salario_order[start:valid]))
+
+        if not row_sets:
+            return None
+        # Interseção começando pelo menor conjunto
+        row_sets.sort(key=len)
+        rows = row_sets[0]
+        for other in row_sets[1:]:
+            if not len(rows):
+                break
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        return rows
+
+    def parse_preferencias(self, texto: str) -> Dict[str, Any]:
+        """
+        Extract modality, city, skills and minimum salary preferences from a free-text answer,
+        matching against the values that actually exist in the catalog.
+        """
+        normalizado = normalize_key(texto)
+        if not normalizado or normalizado in NO_PREFERENCE_ANSWERS:
+            return {}
+
+        def mentioned(keys: Iterable[str]) -> List[str]:
+            return [key for key in keys if re.search(rf'(?<!\w){re.escape(key)}(?!\w)', normalizado)]
+
+        filtros = {}
+        modalidades = mentioned(self.modalidade_index)
+        if modalidades:
+            filtros['modalidade'] = modalidades
+        locais = mentioned(self.local_index)
+        if locais:
+            filtros['local'] = locais
+        habilidades = mentioned(self.skills_index)
+        if habilidades:
+            filtros['habilidades'] = habilidades
+
+        salario = parse_salario_preferencia(normalizado)
+        if salario is not None:
+            filtros['salario_minimo'] = salario
+        return filtros
+
+    def search(self, texto: str, top_n: int = 5, filtros: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Return the top N jobs most similar to the given text, optionally restricted by filters"""
+        return self.search_batch([texto], top_n=top_n, filtros=[filtros])[0]
+
+    def search_batch(self, textos: List[str], top_n: int = 5,
+                     filtros: Optional[List[Optional[Dict[str, Any]]]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Top N jobs for each text. Unfiltered texts are scored together with a
+        single sparse product; filtered ones only against their candidate rows.
+        """
+        if filtros is None:
+            filtros = [None] * len(textos)
+        vetores = self.vectorizer.transform([texto.lower() for texto in textos])
+        resultados = [[] for _ in textos]
+
+        sem_filtro = []
+        for i, filtro in enumerate(filtros):
+            rows = self.candidate_rows(filtro)
+            if rows is None:
+                sem_filtro.append(i)
+            elif len(rows):
+                # Só as linhas que passaram nos filtros entram no produto esparso
+                similaridades = (vetores[i] @ self.matrix[rows].T).toarray()
+                top = top_k(similaridades, top_n)[0]
+                resultados[i] = self.results_for_rows(rows[top], similaridades[0, top])
+
+        # Blocos de consultas para limitar a matriz densa de similaridades a ~8M valores
+        chunk = max(1, (8 << 20) // max(1, self.matrix.shape[0]))
+        for start in range(0, len(sem_filtro), chunk):
+            ids = sem_filtro[start:start + chunk]
+            similaridades = (vetores[ids] @ self.matrix.T).toarray()
+            top = top_k(similaridades, top_n)
+            scores = np.take_along_axis(similaridades, top, axis=1)
+            for pos, i in enumerate(ids):
+                resultados[i] = self.results_for_rows(top[pos], scores[pos])
+
+        return resultados
+
+    def results_for_rows(self, rows: np.ndarray, similaridades: np.ndarray) -> List[Dict[str, Any]]:
+        """Build the result dicts column-wise, without per-row DataFrame lookups"""
+        colunas = [self._columns[column][rows].tolist() for column in RESULT_COLUMNS]
+        colunas.append(similaridades.tolist())
+        chaves = RESULT_COLUMNS + ['similaridade']
+        resultados = [dict(zip(chaves, valores)) for valores in zip(*colunas)]
+        for resultado in resultados:
+            resultado['versao_catalogo'] = self.version
+        return resultados
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Column indices of the k highest scores of each row, best first (argpartition + small sort)"""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    if k < scores.shape[1]:
+        candidatos = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidatos = np.broadcast_to(np.arange(k), (scores.shape[0], k))
+    ordem = np.argsort(-np.take_along_axis(scores, candidatos, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(candidatos, ordem, axis=1)
+
+if __name__ == '__main__':
+    import sys
+
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else 'vagas_tecnologia_atualizado.csv'
+    index_path = sys.argv[2] if len(sys.argv) > 2 else 'vagas_index.pkl'
+    index = JobIndex.build(csv_path, stop_words=stop_words)
+    index.save(index_path)
+    print(f"Índice salvo em {index_path} ({index.matrix.shape[0]} vagas, versão {index.version})")
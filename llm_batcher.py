@@ -0,0 +1,182 @@
+"""
+Micro-batching das extrações de experiência: pedidos simultâneos de vários
+candidatos são agrupados por até `max_wait_ms` ou `max_items` e enviados ao
+LLM em um único prompt com vários itens.
+
+Medição com o LLM falso (vazão e latência adicionada, com e sem lote):
+    python llm_batcher.py bench [--users 64] [--latency 0.4]
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+
+class ExtractionBatcher:
+    """
+    `process_batch(items)` recebe a lista de mensagens do lote e devolve um
+    resultado por item, na mesma ordem; None faz só aquele item ser refeito
+    individualmente com `process_item`, e uma resposta ilegível (ValueError:
+    JSON inválido, array com outro formato) faz isso com todos os itens.
+
+    Os itens refeitos individualmente rodam em paralelo (o LLMClient limita a
+    concorrência real), não um depois do outro.
+
+    Falhas de transporte, prazo ou disjuntor vão direto para todos os futures:
+    refazer item a item com a API lenta ou fora do ar só multiplicaria as
+    chamadas e a espera de cada usuário.
+
+    Cada future resolve para (resultado, veio_do_lote): quem guarda o resultado
+    em cache precisa saber de qual prompt ele saiu.
+    """
+
+    def __init__(self, process_batch: Callable[[List[str]], List[Optional[Dict[str, Any]]]],
+                 process_item: Callable[[str], Dict[str, Any]],
+                 max_items: int = 8, max_wait_ms: float = 20.0, workers: int = 4):
+        self.process_batch = process_batch
+        self.process_item = process_item
+        self.max_items = max_items
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue: "queue.Queue[Tuple[str, Future, float]]" = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='llm-batch')
+        self._item_executor = ThreadPoolExecutor(max_workers=workers * max_items, thread_name_prefix='llm-batch-item')
+        self._lock = threading.Lock()
+        self._counters = {'itens': 0, 'lotes': 0, 'itens_em_lote': 0, 'fallbacks_item': 0,
+                          'lotes_com_falha': 0, 'espera_total_ms': 0.0, 'espera_max_ms': 0.0}
+        self._collector = threading.Thread(target=self._collect, name='llm-batch-collector', daemon=True)
+        self._collector.start()
+
+    def submit(self, message: str) -> Future:
+        future = Future()
+        self._queue.put((message, future, time.monotonic()))
+        return future
+
+    def _collect(self):
+        while True:
+            batch = [self._queue.get()]
+            # A janela começa no primeiro pedido: ninguém espera mais que max_wait
+            deadline = batch[0][2] + self.max_wait
+            while len(batch) < self.max_items:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._record_dispatch(batch)
+            self._executor.submit(self._run, batch)
+
+    def _record_dispatch(self, batch: List[Tuple[str, Future, float]]):
+        now = time.monotonic()
+        waits = [(now - submitted) * 1000 for _, _, submitted in batch]
+        with self._lock:
+            self._counters['itens'] += len(batch)
+            self._counters['espera_total_ms'] += sum(waits)
+            self._counters['espera_max_ms'] = max(self._counters['espera_max_ms'], max(waits))
+            if len(batch) > 1:
+                self._counters['lotes'] += 1
+                self._counters['itens_em_lote'] += len(batch)
+
+    def _run(self, batch: List[Tuple[str, Future, float]]):
+        messages = [message for message, _, _ in batch]
+        results: List[Optional[Dict[str, Any]]] = [None] * len(batch)
+        if len(batch) > 1:
+            try:
+                results = list(self.process_batch(messages))
+                if len(results) != len(batch):
+                    raise ValueError(f"lote com {len(batch)} itens devolveu {len(results)} resultados")
+            except (ValueError, TypeError) as e:
+                print(f"Error parsing extraction batch: {e}")
+                with self._lock:
+                    self._counters['lotes_com_falha'] += 1
+                results = [None] * len(batch)
+            except Exception as e:
+                with self._lock:
+                    self._counters['lotes_com_falha'] += 1
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                return
+
+        for (message, future, _), result in zip(batch, results):
+            if result is not None:
+                future.set_result((result, True))
+                continue
+            if len(batch) > 1:
+                with self._lock:
+                    self._counters['fallbacks_item'] += 1
+            self._item_executor.submit(self._run_item, message, future)
+
+    def _run_item(self, message: str, future: Future):
+        try:
+            future.set_result((self.process_item(message), False))
+        except Exception as e:
+            future.set_exception(e)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counters)
+        stats['tamanho_medio_lote'] = round(stats['itens_em_lote'] / stats['lotes'], 2) if stats['lotes'] else 0.0
+        stats['espera_media_ms'] = round(stats.pop('espera_total_ms') / stats['itens'], 2) if stats['itens'] else 0.0
+        stats['espera_max_ms'] = round(stats['espera_max_ms'], 2)
+        stats['na_fila'] = self._queue.qsize()
+        return stats
+
+
+def _bench(users: int, latency: float, port: int):
+    import os
+    import statistics
+
+    import fake_llm
+
+    server = fake_llm.serve(port, latency=latency)
+    os.environ['OPENAI_API_BASE'] = f'http://127.0.0.1:{port}/v1'
+    os.environ.setdefault('OPENAI_API_KEY', 'fake')
+    os.environ['LLM_CACHE'] = '0'
+    os.environ['LLM_BATCH_ENABLED'] = '1'
+    from main import bot
+
+    batcher = bot.extraction_batcher
+    mensagens = [f"Trabalhei como Engenheiro de Dados {i} usando Python, SQL e AWS por 3 anos" for i in range(users)]
+
+    for modo in ('individual', 'lote'):
+        bot.extraction_batcher = batcher if modo == 'lote' else None
+        latencias = []
+        lock = threading.Lock()
+        requests_before = fake_llm.FakeLLMHandler.requests
+
+        def extrair(mensagem):
+            start = time.perf_counter()
+            bot._parse_experience_with_prompt(mensagem)
+            with lock:
+                latencias.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=extrair, args=(m,)) for m in mensagens]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        latencias.sort()
+        print(f"{modo:>10}: {users / elapsed:7.1f} extrações/s  "
+              f"p50 {statistics.median(latencias) * 1000:7.1f} ms  "
+              f"p95 {latencias[int(0.95 * (len(latencias) - 1))] * 1000:7.1f} ms  "
+              f"chamadas ao LLM: {fake_llm.FakeLLMHandler.requests - requests_before}")
+    print(batcher.stats())
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Micro-batching benchmark against the fake LLM server')
+    parser.add_argument('command', choices=['bench'])
+    parser.add_argument('--users', type=int, default=64, help='concurrent extractions')
+    parser.add_argument('--latency', type=float, default=0.4, help='fake LLM latency per request (seconds)')
+    parser.add_argument('--port', type=int, default=8099)
+    args = parser.parse_args()
+    _bench(args.users, args.latency, args.port)
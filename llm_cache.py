@@ -0,0 +1,182 @@
+import copy
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Callable
+
+
+def normalize_text(text: str) -> str:
+    """Normalize a message so trivially different pastes of the same text share a key"""
+    text = unicodedata.normalize('NFC', text)
+    return re.sub(r'\s+', ' ', text).strip().casefold()
+
+
+def cache_key(message: str, *prompt_parts: str) -> str:
+    """Content address of an extraction: normalized message + prompt, model and settings"""
+    digest = hashlib.sha256()
+    for part in prompt_parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    digest.update(normalize_text(message).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """
+    Cache de extrações do LLM endereçado por conteúdo.
+
+    Um LRU em memória atende os acertos quentes; opcionalmente as entradas são
+    persistidas em SQLite, com despejo das menos acessadas quando o arquivo passa
+    de `max_bytes`.
+    """
+
+    def __init__(self, max_entries: int = 1024, path: Optional[str] = None, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.path = path
+        self.max_bytes = max_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._counters = {'hits': 0, 'misses': 0, 'disk_hits': 0, 'disk_evictions': 0}
+
+        self._disk_bytes = 0
+        if path:
+            conn = self._connection()
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS llm_cache_last_access ON llm_cache (last_access)')
+            self._disk_bytes = conn.execute('SELECT COALESCE(SUM(size), 0) FROM llm_cache').fetchone()[0]
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self._counters['hits'] += 1
+                return copy.deepcopy(value)
+
+        if self.path:
+            conn = self._connection()
+            row = conn.execute('SELECT value FROM llm_cache WHERE key = ?', (key,)).fetchone()
+            if row:
+                conn.execute('UPDATE llm_cache SET last_access = ? WHERE key = ?', (time.time(), key))
+                value = json.loads(row[0])
+                with self._lock:
+                    self._counters['hits'] += 1
+                    self._counters['disk_hits'] += 1
+                    self._remember_locked(key, value)
+                return copy.deepcopy(value)
+
+        with self._lock:
+            self._counters['misses'] += 1
+        return None
+
+    def put(self, key: str, value: Dict[str, Any]):
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._remember_locked(key, value)
+
+        if self.path:
+            serialized = json.dumps(value, ensure_ascii=False)
+            size = len(serialized.encode('utf-8'))
+            conn = self._connection()
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                previous = conn.execute('SELECT size FROM llm_cache WHERE key = ?', (key,)).fetchone()
+                conn.execute(
+                    'INSERT OR REPLACE INTO llm_cache (key, value, size, last_access) VALUES (?, ?, ?, ?)',
+                    (key, serialized, size, time.time())
+                )
+            with self._lock:
+                self._disk_bytes += size - (previous[0] if previous else 0)
+            if self._disk_bytes > self.max_bytes:
+                self._evict_disk()
+
+    def _remember_locked(self, key: str, value: Dict[str, Any]):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        """Drop least recently used rows until the file is back to ~90% of max_bytes"""
+        target = int(self.max_bytes * 0.9)
+        conn = self._connection()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM llm_cache').fetchone()[0]
+            evicted = 0
+            for key, size in conn.execute('SELECT key, size FROM llm_cache ORDER BY last_access').fetchall():
+                if total <= target:
+                    break
+                conn.execute('DELETE FROM llm_cache WHERE key = ?', (key,))
+                total -= size
+                evicted += 1
+        with self._lock:
+            self._disk_bytes = total
+            self._counters['disk_evictions'] += evicted
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats['memory_entries'] = len(self._memory)
+            stats['disk_bytes'] = self._disk_bytes
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+def warm_from_file(path: str, extract: Callable[[str], Dict[str, Any]]) -> int:
+    """
+    Pre-warm the cache by running `extract` over past messages.
+    Accepts JSONL (one object with a "message" key per line) or plain text
+    with one message per line.
+    """
+    count = 0
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith('.jsonl'):
+                line = json.loads(line).get('message', '')
+                if not line:
+                    continue
+            extract(line)
+            count += 1
+    return count
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) != 3 or sys.argv[1] != 'warm':
+        print("Uso: python llm_cache.py warm <mensagens.txt|mensagens.jsonl>")
+        sys.exit(1)
+
+    from main import bot
+
+    if bot.extraction_cache is None:
+        print("Cache de extração desativado (LLM_CACHE=0)")
+        sys.exit(1)
+    total = warm_from_file(sys.argv[2], bot._parse_experience_with_prompt)
+    print(f"{total} mensagens processadas: {bot.extraction_cache.stats()}")
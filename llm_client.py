@@ -0,0 +1,211 @@
+import random
+import threading
+import time
+from typing import Dict, Any, Optional
+
+
+# Falhas transitórias: vale tentar de novo (e contam para o disjuntor). Nomes de
+# openai.error, porque o openai só é importado na primeira chamada ao LLM
+RETRYABLE_ERRORS = (
+    'Timeout',
+    'APIConnectionError',
+    'RateLimitError',
+    'ServiceUnavailableError',
+    'TryAgain',
+)
+
+
+def _is_retryable(error: Exception) -> bool:
+    from openai import error as openai_error
+
+    if isinstance(error, tuple(getattr(openai_error, name) for name in RETRYABLE_ERRORS)):
+        return True
+    # Erros 5xx da API também são transitórios
+    return isinstance(error, openai_error.APIError) and (error.http_status or 500) >= 500
+
+
+class LLMUnavailableError(Exception):
+    """The call was not made: circuit open or no free slot before the deadline"""
+
+
+class CircuitBreaker:
+    """
+    Disjuntor clássico: depois de `failure_threshold` falhas seguidas abre e
+    rejeita chamadas por `reset_timeout` segundos; então deixa passar uma
+    única chamada de teste (meio-aberto), que fecha ou reabre o circuito.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+            # Meio-aberto: só uma chamada de teste por vez
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def cancel(self):
+        """The allowed call was not made (e.g. no free slot): let another one probe"""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self._state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class LLMClient:
+    """
+    Envoltório da chamada ao OpenAI: no máximo `max_concurrency` chamadas
+    simultâneas (as demais esperam até `acquire_timeout`), prazo total por
+    chamada, novas tentativas limitadas com backoff exponencial e jitter, e
+    disjuntor que falha na hora enquanto a API está fora.
+    """
+
+    def __init__(self, max_concurrency: int = 8, acquire_timeout: float = 2.0, request_timeout: float = 15.0,
+                 deadline: float = 30.0, max_retries: int = 2, backoff_base: float = 0.5, backoff_max: float = 4.0,
+                 breaker: Optional[CircuitBreaker] = None, api_key: Optional[str] = None,
+                 api_base: Optional[str] = None):
+        self.max_concurrency = max_concurrency
+        self.acquire_timeout = acquire_timeout
+        self.request_timeout = request_timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.api_key = api_key
+        self.api_base = api_base
+        self._openai = None
+
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._running = 0
+        self._counters = {'chamadas': 0, 'sucessos': 0, 'falhas': 0, 'retentativas': 0,
+                          'rejeitadas_circuito': 0, 'rejeitadas_fila': 0}
+
+    def _count(self, name: str, delta: int = 1):
+        with self._lock:
+            self._counters[name] += delta
+
+    def chat_completion(self, **kwargs) -> Any:
+        """openai.ChatCompletion.create with concurrency limit, deadline, retries and circuit breaker"""
+        self._count('chamadas')
+        if not self.breaker.allow():
+            self._count('rejeitadas_circuito')
+            raise LLMUnavailableError('circuito aberto: API do LLM indisponível')
+
+        deadline = time.monotonic() + self.deadline
+        with self._lock:
+            self._waiting += 1
+        acquired = self._slots.acquire(timeout=min(self.acquire_timeout, self.deadline))
+        with self._lock:
+            self._waiting -= 1
+        if not acquired:
+            self.breaker.cancel()
+            self._count('rejeitadas_fila')
+            raise LLMUnavailableError('fila do LLM cheia: nenhuma vaga de execução no prazo')
+
+        with self._lock:
+            self._running += 1
+        try:
+            response = self._call_with_retries(deadline, kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+            self._slots.release()
+        return response
+
+    def _client(self):
+        # Importação adiada: o openai (e o aiohttp que ele puxa) custa ~0,3 s na partida
+        if self._openai is None:
+            import openai
+            if self.api_key:
+                openai.api_key = self.api_key
+            if self.api_base:
+                openai.api_base = self.api_base
+            self._openai = openai
+        return self._openai
+
+    def _call_with_retries(self, deadline: float, kwargs: Dict[str, Any]) -> Any:
+        openai = self._client()
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                response = openai.ChatCompletion.create(
+                    request_timeout=max(0.1, min(self.request_timeout, remaining)),
+                    **kwargs
+                )
+            except openai.error.OpenAIError as e:
+                if not _is_retryable(e):
+                    # Requisição inválida, autenticação etc.: a API respondeu, não adianta
+                    # repetir nem abrir o circuito
+                    self.breaker.record_success()
+                    self._count('falhas')
+                    raise
+                # Full jitter: espera aleatória até o backoff exponencial da tentativa
+                pause = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                if attempt >= self.max_retries or time.monotonic() + pause >= deadline:
+                    self.breaker.record_failure()
+                    self._count('falhas')
+                    raise
+                attempt += 1
+                self._count('retentativas')
+                time.sleep(pause)
+            except Exception:
+                self.breaker.record_failure()
+                self._count('falhas')
+                raise
+            else:
+                self.breaker.record_success()
+                self._count('sucessos')
+                return response
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update({
+                'na_fila': self._waiting,
+                'em_execucao': self._running,
+                'max_concorrencia': self.max_concurrency,
+            })
+        stats['circuito'] = self.breaker.state
+        stats['falhas_consecutivas'] = self.breaker.failures
+        return stats
@@ -0,0 +1,85 @@
+import re
+from typing import Dict, Any, Iterable, List, Tuple
+
+
+# Frases com números, percentuais ou verbos de impacto costumam descrever resultados
+RESULT_CUES = re.compile(
+    r'\d+\s*%|\b(aument|reduz|diminu|melhor|economi|otimiz|aceler|cresc|entreg|conquist|lider)\w*',
+    re.IGNORECASE
+)
+EXPLICIT_FIELDS = {
+    'cargo': re.compile(r'\b(?i:cargo)\s*[:\-]\s*([^\n;,]+?)(?=\.\s+[A-ZÀ-Ý]|[\n;,]|\.?\s*$)'),
+    'responsabilidades': re.compile(r'\bresponsabilidades?\s*[:\-]\s*([^\n]+)', re.IGNORECASE),
+    'resultados': re.compile(r'\bresultados?\s*(?:alcançados)?\s*[:\-]\s*([^\n]+)', re.IGNORECASE),
+}
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?;])\s+|\n+')
+
+
+def _compile_terms(terms: Iterable[str]) -> Tuple[re.Pattern, Dict[str, str]]:
+    """One alternation over every term, longest first, with word boundaries that also work for C++/Node.js"""
+    canonical = {}
+    for term in terms:
+        term = term.strip()
+        if term:
+            canonical.setdefault(term.casefold(), term)
+    alternation = '|'.join(re.escape(term) for term in sorted(canonical, key=len, reverse=True))
+    pattern = re.compile(rf'(?<![\w+#])(?:{alternation or "(?!)"})(?![\w+#])', re.IGNORECASE)
+    return pattern, canonical
+
+
+class LocalExperienceExtractor:
+    """
+    Extrator determinístico de experiência baseado no dicionário de cargos e
+    habilidades do próprio catálogo. Devolve o mesmo formato de
+    `_parse_experience_with_prompt` junto com uma confiança entre 0 e 1.
+    """
+
+    def __init__(self, skills: Iterable[str], titles: Iterable[str], version: str = ''):
+        self.version = version
+        self._skills_pattern, self._skills = _compile_terms(skills)
+        self._titles_pattern, self._titles = _compile_terms(titles)
+
+    def _find(self, pattern: re.Pattern, canonical: Dict[str, str], text: str) -> List[str]:
+        found = []
+        for match in pattern.finditer(text):
+            term = canonical[match.group(0).casefold()]
+            if term not in found:
+                found.append(term)
+        return found
+
+    def extract(self, message: str) -> Tuple[Dict[str, Any], float]:
+        explicit = {field: pattern.search(message) for field, pattern in EXPLICIT_FIELDS.items()}
+
+        if explicit['cargo']:
+            cargo = explicit['cargo'].group(1).strip(' .,')
+        else:
+            titles = self._find(self._titles_pattern, self._titles, message)
+            cargo = titles[0] if titles else ''
+
+        habilidades = self._find(self._skills_pattern, self._skills, message)
+
+        if explicit['resultados']:
+            resultados = explicit['resultados'].group(1).strip()
+        else:
+            resultados = ' '.join(
+                sentence.strip() for sentence in SENTENCE_SPLIT.split(message)
+                if sentence and RESULT_CUES.search(sentence)
+            )
+
+        if explicit['responsabilidades']:
+            responsabilidades = explicit['responsabilidades'].group(1).strip()
+        else:
+            responsabilidades = message.strip()
+
+        confidence = (
+            (0.4 if cargo else 0.0)
+            + 0.4 * min(len(habilidades), 3) / 3
+            + (0.2 if resultados else 0.0)
+        )
+
+        return {
+            'cargo': cargo or 'Cargo não identificado',
+            'responsabilidades': responsabilidades or 'Informações não especificadas',
+            'habilidades': habilidades,
+            'resultados': resultados or 'Resultados não detalhados',
+        }, round(confidence, 3)
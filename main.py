@@ -1,21 +1,31 @@
 import os
 import json
 import re
+import threading
+import time
+from collections import Counter
 from datetime import datetime
 from dataclasses import dataclass, asdict
 import numpy as np
-import pandas as pd
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple, Type
 from twilio.twiml.messaging_response import MessagingResponse
-import openai
 from dotenv import load_dotenv
 import json
-from flask import Flask, request, jsonify
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-
-
-stop_words = ['a', 'o', 'é', 'de', 'que', 'em', 'um', 'para', 'com', 'não', 'por', 'uma']
+from flask import Flask, Response, request, jsonify
+from job_index import JobIndex, experience_text, stop_words
+from catalog_manager import CatalogManager
+from session_store import create_session_store
+from messaging import AsyncReplyDispatcher, RecentMessages, SqliteRecentMessages, create_message_sender
+from llm_cache import ExtractionCache, cache_key
+from local_extractor import LocalExperienceExtractor
+from candidate_index import CandidateIndex
+from candidate_store import CandidateStore
+from llm_client import LLMClient, CircuitBreaker
+from llm_batcher import ExtractionBatcher
+from metrics import MetricsRegistry, SamplingProfiler
+
+# pandas, scikit-learn e openai não são importados na partida: só na reconstrução
+# do catálogo e na primeira chamada ao LLM
 
 
 class NpEncoder(json.JSONEncoder):
@@ -28,9 +38,122 @@ class NpEncoder(json.JSONEncoder):
             return obj.tolist()
         return super(NpEncoder, self).default(obj)
 
+# "não" à pergunta de mais experiências, opcionalmente seguido das preferências de vaga
+NO_MORE_EXPERIENCE = re.compile(r'^n[ãa]o\b[\s,.;:!-]*', re.IGNORECASE)
+
+# Prompt de extração de experiência (também compõe a chave do cache de extrações)
+EXPERIENCE_MODEL = "gpt-3.5-turbo"
+EXPERIENCE_MAX_TOKENS = 300
+EXPERIENCE_SYSTEM_PROMPT = "Você é um assistente especializado em extrair informações estruturadas de descrições de experiência profissional."
+EXPERIENCE_PROMPT = """
+Analise a seguinte descrição de experiência profissional e extraia as informações de forma estruturada:
+
+{message}
+
+Por favor, preencha as seguintes informações. Se algum detalhe não estiver claro, faça sua melhor interpretação:
+
+1. Cargo (título do trabalho)
+2. Responsabilidades principais (descrição das principais tarefas)
+3. Habilidades utilizadas (lista de habilidades técnicas e soft skills)
+4. Resultados alcançados (impactos mensuráveis ou conquistas)
+
+Retorne um JSON válido com a seguinte estrutura:
+{{
+    "cargo": "Título do cargo",
+    "responsabilidades": "Descrição das responsabilidades",
+    "habilidades": ["Habilidade 1", "Habilidade 2"],
+    "resultados": "Resultados e conquistas"
+}}
+
+Se não conseguir extrair todas as informações, use valores padrão razoáveis.
+"""
+
+EXPERIENCE_BATCH_PROMPT = """
+Analise as {total} descrições de experiência profissional abaixo, cada uma identificada por "### Item N", e extraia as informações de cada uma de forma estruturada e independente:
+
+{itens}
+
+Para cada item, preencha cargo, responsabilidades principais, habilidades utilizadas e resultados alcançados.
+Retorne SOMENTE um array JSON válido com {total} objetos, na mesma ordem dos itens, com a seguinte estrutura:
+[
+    {{
+        "item": 1,
+        "cargo": "Título do cargo",
+        "responsabilidades": "Descrição das responsabilidades",
+        "habilidades": ["Habilidade 1", "Habilidade 2"],
+        "resultados": "Resultados e conquistas"
+    }}
+]
+
+Se não conseguir extrair todas as informações de um item, use valores padrão razoáveis.
+"""
+
+
+def _response_json_text(response) -> str:
+    """Extract and clean the JSON text of a chat completion"""
+    response_text = response.choices[0].message['content'].strip()
+    # Remove code block markers if present
+    return response_text.replace('```json', '').replace('```', '').strip()
+
+
+def _with_experience_defaults(experience_data: Dict[str, Any]) -> Dict[str, Any]:
+    # Provide default values if some fields are missing
+    experience_data['habilidades'] = experience_data.get('habilidades', [])
+    experience_data['responsabilidades'] = experience_data.get('responsabilidades', 'Informações não especificadas')
+    experience_data['resultados'] = experience_data.get('resultados', 'Resultados não detalhados')
+    return experience_data
+
+def web_processes() -> int:
+    """Worker processes serving the webhook (WEB_CONCURRENCY, as read by gunicorn.conf.py)"""
+    return int(os.getenv('WEB_CONCURRENCY', '1'))
+
+# Métricas expostas em /metrics (formato de texto do Prometheus). Ficam na memória
+# do processo: cada processo expõe só os próprios números (ver gunicorn.conf.py)
+metrics_registry = MetricsRegistry()
+PHASE_SECONDS = metrics_registry.histogram(
+    'bot_phase_seconds', 'Tempo de cada fase do processamento de uma mensagem', ('step', 'phase'))
+MESSAGE_SECONDS = metrics_registry.histogram(
+    'bot_message_seconds', 'Tempo total de process_message por passo da conversa', ('step',))
+VALIDATION_FAILURES = metrics_registry.counter(
+    'bot_validation_failures_total', 'Respostas rejeitadas pela validação', ('field',))
+EXTRACTION_PATHS = metrics_registry.counter(
+    'bot_extraction_path_total', 'Extrações de experiência por caminho (local, llm, shadow)', ('path',))
+EXTRACTION_FALLBACKS = metrics_registry.counter(
+    'bot_extraction_fallbacks_total', 'Extrações que terminaram no dicionário de fallback', ('reason',))
+MATCHING_FALLBACKS = metrics_registry.counter(
+    'bot_matching_without_results_total', 'Buscas de vagas sem resultado', ('kind',))
+DUPLICATE_MESSAGES = metrics_registry.counter(
+    'bot_duplicate_messages_total', 'Reenvios do Twilio descartados pelo MessageSid')
+ERRORS = metrics_registry.counter(
+    'bot_errors_total', 'Erros inesperados no processamento de mensagens', ('step',))
+
 # Load environment variables
 load_dotenv()
-openai.api_key = os.getenv('OPENAI_API_KEY')
+
+
+def catalog_settings() -> Tuple[str, str, Type]:
+    """CSV, saved index path and index class of the configured catalog mode"""
+    catalog_file = os.getenv('CATALOG_PATH', 'vagas_tecnologia_atualizado.csv')
+    # CATALOG_MODE=ooc: catálogos grandes demais para a memória, ingeridos em blocos
+    # e consultados por arquivos mapeados em memória (ver streaming_index.py)
+    if os.getenv('CATALOG_MODE', 'memory') == 'ooc':
+        from streaming_index import StreamingJobIndex
+        return catalog_file, os.getenv('CATALOG_OOC_PATH', 'vagas_ooc'), StreamingJobIndex
+    return catalog_file, os.getenv('CATALOG_INDEX_PATH', 'vagas_index.pkl'), JobIndex
+
+
+# Catálogo e dicionário do extrator local carregados por preload_catalog() no processo
+# mestre do gunicorn: os workers criados por fork compartilham essas páginas (copy-on-write)
+_preloaded: Dict[str, Any] = {}
+
+
+def preload_catalog():
+    """Load the read-only catalog structures once, before the workers fork"""
+    catalog_file, index_file, index_class = catalog_settings()
+    index = index_class.load_or_build(catalog_file, index_file, stop_words=stop_words)
+    skills, titles = index.catalog_terms()
+    _preloaded['index'] = index
+    _preloaded['local_extractor'] = LocalExperienceExtractor(skills, titles, version=index.version)
 
 # Reuse existing dataclasses and validation logic
 @dataclass
@@ -54,91 +177,155 @@ class ValidationError(Exception):
 class WhatsAppRecruitmentBot:
     def __init__(self):
         # Load or initialize the bot's state
-        self.state_file = 'bot_state.json'
-        self.candidate_states = {}
-        self.vagas_df = pd.read_csv('vagas_tecnologia_atualizado.csv', encoding='utf-8')
-        self.vectorizer = TfidfVectorizer(stop_words=stop_words)
-        
-    def _buscar_vagas_compativeis(self, experiencia: Dict[str, Any], top_n: int = 5) -> List[Dict]:
+        self.state_file = os.getenv('SESSION_LEGACY_JSON', 'bot_state.json')
+        session_backend = os.getenv('SESSION_STORE', 'sqlite')
+        self.session_store = create_session_store(
+            session_backend,
+            os.getenv('SESSION_PATH', self.state_file if session_backend == 'json' else 'bot_state.db'),
+            encoder=NpEncoder,
+            legacy_json_path=self.state_file,
+            cache_size=int(os.getenv('SESSION_CACHE_SIZE', '10000')),
+            cache_ttl=float(os.getenv('SESSION_CACHE_TTL', '1800')),
+            flush_interval=float(os.getenv('SESSION_FLUSH_INTERVAL', '1')),
+            # Sessões abandonadas há mais de 7 dias são apagadas (0 desativa)
+            session_expiry=float(os.getenv('SESSION_EXPIRY', str(7 * 24 * 3600))),
+            # O cache só é seguro com um processo por store (ver gunicorn.conf.py)
+            processes=web_processes()
+        )
+        self.catalog_file, self.index_file, index_class = catalog_settings()
+        # Índice pré-construído: só é reconstruído (em segundo plano) quando o CSV do catálogo muda
+        self.catalog = CatalogManager(
+            self.catalog_file,
+            self.index_file,
+            stop_words=stop_words,
+            poll_interval=float(os.getenv('CATALOG_POLL_INTERVAL', '30')),
+            index_class=index_class,
+            index=_preloaded.get('index'),
+            on_swap=self._refresh_local_extractor
+        )
+
+        # Cadastros em segmentos JSONL por shard, indexados por email e telefone
+        # (migração dos arquivos antigos: python candidate_store.py migrate candidates)
+        self.candidate_store = CandidateStore(
+            os.getenv('CANDIDATE_STORE', 'candidate_store'),
+            encoder=NpEncoder
+        )
+
+        # Índice reverso de candidatos (vaga -> candidatos), carregado na primeira consulta
+        self.candidate_index = CandidateIndex(
+            self.candidate_store,
+            path=os.getenv('CANDIDATE_INDEX_PATH', 'candidatos_index.pkl'),
+            refresh_interval=float(os.getenv('CANDIDATE_INDEX_REFRESH', '60'))
+        )
+
+        # Cache de extrações do LLM (LLM_CACHE=0 desativa e volta à temperatura 0.7)
+        self.extraction_cache = ExtractionCache(
+            max_entries=int(os.getenv('LLM_CACHE_SIZE', '1024')),
+            path=os.getenv('LLM_CACHE_PATH', 'llm_cache.db') or None,
+            max_bytes=int(os.getenv('LLM_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+        ) if os.getenv('LLM_CACHE', '1') == '1' else None
+
+        # Extrator local antes do LLM: 'hybrid' (padrão), 'llm', 'local' ou 'shadow'
+        # ('shadow' sempre usa o LLM, mas conta quantas vezes o extrator local bastaria)
+        # Chamadas ao LLM com limite de concorrência, prazo, retentativas e disjuntor
+        self.llm_client = LLMClient(
+            max_concurrency=int(os.getenv('LLM_MAX_CONCURRENCY', '8')),
+            acquire_timeout=float(os.getenv('LLM_ACQUIRE_TIMEOUT', '2')),
+            request_timeout=float(os.getenv('LLM_REQUEST_TIMEOUT', '15')),
+            deadline=float(os.getenv('LLM_DEADLINE', '30')),
+            max_retries=int(os.getenv('LLM_MAX_RETRIES', '2')),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv('LLM_BREAKER_FAILURES', '5')),
+                reset_timeout=float(os.getenv('LLM_BREAKER_RESET', '30'))
+            ),
+            api_key=os.getenv('OPENAI_API_KEY'),
+            # Permite apontar para o servidor falso (fake_llm.py) ou para um proxy compatível
+            api_base=os.getenv('OPENAI_API_BASE')
+        )
+
+        # Micro-batching opcional: extrações simultâneas de vários candidatos em um só prompt
+        self.extraction_batcher = ExtractionBatcher(
+            self._request_experience_batch,
+            self._request_experience,
+            max_items=int(os.getenv('LLM_BATCH_MAX_ITEMS', '8')),
+            max_wait_ms=float(os.getenv('LLM_BATCH_MAX_WAIT_MS', '20')),
+            workers=int(os.getenv('LLM_BATCH_WORKERS', '4'))
+        ) if os.getenv('LLM_BATCH_ENABLED', '0') == '1' else None
+
+        # ASK_PREFERENCES=1: pergunta as preferências de vaga em um passo próprio, antes da busca
+        self.ask_preferences = os.getenv('ASK_PREFERENCES', '0') == '1'
+
+        self.extraction_mode = os.getenv('EXTRACTION_MODE', 'hybrid')
+        self.local_extraction_threshold = float(os.getenv('LOCAL_EXTRACTION_THRESHOLD', '0.8'))
+        # Dicionário do extrator local: compilado na partida (ou no mestre, com preload)
+        # e recompilado na thread de reconstrução do catálogo, nunca em uma requisição
+        self._local_extractor = _preloaded.get('local_extractor')
+        self._local_extractor_lock = threading.Lock()
+        self._refresh_local_extractor(self.catalog.current)
+        self.catalog.start()
+        self.extraction_paths = Counter()
+        self._extraction_paths_lock = threading.Lock()
+
+        # Locks por faixa de telefones: serializa mensagens do mesmo usuário
+        self._phone_locks = [threading.Lock() for _ in range(int(os.getenv('PHONE_LOCK_STRIPES', '64')))]
+
+        # Passo da mensagem em processamento nesta thread, usado como label das métricas
+        self._metrics_context = threading.local()
+
+    @property
+    def job_index(self) -> JobIndex:
+        return self.catalog.current
+
+    def _buscar_vagas_compativeis(self, experiencia: Dict[str, Any], top_n: int = 5,
+                                  filtros: Optional[Dict[str, Any]] = None) -> List[Dict]:
         """
         Busca vagas compatíveis com a experiência do candidato.
         """
-        # Preparar texto de busca
-        texto_experiencia = ' '.join([
-            experiencia.get('cargo', ''),
-            experiencia.get('responsabilidades', ''),
-            ' '.join(experiencia.get('habilidades', [])),
-            experiencia.get('resultados', '')
-        ]).lower()
-
-        # Preparar dados das vagas
-        vagas_texto = self.vagas_df.apply(
-            lambda row: ' '.join([
-                str(row['nome_vaga']),
-                str(row['descricao']),
-                str(row['skills_necessarias'])
-            ]).lower(), 
-            axis=1
-        )
+        return self._buscar_vagas_compativeis_lote([experiencia], top_n=top_n, filtros=[filtros])[0]
 
-        # Concatenar texto da experiência e das vagas para treino comum do vectorizer
-        textos = [texto_experiencia] + vagas_texto.tolist()
-        self.vectorizer.fit(textos)  # Ajusta o vectorizer com todos os textos
-
-        # Vetorização
-        experiencia_vetor = self.vectorizer.transform([texto_experiencia])
-        vagas_vetores = self.vectorizer.transform(vagas_texto)
-
-        # Calcular similaridade
-        similaridades = cosine_similarity(experiencia_vetor, vagas_vetores)[0]
-
-        # Obter top N vagas
-        indices_top_n = similaridades.argsort()[-top_n:][::-1]
-
-        # Formatar resultados
-        vagas_compativeis = []
-        for idx in indices_top_n:
-            vaga = self.vagas_df.iloc[idx]
-            vagas_compativeis.append({
-                'id_vaga': vaga['id_vaga'],
-                'nome_vaga': vaga['nome_vaga'],
-                'descricao': vaga['descricao'],
-                'skills_necessarias': vaga['skills_necessarias'],
-                'salario': vaga['salario'],
-                'modalidade': vaga['modalidade'],
-                'local': vaga['local'],
-                'similaridade': similaridades[idx]
-            })
-
-        return vagas_compativeis
+    def _buscar_vagas_compativeis_lote(self, experiencias: List[Dict[str, Any]], top_n: int = 5,
+                                       filtros: Optional[List[Optional[Dict[str, Any]]]] = None) -> List[List[Dict]]:
+        """
+        Busca vagas compatíveis para vários perfis de uma vez (um único produto esparso).
+        """
+        with self._timed('matching'):
+            textos = [experience_text(experiencia) for experiencia in experiencias]
+
+            # Um único snapshot por busca, mesmo que o catálogo seja trocado no meio
+            return self.catalog.current.search_batch(textos, top_n=top_n, filtros=filtros)
+
+    def _resolver_vaga(self, referencia: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Resolve uma referência {'id_vaga', 'similaridade'} guardada na sessão para o
+        registro completo da vaga no catálogo carregado (None se a vaga saiu do catálogo).
+        """
+        if 'nome_vaga' in referencia:
+            # Sessões antigas guardavam a vaga inteira
+            return referencia
+        index = self.catalog.current
+        row = index.row_of(referencia['id_vaga'])
+        if row is None:
+            return None
+        return index.results_for_rows(np.array([row]), np.array([referencia['similaridade']]))[0]
+
+    def _timed(self, phase: str):
+        """Time one phase of the current message, labeled with its conversation step"""
+        return PHASE_SECONDS.time(step=getattr(self._metrics_context, 'step', ''), phase=phase)
 
     def _save_state(self, phone_number: str, state: Dict[str, Any]):
         """Save the conversation state for a specific phone number"""
-        try:
-            with open(self.state_file, 'r') as f:
-                states = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            states = {}
-        
-        states[phone_number] = state
-        
-        with open(self.state_file, 'w') as f:
-            json.dump(states, f, indent=2, cls=NpEncoder)
+        with self._timed('save_state'):
+            self.session_store.set(phone_number, state)
 
     def _load_state(self, phone_number: str) -> Dict[str, Any]:
         """Load the conversation state for a specific phone number"""
-        try:
-            with open(self.state_file, 'r') as f:
-                states = json.load(f)
-                return states.get(phone_number, {
-                    'current_step': 'email',
-                    'candidate_data': {}
-                })
-        except (FileNotFoundError, json.JSONDecodeError):
+        state = self.session_store.get(phone_number)
+        if state is None:
             return {
                 'current_step': 'apresentar',
                 'candidate_data': {}
             }
+        return state
 
     def _validate_email(self, email: str) -> bool:
         pattern = r'^[\w\.-]+@[\w\.-]+\.\w+$'
@@ -165,74 +352,78 @@ class WhatsAppRecruitmentBot:
         numeros = ''.join(filter(str.isdigit, telefone))
         return 10 <= len(numeros) <= 11
     
+    @property
+    def local_extractor(self) -> LocalExperienceExtractor:
+        """Skills/title dictionary compiled from the current catalog snapshot"""
+        return self._local_extractor
+
+    def _refresh_local_extractor(self, index: JobIndex):
+        """Compile the local extractor dictionary for a new catalog snapshot"""
+        with self._local_extractor_lock:
+            extractor = self._local_extractor
+            if extractor is None or extractor.version != index.version:
+                skills, titles = index.catalog_terms()
+                self._local_extractor = LocalExperienceExtractor(skills, titles, version=index.version)
+
+    def _count_extraction_path(self, path: str):
+        with self._extraction_paths_lock:
+            self.extraction_paths[path] += 1
+        EXTRACTION_PATHS.inc(path=path)
+
+    def _extract_experience(self, message: str) -> Dict[str, Any]:
+        """
+        Extract the experience locally when the dictionary match is confident
+        enough, falling back to the LLM otherwise
+        """
+        with self._timed('extraction'):
+            return self._extract_experience_untimed(message)
+
+    def _extract_experience_untimed(self, message: str) -> Dict[str, Any]:
+        if self.extraction_mode != 'llm':
+            experience_data, confidence = self.local_extractor.extract(message)
+            confident = confidence >= self.local_extraction_threshold
+            if self.extraction_mode == 'local' or (self.extraction_mode == 'hybrid' and confident):
+                self._count_extraction_path('local')
+                return experience_data
+            if self.extraction_mode == 'shadow' and confident:
+                self._count_extraction_path('shadow_local_confident')
+
+        self._count_extraction_path('llm')
+        return self._parse_experience_with_prompt(message)
+
     def _parse_experience_with_prompt(self, message: str) -> Dict[str, Any]:
         """
         More robust method to parse professional experience using a detailed GPT prompt
         """
-        try:
-            # Detailed prompt to guide GPT in extracting experience information
-            prompt = f"""
-Analise a seguinte descrição de experiência profissional e extraia as informações de forma estruturada:
+        keys = {}
+        if self.extraction_cache is not None:
+            # Cada resultado fica sob a chave do prompt que o produziu; a do lote só é
+            # consultada com o micro-batching ativo, quando ele também poderia respondê-la
+            keys[False] = cache_key(message, EXPERIENCE_MODEL, str(EXPERIENCE_MAX_TOKENS),
+                                    EXPERIENCE_SYSTEM_PROMPT, EXPERIENCE_PROMPT)
+            keys[True] = cache_key(message, EXPERIENCE_MODEL, str(EXPERIENCE_MAX_TOKENS),
+                                   EXPERIENCE_SYSTEM_PROMPT, EXPERIENCE_BATCH_PROMPT)
+            for batched in ((False, True) if self.extraction_batcher is not None else (False,)):
+                cached = self.extraction_cache.get(keys[batched])
+                if cached is not None:
+                    return cached
 
-{message}
-
-Por favor, preencha as seguintes informações. Se algum detalhe não estiver claro, faça sua melhor interpretação:
-
-1. Cargo (título do trabalho)
-2. Responsabilidades principais (descrição das principais tarefas)
-3. Habilidades utilizadas (lista de habilidades técnicas e soft skills)
-4. Resultados alcançados (impactos mensuráveis ou conquistas)
-
-Retorne um JSON válido com a seguinte estrutura:
-{{
-    "cargo": "Título do cargo",
-    "responsabilidades": "Descrição das responsabilidades",
-    "habilidades": ["Habilidade 1", "Habilidade 2"],
-    "resultados": "Resultados e conquistas"
-}}
-
-Se não conseguir extrair todas as informações, use valores padrão razoáveis.
-"""
-            
-            # Call OpenAI API with a more flexible approach
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system", 
-                        "content": "Você é um assistente especializado em extrair informações estruturadas de descrições de experiência profissional."
-                    },
-                    {
-                        "role": "user", 
-                        "content": prompt
-                    }
-                ],
-                max_tokens=300,  # Limit token usage
-                temperature=0.7  # Add some creativity to interpretation
-            )
-            
-            # Extract and clean the JSON response
-            response_text = response.choices[0].message['content'].strip()
-            
-            # Remove code block markers if present
-            response_text = response_text.replace('```json', '').replace('```', '').strip()
-            
-            # Parse the JSON
-            experience_data = json.loads(response_text)
-            
-            # Validate the extracted data
-            if not experience_data.get('cargo'):
-                raise ValueError("Cargo não identificado")
+        try:
+            # Com o micro-batching ativo, a mensagem espera alguns ms e segue junto com as de outros candidatos
+            if self.extraction_batcher is not None:
+                experience_data, batched = self.extraction_batcher.submit(message).result()
+            else:
+                experience_data, batched = self._request_experience(message), False
             
-            # Provide default values if some fields are missing
-            experience_data['habilidades'] = experience_data.get('habilidades', [])
-            experience_data['responsabilidades'] = experience_data.get('responsabilidades', 'Informações não especificadas')
-            experience_data['resultados'] = experience_data.get('resultados', 'Resultados não detalhados')
+            # Só extrações bem-sucedidas vão para o cache; os fallbacks abaixo não
+            if keys:
+                self.extraction_cache.put(keys[batched], experience_data)
             
             return experience_data
         
         except json.JSONDecodeError:
             # If JSON parsing fails, try a more lenient parsing
+            EXTRACTION_FALLBACKS.inc(reason='json')
             return {
                 "cargo": "Cargo não especificado",
                 "responsabilidades": message,
@@ -242,6 +433,7 @@ Se não conseguir extrair todas as informações, use valores padrão razoáveis
         
         except Exception as e:
             # Fallback method if GPT parsing completely fails
+            EXTRACTION_FALLBACKS.inc(reason=type(e).__name__)
             return {
                 "cargo": "Cargo não identificado",
                 "responsabilidades": message,
@@ -249,13 +441,96 @@ Se não conseguir extrair todas as informações, use valores padrão razoáveis
                 "resultados": f"Erro na extração: {str(e)}"
             }
 
+    def _request_experience(self, message: str) -> Dict[str, Any]:
+        """Extract one experience with one LLM call (raises on API or parsing errors)"""
+        # Detailed prompt to guide GPT in extracting experience information
+        prompt = EXPERIENCE_PROMPT.format(message=message)
+        
+        # Call OpenAI API with a more flexible approach
+        response = self.llm_client.chat_completion(
+            model=EXPERIENCE_MODEL,
+            messages=[
+                {
+                    "role": "system", 
+                    "content": EXPERIENCE_SYSTEM_PROMPT
+                },
+                {
+                    "role": "user", 
+                    "content": prompt
+                }
+            ],
+            max_tokens=EXPERIENCE_MAX_TOKENS,  # Limit token usage
+            # Respostas cacheadas precisam ser reproduzíveis; sem cache, um pouco de criatividade
+            temperature=0 if self.extraction_cache is not None else 0.7
+        )
+        
+        # Parse the JSON
+        experience_data = json.loads(_response_json_text(response))
+        
+        # Validate the extracted data
+        if not experience_data.get('cargo'):
+            raise ValueError("Cargo não identificado")
+        
+        return _with_experience_defaults(experience_data)
+
+    def _request_experience_batch(self, messages: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Extract several experiences with one LLM call. Items missing from the
+        answer or without a cargo come back as None and are retried one by one.
+        """
+        itens = "\n\n".join(f"### Item {i}\n{message}" for i, message in enumerate(messages, 1))
+        response = self.llm_client.chat_completion(
+            model=EXPERIENCE_MODEL,
+            messages=[
+                {"role": "system", "content": EXPERIENCE_SYSTEM_PROMPT},
+                {"role": "user", "content": EXPERIENCE_BATCH_PROMPT.format(total=len(messages), itens=itens)}
+            ],
+            max_tokens=EXPERIENCE_MAX_TOKENS * len(messages),
+            temperature=0 if self.extraction_cache is not None else 0.7
+        )
+        extraidos = json.loads(_response_json_text(response))
+        if not isinstance(extraidos, list):
+            raise ValueError("Resposta do lote não é um array JSON")
+
+        resultados: List[Optional[Dict[str, Any]]] = [None] * len(messages)
+        for posicao, item in enumerate(extraidos):
+            if not isinstance(item, dict):
+                continue
+            # O campo "item" identifica a mensagem; sem ele, vale a posição no array
+            indice = item.pop('item', posicao + 1)
+            if isinstance(indice, int) and 1 <= indice <= len(messages) and item.get('cargo'):
+                resultados[indice - 1] = _with_experience_defaults(item)
+        return resultados
+
+    def is_slow_step(self, phone_number: str, message: str) -> bool:
+        """Whether this message triggers experience extraction or job matching"""
+        message = message.strip()
+        if message.lower() in ['reiniciar', 'resetar', 'começar', 'start']:
+            return False
+        current_step = self._load_state(phone_number).get('current_step', 'email')
+        if current_step == 'confirmar_experiencia':
+            # O "não" dispara a busca de vagas, a menos que as preferências sejam um passo próprio
+            return not self.ask_preferences and bool(NO_MORE_EXPERIENCE.match(message))
+        return current_step in ('experiencia', 'preferencias')
+
     def process_message(self, phone_number: str, message: str) -> Dict[str, Any]:
         """Process incoming WhatsApp message and return response"""
+        # Mensagens do mesmo telefone em série (o estado é lido, alterado e gravado);
+        # telefones em faixas de lock diferentes seguem em paralelo
+        with self._phone_locks[hash(phone_number) % len(self._phone_locks)]:
+            start = time.perf_counter()
+            response = self._process_message(phone_number, message)
+            MESSAGE_SECONDS.observe(time.perf_counter() - start, step=self._metrics_context.step)
+            return response
+
+    def _process_message(self, phone_number: str, message: str) -> Dict[str, Any]:
         # Load or initialize state for this phone number
+        start = time.perf_counter()
         state = self._load_state(phone_number)
         candidate_data = state.get('candidate_data', {})
         current_step = state.get('current_step', 'email')
-        print(state, candidate_data, current_step)
+        self._metrics_context.step = current_step
+        PHASE_SECONDS.observe(time.perf_counter() - start, step=current_step, phase='load_state')
 
         # Normalize message input
         message = message.strip()
@@ -285,6 +560,7 @@ Se não conseguir extrair todas as informações, use valores padrão razoáveis
             # Validation and progression logic based on current step
             elif current_step == 'email':
                 if not self._validate_email(message):
+                    VALIDATION_FAILURES.inc(field='email')
                     return {
                         'reply': "Email inválido. Por favor, forneça um email válido (ex: seu.nome@email.com)",
                         'continue_flow': True
@@ -300,6 +576,7 @@ Se não conseguir extrair todas as informações, use valores padrão razoáveis
 
             elif current_step == 'nome_completo':
                 if not self._validate_nome(message):
+                    VALIDATION_FAILURES.inc(field='nome_completo')
                     return {
                         'reply': "Por favor, forneça seu nome completo com pelo menos nome e sobrenome",
                         'continue_flow': True
@@ -315,6 +592,7 @@ Se não conseguir extrair todas as informações, use valores padrão razoáveis
 
             elif current_step == 'data_nascimento':
                 if not self._validate_data_nascimento(message):
+                    VALIDATION_FAILURES.inc(field='data_nascimento')
                     return {
                         'reply': "Data de nascimento inválida. Por favor, use o formato DD/MM/AAAA e forneça uma data válida",
                         'continue_flow': True
@@ -337,7 +615,7 @@ Me conte sobre sua experiência profissional mais recente:
             elif current_step == 'experiencia':
                 try:
                     # Use the improved parsing method
-                    experience_data = self._parse_experience_with_prompt(message)
+                    experience_data = self._extract_experience(message)
                     
                     # Initialize experiences list if not exists
                     if 'experiencias' not in candidate_data:
@@ -359,6 +637,7 @@ Me conte sobre sua experiência profissional mais recente:
     Resultados: {experience_data['resultados']}
 
     Deseja adicionar mais uma experiência profissional? (sim/não)
+    Se não, pode dizer também suas preferências de vaga (ex: não, remoto em Recife acima de 8 mil)
     """,
                         'continue_flow': True,
                         'next_step': 'confirmar_experiencia'
@@ -384,42 +663,22 @@ Me conte sobre sua experiência profissional mais recente:
                         'reply': "Me conte sobre sua próxima experiência profissional.",
                         'continue_flow': True
                     }
-                elif message == 'não':
-                    # Pegar a última experiência
-                    ultima_experiencia = candidate_data['experiencias'][-1]
-                    
-                    # Buscar vagas compatíveis
-                    vagas_compativeis = self._buscar_vagas_compativeis(ultima_experiencia)
-                    print(vagas_compativeis)
-                    
-                    # Formatar resposta
-                    if vagas_compativeis:
-                        resposta = "🏢 Vagas Compatíveis Encontradas:\n\n"
-                        for i, vaga in enumerate(vagas_compativeis, 1):
-                            resposta += f"*Vaga {i}:*\n"
-                            resposta += f"📋 *Título:* {vaga['nome_vaga']}\n"
-                            resposta += f"💰 *Salário:* {vaga['salario']}\n"
-                            resposta += f"🌍 *Modalidade:* {vaga['modalidade']}\n"
-                            resposta += f"📍 *Local:* {vaga['local']}\n"
-                            resposta += f"🔧 *Habilidades:* {vaga['skills_necessarias']}\n\n"
-                        
-                        resposta += "Gostaria de se candidatar a alguma dessas vagas? (Digite o número da vaga)"
-                        
-                        # Atualizar estado para próximo passo de candidatura
-                        state['current_step'] = 'selecionar_vaga'
-                        state['vagas_compativeis'] = vagas_compativeis
+                elif NO_MORE_EXPERIENCE.match(message):
+                    state['candidate_data'] = candidate_data
+                    if self.ask_preferences:
+                        state['current_step'] = 'preferencias'
                         self._save_state(phone_number, state)
-                        
                         return {
-                            'reply': resposta,
+                            'reply': "Você tem alguma preferência de vaga? Informe modalidade (remoto, híbrido ou presencial), "
+                                "cidade, habilidades e/ou salário mínimo (ex: remoto, Recife, 8 mil) ou responda 'não' para ver todas.",
                             'continue_flow': True
                         }
-                    else:
-                        saved_file = self._save_candidate(candidate_data)
-                        return {
-                            'reply': f"Cadastro finalizado! Dados salvos em: {saved_file}\nNenhuma vaga compatível encontrada no momento.",
-                            'continue_flow': False
-                        }
+                    # Preferências ditas junto com o "não" (ex: "não, só remoto acima de 8 mil") filtram a busca
+                    filtros = self.job_index.parse_preferencias(NO_MORE_EXPERIENCE.sub('', message, count=1))
+                    return self._responder_vagas(phone_number, state, filtros)
+
+            if current_step == 'preferencias':
+                return self._responder_vagas(phone_number, state, self.job_index.parse_preferencias(message))
 
             # Novo passo para seleção de vaga
             if current_step == 'selecionar_vaga':
@@ -428,7 +687,12 @@ Me conte sobre sua experiência profissional mais recente:
                     vagas_compativeis = state.get('vagas_compativeis', [])
                     
                     if 0 <= numero_vaga < len(vagas_compativeis):
-                        vaga_selecionada = vagas_compativeis[numero_vaga]
+                        vaga_selecionada = self._resolver_vaga(vagas_compativeis[numero_vaga])
+                        if vaga_selecionada is None:
+                            return {
+                                'reply': "Essa vaga não está mais disponível. Por favor, escolha outro número da lista.",
+                                'continue_flow': True
+                            }
                         
                         # Lógica para candidatura à vaga (pode ser expandida)
                         return {
@@ -437,11 +701,13 @@ Me conte sobre sua experiência profissional mais recente:
                             'continue_flow': False
                         }
                     else:
+                        VALIDATION_FAILURES.inc(field='numero_vaga')
                         return {
                             'reply': "Número de vaga inválido. Por favor, escolha um número da lista.",
                             'continue_flow': True
                         }
                 except ValueError:
+                    VALIDATION_FAILURES.inc(field='numero_vaga')
                     return {
                         'reply': "Por favor, digite apenas o número da vaga.",
                         'continue_flow': True
@@ -450,6 +716,7 @@ Me conte sobre sua experiência profissional mais recente:
         except Exception as e:
             # Comprehensive error handling
             print(f"Error processing message: {e}")  # Log the error
+            ERRORS.inc(step=current_step)
             return {
                 'reply': f"""
     Ocorreu um erro inesperado. {str(e)}
@@ -460,48 +727,249 @@ Me conte sobre sua experiência profissional mais recente:
                 'current_step': 'email'
             }
 
-    def _save_candidate(self, candidate_data: Dict[str, Any]) -> str:
-        """Save candidate data to a JSON file"""
-        storage_dir = "candidates"
-        if not os.path.exists(storage_dir):
-            os.makedirs(storage_dir)
-        
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{candidate_data.get('email', 'unknown').split('@')[0]}_{timestamp}.json"
-        file_path = os.path.join(storage_dir, filename)
-        candidate_data = self.convert_int64_to_int(candidate_data)
-        
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(candidate_data, f, ensure_ascii=False, indent=2)
-        
-        return file_path
+    def _responder_vagas(self, phone_number: str, state: Dict[str, Any],
+                         filtros: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Match the last experience (restricted to the stated preferences) and list the jobs"""
+        candidate_data = state['candidate_data']
+        # Pegar a última experiência
+        ultima_experiencia = candidate_data['experiencias'][-1]
+
+        # Buscar vagas compatíveis, restritas às preferências informadas
+        vagas_compativeis = self._buscar_vagas_compativeis(ultima_experiencia, filtros=filtros)
+        resposta = ""
+        if filtros and not vagas_compativeis:
+            MATCHING_FALLBACKS.inc(kind='filtrada')
+            resposta = "Nenhuma vaga atende a todas as suas preferências. Estas são as mais próximas do seu perfil:\n\n"
+            vagas_compativeis = self._buscar_vagas_compativeis(ultima_experiencia)
+
+        # Formatar resposta
+        if vagas_compativeis:
+            with self._timed('render'):
+                resposta += "🏢 Vagas Compatíveis Encontradas:\n\n"
+                for i, vaga in enumerate(vagas_compativeis, 1):
+                    resposta += f"*Vaga {i}:*\n"
+                    resposta += f"📋 *Título:* {vaga['nome_vaga']}\n"
+                    resposta += f"💰 *Salário:* {vaga['salario']}\n"
+                    resposta += f"🌍 *Modalidade:* {vaga['modalidade']}\n"
+                    resposta += f"📍 *Local:* {vaga['local']}\n"
+                    resposta += f"🔧 *Habilidades:* {vaga['skills_necessarias']}\n\n"
+
+                resposta += "Gostaria de se candidatar a alguma dessas vagas? (Digite o número da vaga)"
+
+            # Atualizar estado para próximo passo de candidatura
+            state['current_step'] = 'selecionar_vaga'
+            # Só referências na sessão; a vaga completa é relida do catálogo na seleção
+            state['vagas_compativeis'] = [
+                {'id_vaga': vaga['id_vaga'], 'similaridade': round(vaga['similaridade'], 4)}
+                for vaga in vagas_compativeis
+            ]
+            state['versao_catalogo'] = vagas_compativeis[0]['versao_catalogo']
+            self._save_state(phone_number, state)
+
+            return {
+                'reply': resposta,
+                'continue_flow': True
+            }
+        MATCHING_FALLBACKS.inc(kind='sem_resultado')
+        saved_file = self._save_candidate(candidate_data, phone_number)
+        return {
+            'reply': f"Cadastro finalizado! Dados salvos em: {saved_file}\nNenhuma vaga compatível encontrada no momento.",
+            'continue_flow': False
+        }
+
+    def _save_candidate(self, candidate_data: Dict[str, Any], phone_number: str) -> str:
+        """Append candidate data to the candidate store"""
+        # O número do WhatsApp identifica o candidato quando não há telefone informado
+        if not candidate_data.get('telefone'):
+            candidate_data['telefone'] = phone_number.replace('whatsapp:', '')
+        location = self.candidate_store.append(candidate_data)
+        # Sem esperar uma consulta que esteja revetorizando o índice
+        self.candidate_index.refresh(blocking=False)
+        return location
 
 # Flask API setup
 app = Flask(__name__)
-bot = WhatsAppRecruitmentBot()
+bot: Optional[WhatsAppRecruitmentBot] = None
+
+
+def init_bot() -> WhatsAppRecruitmentBot:
+    """Create the bot of this process (its SQLite connections and threads do not survive a fork)"""
+    global bot
+    bot = WhatsAppRecruitmentBot()
+    return bot
+
+
+# PRELOAD_APP=1 (gunicorn.conf.py): o mestre só carrega o catálogo e cada worker chama init_bot() após o fork
+if os.getenv('PRELOAD_APP', '0') == '1':
+    preload_catalog()
+else:
+    init_bot()
+
+# Modo assíncrono: passos lentos respondem "processando" e a resposta final vai pelo sender
+async_replies = os.getenv('ASYNC_REPLIES', '0') == '1'
+async_ack_message = os.getenv('ASYNC_ACK_MESSAGE', 'Processando… ⏳')
+reply_dispatcher = AsyncReplyDispatcher(
+    create_message_sender(),
+    max_workers=int(os.getenv('ASYNC_WORKERS', '8'))
+) if async_replies else None
+
+# MessageSid já recebidos: reenvios do Twilio não passam de novo pelo bot. Com vários
+# workers o reenvio pode cair em outro processo, então a lista fica em um SQLite compartilhado
+if web_processes() > 1:
+    recent_messages = SqliteRecentMessages(os.getenv('MESSAGE_DEDUP_PATH', 'mensagens.db'),
+                                           max_entries=int(os.getenv('MESSAGE_DEDUP_SIZE', '10000')))
+else:
+    recent_messages = RecentMessages(max_entries=int(os.getenv('MESSAGE_DEDUP_SIZE', '10000')))
+
+# Profiler por amostragem, armado em tempo de execução para uma única requisição (POST /admin/perfil)
+profiler = SamplingProfiler(interval=float(os.getenv('PROFILER_INTERVAL_MS', '1')) / 1000)
+
+# Valores lidos na hora da coleta do /metrics
+metrics_registry.gauge('bot_llm_queue_depth', 'Chamadas ao LLM esperando vaga de execução',
+                       lambda: bot.llm_client.stats()['na_fila'])
+metrics_registry.gauge('bot_llm_in_flight', 'Chamadas ao LLM em execução',
+                       lambda: bot.llm_client.stats()['em_execucao'])
+metrics_registry.gauge('bot_llm_circuit_state', 'Estado do disjuntor do LLM (1 no estado atual)',
+                       lambda: {(state,): float(state == bot.llm_client.breaker.state)
+                                for state in (CircuitBreaker.CLOSED, CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN)},
+                       ('state',))
+metrics_registry.gauge('bot_llm_batch_queue_depth', 'Extrações esperando a formação de um lote',
+                       lambda: bot.extraction_batcher.stats()['na_fila'] if bot.extraction_batcher else None)
+metrics_registry.gauge('bot_session_cache_hit_ratio', 'Taxa de acerto do cache de sessões',
+                       lambda: bot.session_store.stats()['hit_rate'] if hasattr(bot.session_store, 'stats') else None)
+metrics_registry.gauge('bot_catalog_jobs', 'Vagas no catálogo carregado', lambda: len(bot.job_index))
+
+def _reply_text(response_data: Dict[str, Any]) -> str:
+    return response_data.get('reply', 'Desculpe, ocorreu um erro no processamento da sua mensagem.')
+
+def _process(phone_number: str, message: str) -> Dict[str, Any]:
+    if profiler.armed:
+        step = bot._load_state(phone_number).get('current_step', 'email')
+        if profiler.take(telefone=phone_number, passo=step):
+            with profiler.profile(f"{phone_number} {step}"):
+                return bot.process_message(phone_number, message)
+    return bot.process_message(phone_number, message)
+
+def _render_twiml(reply: str) -> str:
+    with bot._timed('twiml'):
+        resp = MessagingResponse()
+        resp.message(reply)
+        return str(resp)
 
 @app.route('/', methods=['POST'])
 def webhook():
+    message_sid = request.form.get('MessageSid')
     try:
         # Dados recebidos do Twilio
         phone_number = request.form.get('From')  # Número do usuário
         message = request.form.get('Body')      # Mensagem do usuário
+
+        if message_sid:
+            is_new, previous_reply = recent_messages.claim(message_sid)
+            if not is_new:
+                # Reenvio: devolve a resposta já produzida (ou nada, se ainda em processamento)
+                DUPLICATE_MESSAGES.inc()
+                return str(previous_reply or MessagingResponse())
         
+        # Com uma resposta assíncrona pendente, o estado da sessão ainda não mudou:
+        # a mensagem entra na fila do telefone, sem aviso, para responder na ordem
+        queued = reply_dispatcher is not None and reply_dispatcher.has_pending(phone_number)
+        if queued or (reply_dispatcher is not None and bot.is_slow_step(phone_number, message)):
+            reply_dispatcher.submit(phone_number, lambda: _reply_text(_process(phone_number, message)))
+            resp = MessagingResponse()
+            if async_ack_message and not queued:
+                resp.message(async_ack_message)
+            if message_sid:
+                recent_messages.complete(message_sid, str(resp))
+            return str(resp)
+
         # Processar a mensagem com o bot
-        response_data = bot.process_message(phone_number, message)
+        response_data = _process(phone_number, message)
         
         # Criar uma resposta para enviar ao Twilio
-        reply = response_data.get('reply', 'Desculpe, ocorreu um erro no processamento da sua mensagem.')
-        resp = MessagingResponse()
-        resp.message(reply)
+        twiml = _render_twiml(_reply_text(response_data))
+        if message_sid:
+            recent_messages.complete(message_sid, twiml)
         
-        return str(resp)
+        return twiml
     except Exception as e:
+        if message_sid:
+            recent_messages.release(message_sid)
         # Responder com erro em caso de falha
         resp = MessagingResponse()
         resp.message("Desculpe, ocorreu um erro inesperado. Por favor, tente novamente.")
         return str(resp), 500
 
+def _admin_authorized() -> bool:
+    admin_token = os.getenv('ADMIN_TOKEN')
+    return bool(admin_token) and request.headers.get('X-Admin-Token') == admin_token
+
+@app.route('/admin/catalogo', methods=['GET'])
+def catalog_status():
+    if not _admin_authorized():
+        return jsonify({'erro': 'não autorizado'}), 403
+    return jsonify(bot.catalog.status())
+
+@app.route('/admin/sessoes', methods=['GET'])
+def session_stats():
+    if not _admin_authorized():
+        return jsonify({'erro': 'não autorizado'}), 403
+    stats = getattr(bot.session_store, 'stats', None)
+    return jsonify(stats() if stats else {})
+
+@app.route('/admin/extracao', methods=['GET'])
+def extraction_stats():
+    if not _admin_authorized():
+        return jsonify({'erro': 'não autorizado'}), 403
+    cache = bot.extraction_cache
+    with bot._extraction_paths_lock:
+        caminhos = dict(bot.extraction_paths)
+    return jsonify({
+        'modo': bot.extraction_mode,
+        'caminhos': caminhos,
+        'cache': cache.stats() if cache else None,
+        'llm': bot.llm_client.stats(),
+        'lotes': bot.extraction_batcher.stats() if bot.extraction_batcher else None
+    })
+
+@app.route('/vagas/<id_vaga>/candidatos', methods=['GET'])
+def best_candidates(id_vaga):
+    if not _admin_authorized():
+        return jsonify({'erro': 'não autorizado'}), 403
+    top_n = request.args.get('top', default=10, type=int)
+    index = bot.job_index
+    candidatos = bot.candidate_index.top_candidates(id_vaga, index, top_n=top_n)
+    if candidatos is None:
+        return jsonify({'erro': f'vaga {id_vaga} não encontrada'}), 404
+    return jsonify({'id_vaga': id_vaga, 'versao_catalogo': index.version, 'candidatos': candidatos})
+
+@app.route('/admin/catalogo/recarregar', methods=['POST'])
+def reload_catalog():
+    if not _admin_authorized():
+        return jsonify({'erro': 'não autorizado'}), 403
+    iniciado = bot.catalog.reload(force=request.args.get('forcar') == '1')
+    return jsonify({'iniciado': iniciado, **bot.catalog.status()}), 202
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    # Sem dados pessoais (só passos, fases e contadores), então sem token, como de costume para o Prometheus
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/perfil', methods=['POST'])
+def arm_profiler():
+    if not _admin_authorized():
+        return jsonify({'erro': 'não autorizado'}), 403
+    # ?telefone=...&passo=... restringem a amostragem à próxima mensagem desse número e/ou passo
+    criterios = {name: request.args.get(name) for name in ('telefone', 'passo') if request.args.get(name)}
+    profiler.arm(**criterios)
+    return jsonify({'armado': True, **criterios}), 202
+
+@app.route('/admin/perfil', methods=['GET'])
+def profiler_results():
+    if not _admin_authorized():
+        return jsonify({'erro': 'não autorizado'}), 403
+    return jsonify({'armado': profiler.armed, 'perfis': profiler.results()})
+
 if __name__ == '__main__':
     # Validar configuração inicial
     if not os.getenv('OPENAI_API_KEY'):
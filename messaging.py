@@ -0,0 +1,221 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Deque, Dict, List, Tuple, Optional
+
+
+class MessageSender:
+    """Envio de mensagens fora da resposta HTTP do webhook"""
+
+    def send(self, to: str, body: str):
+        raise NotImplementedError
+
+
+class TwilioMessageSender(MessageSender):
+    def __init__(self, account_sid: str, auth_token: str, from_number: str):
+        from twilio.rest import Client
+
+        self.client = Client(account_sid, auth_token)
+        self.from_number = from_number
+
+    def send(self, to: str, body: str):
+        self.client.messages.create(from_=self.from_number, to=to, body=body)
+
+
+class StubMessageSender(MessageSender):
+    """Guarda as mensagens em memória em vez de enviá-las; usado para testar o fluxo offline"""
+
+    def __init__(self, echo: bool = True):
+        self.echo = echo
+        self.sent: List[Tuple[str, str]] = []
+        self._lock = threading.Lock()
+
+    def send(self, to: str, body: str):
+        with self._lock:
+            self.sent.append((to, body))
+        if self.echo:
+            print(f"[stub] -> {to}: {body}")
+
+
+def create_message_sender(backend: Optional[str] = None) -> MessageSender:
+    """
+    Build the sender configured by MESSAGE_SENDER ('twilio' or 'stub').
+    There is no default: a missing choice or missing Twilio credentials fail at startup.
+    """
+    backend = backend or os.getenv('MESSAGE_SENDER')
+    if backend == 'twilio':
+        credentials = {name: os.getenv(name) for name in
+                       ('TWILIO_ACCOUNT_SID', 'TWILIO_AUTH_TOKEN', 'TWILIO_WHATSAPP_FROM')}
+        missing = [name for name, value in credentials.items() if not value]
+        if missing:
+            raise ValueError(f"MESSAGE_SENDER=twilio sem {', '.join(missing)}")
+        return TwilioMessageSender(*credentials.values())
+    if backend == 'stub':
+        return StubMessageSender()
+    if not backend:
+        # O stub só imprime as respostas: em produção o usuário nunca as receberia
+        raise ValueError("ASYNC_REPLIES=1 exige MESSAGE_SENDER ('twilio' ou 'stub')")
+    raise ValueError(f"Sender de mensagens desconhecido: {backend}")
+
+
+class RecentMessages:
+    """
+    Últimos MessageSid recebidos (LRU limitado) para descartar os reenvios do
+    Twilio. Guarda também a resposta já produzida, devolvida ao reenvio no
+    lugar de processar a mensagem de novo.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._replies: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.duplicates = 0
+
+    def claim(self, message_id: str) -> Tuple[bool, Optional[str]]:
+        """
+        Register a message id. Returns (True, None) the first time it is seen, and
+        (False, reply) for a retry — reply is None while the first one is still running.
+        """
+        with self._lock:
+            if message_id in self._replies:
+                self._replies.move_to_end(message_id)
+                self.duplicates += 1
+                return False, self._replies[message_id]
+            self._replies[message_id] = None
+            while len(self._replies) > self.max_entries:
+                self._replies.popitem(last=False)
+            return True, None
+
+    def complete(self, message_id: str, reply: str):
+        with self._lock:
+            if message_id in self._replies:
+                self._replies[message_id] = reply
+
+    def release(self, message_id: str):
+        """Forget a message whose processing failed, so a retry is processed again"""
+        with self._lock:
+            self._replies.pop(message_id, None)
+
+
+class SqliteRecentMessages:
+    """
+    RecentMessages compartilhado entre processos (vários workers do gunicorn):
+    o reenvio do Twilio pode cair em outro worker. Mesma interface, guardada em
+    uma tabela SQLite; as entradas mais antigas que `max_entries` são apagadas.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000):
+        self.path = path
+        self.max_entries = max_entries
+        self.duplicates = 0
+        self._claims = 0
+        # Conexões por thread e por processo, abertas no primeiro uso (não sobrevivem ao fork)
+        self._local = threading.local()
+        conn = sqlite3.connect(path, timeout=30)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS messages (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    message_id TEXT NOT NULL UNIQUE,
+                    reply TEXT,
+                    received_at REAL NOT NULL
+                )
+            """)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def claim(self, message_id: str) -> Tuple[bool, Optional[str]]:
+        """Same contract as RecentMessages.claim, across processes"""
+        conn = self._connection()
+        inserted = conn.execute('INSERT OR IGNORE INTO messages (message_id, received_at) VALUES (?, ?)',
+                                (message_id, time.time())).rowcount
+        if not inserted:
+            self.duplicates += 1
+            row = conn.execute('SELECT reply FROM messages WHERE message_id = ?', (message_id,)).fetchone()
+            return False, row[0] if row else None
+        self._claims += 1
+        if self._claims % 100 == 0:
+            conn.execute('DELETE FROM messages WHERE seq <= (SELECT MAX(seq) FROM messages) - ?', (self.max_entries,))
+        return True, None
+
+    def complete(self, message_id: str, reply: str):
+        self._connection().execute('UPDATE messages SET reply = ? WHERE message_id = ?', (reply, message_id))
+
+    def release(self, message_id: str):
+        """Forget a message whose processing failed, so a retry is processed again"""
+        self._connection().execute('DELETE FROM messages WHERE message_id = ?', (message_id,))
+
+
+class AsyncReplyDispatcher:
+    """
+    Executa passos lentos do bot em um pool de threads e entrega a resposta
+    final pelo MessageSender, liberando o webhook imediatamente.
+
+    Cada telefone tem uma fila serial: as mensagens de um mesmo número rodam
+    uma de cada vez, na ordem de chegada, e as respostas saem nessa ordem.
+    """
+
+    def __init__(self, sender: MessageSender, max_workers: int = 8,
+                 error_reply: str = "Desculpe, ocorreu um erro inesperado. Por favor, tente novamente."):
+        self.sender = sender
+        self.error_reply = error_reply
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='reply-worker')
+        self._queues: Dict[str, Deque[Tuple[Callable[[], str], Future]]] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, to: str, produce_reply: Callable[[], str]) -> Future:
+        """Queue a reply after the ones already pending for the same phone"""
+        future = Future()
+        with self._lock:
+            queue = self._queues.get(to)
+            if queue is not None:
+                queue.append((produce_reply, future))
+                return future
+            self._queues[to] = deque([(produce_reply, future)])
+        self._executor.submit(self._drain, to)
+        return future
+
+    def has_pending(self, to: str) -> bool:
+        """Whether a reply for this phone is still queued or running"""
+        with self._lock:
+            return to in self._queues
+
+    def _drain(self, to: str):
+        while True:
+            with self._lock:
+                queue = self._queues[to]
+                if not queue:
+                    # Só sai do dicionário depois da última resposta enviada
+                    del self._queues[to]
+                    return
+                produce_reply, future = queue.popleft()
+            if future.set_running_or_notify_cancel():
+                self._run(to, produce_reply)
+                future.set_result(None)
+
+    def _run(self, to: str, produce_reply: Callable[[], str]):
+        try:
+            reply = produce_reply()
+        except Exception as e:
+            print(f"Error processing async message: {e}")
+            reply = self.error_reply
+        try:
+            self.sender.send(to, reply)
+        except Exception as e:
+            print(f"Error sending async reply to {to}: {e}")
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,249 @@
+"""
+Métricas em memória no formato de texto do Prometheus, sem dependências, e
+um profiler por amostragem que pode ser armado em tempo de execução para uma
+única requisição.
+"""
+import bisect
+import collections
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, List, Tuple, Optional, Callable, Iterator
+
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple:
+        return tuple(labels.get(name, '') for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}'] + self.samples()
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = collections.defaultdict(float)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] += amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {value:g}' for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Por combinação de labels: contagem por faixa (não acumulada), soma e total
+        self._series: Dict[Tuple, List] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, [list(series[0]), series[1], series[2]]) for key, series in self._series.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                labels = _format_labels(self.labelnames, key, 'le="' + le + '"')
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {total:.6f}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {count}')
+        return lines
+
+
+class Gauge(_Metric):
+    """Valor lido na hora da coleta (ex.: tamanho de fila, estado do disjuntor)"""
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], Any], labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        # `read` devolve um número, ou {tupla de labels: número} quando há labels
+        self.read = read
+
+    def samples(self) -> List[str]:
+        try:
+            values = self.read()
+        except Exception:
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [
+            f'{self.name}{_format_labels(self.labelnames, key if isinstance(key, tuple) else (key,))} {float(value):g}'
+            for key, value in sorted(values.items()) if value is not None
+        ]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Métrica duplicada: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, read: Callable[[], Any], labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, read, labelnames))
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class SamplingProfiler:
+    """
+    Profiler por amostragem de uma thread: outra thread lê a pilha dela a cada
+    `interval` segundos (sys._current_frames) e conta as pilhas. O custo fica
+    fora da thread medida, e só existe enquanto o profiler está armado.
+    """
+
+    def __init__(self, interval: float = 0.001, max_results: int = 10):
+        self.interval = interval
+        self._armed: Optional[Dict[str, Any]] = None
+        self._results: "collections.deque[Dict[str, Any]]" = collections.deque(maxlen=max_results)
+        self._lock = threading.Lock()
+
+    def arm(self, **criteria):
+        """Profile the next request whose attributes match every given criterion (e.g. passo='experiencia')"""
+        with self._lock:
+            self._armed = {name: value for name, value in criteria.items() if value}
+
+    def take(self, **attributes) -> bool:
+        """Whether this request should be profiled; disarms the profiler when it is"""
+        with self._lock:
+            if self._armed is None:
+                return False
+            if any(attributes.get(name) != value for name, value in self._armed.items()):
+                return False
+            self._armed = None
+            return True
+
+    @property
+    def armed(self) -> bool:
+        return self._armed is not None
+
+    @contextmanager
+    def profile(self, label: str) -> Iterator[None]:
+        target = threading.get_ident()
+        stacks: Dict[str, int] = collections.Counter()
+        stop = threading.Event()
+
+        def sample():
+            while not stop.wait(self.interval):
+                frame = sys._current_frames().get(target)
+                if frame is None:
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stacks[';'.join(reversed(names))] += 1
+
+        sampler = threading.Thread(target=sample, name='sampling-profiler', daemon=True)
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            sampler.join()
+            self._store(label, time.perf_counter() - start, stacks)
+
+    def _store(self, label: str, seconds: float, stacks: Dict[str, int]):
+        # Tempo próprio por função: a última entrada de cada pilha amostrada
+        own = collections.Counter()
+        for stack, count in stacks.items():
+            own[stack.rsplit(';', 1)[-1]] += count
+        total = sum(stacks.values())
+        with self._lock:
+            self._results.append({
+                'requisicao': label,
+                'segundos': round(seconds, 6),
+                'amostras': total,
+                'intervalo_s': self.interval,
+                'funcoes': [{'funcao': name, 'amostras': count, 'fracao': round(count / total, 3)}
+                            for name, count in own.most_common(25)],
+                # Pilhas colapsadas (formato do flamegraph.pl / speedscope)
+                'pilhas': [f'{stack} {count}' for stack, count in sorted(stacks.items(), key=lambda i: -i[1])],
+            })
+
+    def results(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._results)
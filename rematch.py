@@ -0,0 +1,329 @@
+"""
+Re-matching offline dos candidatos salvos contra o catálogo atual.
+
+Uso:
+    python rematch.py [--output matches.csv] [--top 10] [--workers 4] [--full]
+
+O índice do CandidateStore é lido em fluxo e os cadastros são processados em
+blocos por vários processos; só as posições nos segmentos e os resultados de
+cada bloco passam pelo processo principal, então a memória não cresce com o
+número de candidatos. Não rode `candidate_store.py compact` ao mesmo tempo:
+a compactação muda as posições dos registros.
+O estado da última execução fica em um SQLite (`--state`): em execuções
+incrementais só candidatos novos/alterados são recalculados por completo, e
+candidatos inalterados só são comparados com as vagas novas ou alteradas.
+Os scores de pares inalterados são mantidos da execução anterior; use
+`--full` depois de mudanças grandes no catálogo, que alteram o vocabulário.
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Dict, Any, Iterator, Tuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from candidate_store import CandidateStore
+from job_index import JobIndex, RESULT_COLUMNS, candidate_profile_text, top_k, stop_words
+
+
+OUTPUT_COLUMNS = ['candidato', 'email', 'rank', 'id_vaga', 'nome_vaga', 'similaridade']
+
+# Estado de cada processo de trabalho (carregado uma vez no initializer)
+_worker_index = None
+_worker_store = None
+_worker_delta_rows = None
+
+
+def _init_worker(index_path: str, store_root: str, delta_rows: np.ndarray):
+    global _worker_index, _worker_store, _worker_delta_rows
+    _worker_index = JobIndex.load(index_path)
+    _worker_store = CandidateStore(store_root)
+    _worker_delta_rows = delta_rows
+
+
+def _match_chunk(tasks: List[Tuple[str, Tuple, str, bool, List[Tuple]]],
+                 top_n: int) -> Tuple[List[Tuple[str, str, str, List[Tuple]]], List[str]]:
+    """
+    Match one chunk of candidates. Each task is (key, store location, fingerprint, full,
+    previous rows); `full=False` only scores the changed jobs and merges them into the
+    previous top N. Returns (key, email, fingerprint, matches) per candidate and the keys
+    whose record could not be read.
+    """
+    index = _worker_index
+    loaded, failed = [], []
+    for key, location, fingerprint, full, previous in tasks:
+        try:
+            candidate_data = _worker_store.read(*location)['data']
+        except (OSError, json.JSONDecodeError):
+            failed.append(key)
+            continue
+        loaded.append((key, candidate_data.get('email', ''), fingerprint, candidate_profile_text(candidate_data),
+                       full, previous))
+
+    results = []
+    full_tasks = [task for task in loaded if task[4]]
+    if full_tasks:
+        batches = index.search_batch([task[3] for task in full_tasks], top_n=top_n)
+        for (key, email, fingerprint, _, _, _), vagas in zip(full_tasks, batches):
+            results.append((key, email, fingerprint,
+                            [(v['id_vaga'], v['nome_vaga'], v['similaridade']) for v in vagas]))
+
+    delta_tasks = [task for task in loaded if not task[4]]
+    if delta_tasks and len(_worker_delta_rows):
+        vetores = index.vectorizer.transform([task[3] for task in delta_tasks])
+        similaridades = (vetores @ index.matrix[_worker_delta_rows].T).toarray()
+        top = top_k(similaridades, top_n)
+        for pos, (key, email, fingerprint, _, _, previous) in enumerate(delta_tasks):
+            vagas = index.results_for_rows(_worker_delta_rows[top[pos]], similaridades[pos, top[pos]])
+            novos = [(v['id_vaga'], v['nome_vaga'], v['similaridade']) for v in vagas]
+            merged = sorted(list(previous) + novos, key=lambda match: match[2], reverse=True)[:top_n]
+            results.append((key, email, fingerprint, merged))
+
+    return results, failed
+
+
+class RematchState:
+    """Estado persistido entre execuções: impressões digitais de candidatos e vagas e o top N atual"""
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS candidates (key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, run_id INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS jobs (id_vaga TEXT PRIMARY KEY, hash TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS matches (
+                candidate TEXT NOT NULL, email TEXT, rank INTEGER NOT NULL,
+                id_vaga TEXT NOT NULL, nome_vaga TEXT, similaridade REAL NOT NULL,
+                PRIMARY KEY (candidate, rank)
+            );
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        """)
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        self.conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    def reset(self):
+        self.conn.executescript('DELETE FROM candidates; DELETE FROM jobs; DELETE FROM matches;')
+
+    def job_hashes(self) -> Dict[str, str]:
+        return dict(self.conn.execute('SELECT id_vaga, hash FROM jobs'))
+
+    def replace_job_hashes(self, hashes: Dict[str, str]):
+        with self.conn:
+            self.conn.execute('BEGIN')
+            self.conn.execute('DELETE FROM jobs')
+            self.conn.executemany('INSERT INTO jobs (id_vaga, hash) VALUES (?, ?)', hashes.items())
+
+    def fingerprints(self, keys: List[str]) -> Dict[str, str]:
+        placeholders = ','.join('?' * len(keys))
+        return dict(self.conn.execute(
+            f'SELECT key, fingerprint FROM candidates WHERE key IN ({placeholders})', keys
+        ))
+
+    def previous_matches(self, keys: List[str]) -> Dict[str, List[Tuple]]:
+        placeholders = ','.join('?' * len(keys))
+        previous = {}
+        for candidate, id_vaga, nome_vaga, similaridade in self.conn.execute(
+            f'SELECT candidate, id_vaga, nome_vaga, similaridade FROM matches '
+            f'WHERE candidate IN ({placeholders}) ORDER BY candidate, rank', keys
+        ):
+            previous.setdefault(candidate, []).append((id_vaga, nome_vaga, similaridade))
+        return previous
+
+    def mark_seen(self, fingerprints: Dict[str, str], run_id: int):
+        with self.conn:
+            self.conn.execute('BEGIN')
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO candidates (key, fingerprint, run_id) VALUES (?, ?, ?)',
+                [(key, fingerprint, run_id) for key, fingerprint in fingerprints.items()]
+            )
+
+    def store_matches(self, results: List[Tuple[str, str, str, List[Tuple]]], failed: List[str], run_id: int):
+        """
+        Save the new top N and the fingerprint of each matched candidate in one
+        transaction, so a crash never leaves a candidate marked as done without
+        its results. Candidates that failed keep their previous matches and get
+        an empty fingerprint, which makes the next run recompute them.
+        """
+        with self.conn:
+            self.conn.execute('BEGIN')
+            self.conn.executemany('DELETE FROM matches WHERE candidate = ?', [(key,) for key, _, _, _ in results])
+            self.conn.executemany(
+                'INSERT INTO matches (candidate, email, rank, id_vaga, nome_vaga, similaridade) VALUES (?, ?, ?, ?, ?, ?)',
+                [(key, email, rank, str(id_vaga), nome_vaga, float(similaridade))
+                 for key, email, _, matches in results
+                 for rank, (id_vaga, nome_vaga, similaridade) in enumerate(matches, 1)]
+            )
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO candidates (key, fingerprint, run_id) VALUES (?, ?, ?)',
+                [(key, fingerprint, run_id) for key, _, fingerprint, _ in results] +
+                [(key, '', run_id) for key in failed]
+            )
+
+    def drop_unseen(self, run_id: int) -> int:
+        """Forget candidates that are no longer in the store"""
+        with self.conn:
+            self.conn.execute('BEGIN')
+            self.conn.execute(
+                'DELETE FROM matches WHERE candidate IN (SELECT key FROM candidates WHERE run_id != ?)', (run_id,)
+            )
+            return self.conn.execute('DELETE FROM candidates WHERE run_id != ?', (run_id,)).rowcount
+
+    def iter_matches(self) -> Iterator[Tuple]:
+        return self.conn.execute(
+            'SELECT candidate, email, rank, id_vaga, nome_vaga, similaridade FROM matches ORDER BY candidate, rank'
+        )
+
+
+def iter_candidates(store: CandidateStore) -> Iterator[Tuple[str, Tuple, str]]:
+    """Stream (key, location, fingerprint) for the latest registration of every candidate"""
+    for seq, key, shard, segment, offset, length in store.iter_index():
+        # Um novo cadastro ganha um seq novo: o seq serve de impressão digital
+        yield key, (shard, segment, offset, length), str(seq)
+
+
+def _job_hashes(index: JobIndex) -> Dict[str, str]:
+    hashes = pd.util.hash_pandas_object(index.vagas_df[RESULT_COLUMNS].astype(str), index=False)
+    return dict(zip(index.vagas_df['id_vaga'].astype(str), hashes.astype(str)))
+
+
+def export_matches(state: RematchState, output_path: str, batch_size: int = 50000):
+    """Write the ranked candidate -> job table as CSV or Parquet, streaming from the state database"""
+    rows = state.iter_matches()
+    tmp_path = f"{output_path}.tmp"
+    if output_path.endswith('.parquet'):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema([
+            ('candidato', pa.string()), ('email', pa.string()), ('rank', pa.int32()),
+            ('id_vaga', pa.string()), ('nome_vaga', pa.string()), ('similaridade', pa.float64()),
+        ])
+        with pq.ParquetWriter(tmp_path, schema) as writer:
+            while True:
+                batch = rows.fetchmany(batch_size)
+                if not batch:
+                    break
+                columns = list(zip(*batch))
+                writer.write_table(pa.Table.from_arrays([pa.array(c) for c in columns], schema=schema))
+    else:
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(OUTPUT_COLUMNS)
+            while True:
+                batch = rows.fetchmany(batch_size)
+                if not batch:
+                    break
+                writer.writerows(batch)
+    os.replace(tmp_path, output_path)
+
+
+def rematch(store_root: str, catalog_path: str, index_path: str, state_path: str, output_path: str,
+            top_n: int = 10, chunk_size: int = 500, workers: Optional[int] = None, full: bool = False) -> Dict[str, Any]:
+    start = time.perf_counter()
+    index = JobIndex.load_or_build(catalog_path, index_path, stop_words=stop_words)
+    state = RematchState(state_path)
+
+    if full or state.get_meta('top_n') != str(top_n):
+        state.reset()
+
+    # Vagas novas ou alteradas desde a última execução, e vagas removidas
+    previous_hashes = state.job_hashes()
+    current_hashes = _job_hashes(index)
+    changed_ids = {id_vaga for id_vaga, h in current_hashes.items() if previous_hashes.get(id_vaga) != h}
+    stale_ids = {id_vaga for id_vaga in previous_hashes if current_hashes.get(id_vaga) != previous_hashes[id_vaga]}
+    delta_rows = np.flatnonzero(index.vagas_df['id_vaga'].astype(str).isin(changed_ids).to_numpy())
+    del index  # os processos de trabalho carregam o índice salvo
+
+    run_id = int(state.get_meta('run_id') or 0) + 1
+    stats = {'candidatos': 0, 'completos': 0, 'incrementais': 0, 'inalterados': 0,
+             'vagas_alteradas': len(changed_ids), 'vagas_removidas': len(stale_ids - changed_ids)}
+
+    def chunks() -> Iterator[List[Tuple]]:
+        candidates = iter_candidates(CandidateStore(store_root))
+        while True:
+            chunk = list(itertools.islice(candidates, chunk_size))
+            if not chunk:
+                return
+            keys = [key for key, _, _ in chunk]
+            fingerprints = state.fingerprints(keys)
+            previous = state.previous_matches(keys)
+            tasks, unchanged = [], {}
+            for key, location, fingerprint in chunk:
+                stats['candidatos'] += 1
+                matches = previous.get(key)
+                if fingerprints.get(key) != fingerprint or matches is None \
+                        or any(str(m[0]) in stale_ids for m in matches):
+                    tasks.append((key, location, fingerprint, True, []))
+                    stats['completos'] += 1
+                elif len(delta_rows):
+                    tasks.append((key, location, fingerprint, False, matches))
+                    stats['incrementais'] += 1
+                else:
+                    unchanged[key] = fingerprint
+                    stats['inalterados'] += 1
+            # Os demais só são marcados junto com os resultados (store_matches)
+            state.mark_seen(unchanged, run_id)
+            if tasks:
+                yield tasks
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(index_path, store_root, delta_rows)) as pool:
+        # No máximo 2 blocos por processo em voo: memória limitada independente do total de candidatos
+        pending = set()
+        for tasks in chunks():
+            pending.add(pool.submit(_match_chunk, tasks, top_n))
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    state.store_matches(*future.result(), run_id)
+        for future in pending:
+            state.store_matches(*future.result(), run_id)
+
+    stats['candidatos_removidos'] = state.drop_unseen(run_id)
+    state.replace_job_hashes(current_hashes)
+    state.set_meta('run_id', str(run_id))
+    state.set_meta('top_n', str(top_n))
+
+    export_matches(state, output_path)
+    stats['segundos'] = round(time.perf_counter() - start, 3)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-match saved candidates against the current job catalog')
+    parser.add_argument('--store', default=os.getenv('CANDIDATE_STORE', 'candidate_store'),
+                        help='candidate store written by _save_candidate')
+    parser.add_argument('--catalog', default='vagas_tecnologia_atualizado.csv')
+    parser.add_argument('--index', default='vagas_index.pkl')
+    parser.add_argument('--state', default='rematch_state.db', help='state of the previous runs (incremental mode)')
+    parser.add_argument('--output', default='matches.csv', help='.csv or .parquet (requires pyarrow)')
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--chunk-size', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--full', action='store_true', help='ignore the previous run and recompute everything')
+    args = parser.parse_args()
+
+    if args.output.endswith('.parquet'):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            parser.error('a saída em Parquet requer o pacote pyarrow')
+
+    stats = rematch(args.store, args.catalog, args.index, args.state, args.output,
+                    top_n=args.top, chunk_size=args.chunk_size, workers=args.workers, full=args.full)
+    print(json.dumps(stats, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
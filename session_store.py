@@ -0,0 +1,391 @@
+import atexit
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Type
+
+
+class SessionStore:
+    """Armazenamento do estado de conversa, indexado pelo número de telefone"""
+
+    def get(self, phone_number: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def set(self, phone_number: str, state: Dict[str, Any]):
+        raise NotImplementedError
+
+    def set_many(self, states: Dict[str, Dict[str, Any]]):
+        for phone_number, state in states.items():
+            self.set(phone_number, state)
+
+    def delete(self, phone_number: str):
+        raise NotImplementedError
+
+    def delete_expired(self, max_age: float) -> int:
+        """Remove sessions not updated for more than `max_age` seconds"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class JsonSessionStore(SessionStore):
+    """
+    Todos os estados em um único arquivo JSON (comportamento original).
+    Lê e reescreve o arquivo inteiro a cada operação; útil para testes e depuração.
+    """
+
+    def __init__(self, path: str, encoder: Type[json.JSONEncoder] = json.JSONEncoder):
+        self.path = path
+        self.encoder = encoder
+        self._lock = threading.Lock()
+
+    def _read_all(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write_all(self, states: Dict[str, Any]):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(states, f, indent=2, cls=self.encoder)
+        os.replace(tmp_path, self.path)
+
+    def get(self, phone_number: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._read_all().get(phone_number)
+
+    def get_all(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return self._read_all()
+
+    def set(self, phone_number: str, state: Dict[str, Any]):
+        self.set_many({phone_number: state})
+
+    def set_many(self, states: Dict[str, Dict[str, Any]]):
+        with self._lock:
+            all_states = self._read_all()
+            all_states.update(states)
+            self._write_all(all_states)
+
+    def delete(self, phone_number: str):
+        with self._lock:
+            all_states = self._read_all()
+            if all_states.pop(phone_number, None) is not None:
+                self._write_all(all_states)
+
+    def delete_expired(self, max_age: float) -> int:
+        # O arquivo JSON não guarda a data de atualização: nada expira neste backend
+        return 0
+
+
+class SqliteSessionStore(SessionStore):
+    """
+    Uma linha por telefone em um SQLite embutido em modo WAL.
+    Leituras e escritas tocam só a linha do usuário, e o WAL permite leitores
+    concorrentes enquanto outra thread grava.
+    """
+
+    def __init__(self, path: str, encoder: Type[json.JSONEncoder] = json.JSONEncoder):
+        self.path = path
+        self.encoder = encoder
+        self._local = threading.local()
+
+        conn = self._connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                phone_number TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3.Connection não pode ser compartilhada entre threads: uma por thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, phone_number: str) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute(
+            'SELECT state FROM sessions WHERE phone_number = ?', (phone_number,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, phone_number: str, state: Dict[str, Any]):
+        self.set_many({phone_number: state})
+
+    def set_many(self, states: Dict[str, Dict[str, Any]]):
+        now = time.time()
+        rows = [
+            (phone_number, json.dumps(state, cls=self.encoder, ensure_ascii=False), now)
+            for phone_number, state in states.items()
+        ]
+        conn = self._connection()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany("""
+                INSERT INTO sessions (phone_number, state, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(phone_number) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at
+            """, rows)
+
+    def delete(self, phone_number: str):
+        self._connection().execute('DELETE FROM sessions WHERE phone_number = ?', (phone_number,))
+
+    def delete_expired(self, max_age: float) -> int:
+        cursor = self._connection().execute(
+            'DELETE FROM sessions WHERE updated_at < ?', (time.time() - max_age,)
+        )
+        return cursor.rowcount
+
+    def count(self) -> int:
+        return self._connection().execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+
+    def migrate_from_json(self, json_path: str) -> int:
+        """
+        One-time import of the legacy bot_state.json. The file is renamed to
+        `<name>.migrated` afterwards so it is not imported again.
+        """
+        if not os.path.exists(json_path):
+            return 0
+        states = JsonSessionStore(json_path).get_all()
+        if states:
+            self.set_many(states)
+        os.replace(json_path, f"{json_path}.migrated")
+        return len(states)
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class CachedSessionStore(SessionStore):
+    """
+    Cache LRU em memória na frente de outro SessionStore.
+
+    Leituras repetidas do mesmo telefone não tocam o backend; escritas marcam a
+    entrada como suja e são gravadas em lote por uma thread a cada
+    `flush_interval` segundos e no encerramento do processo (write-behind).
+    Entradas ociosas por mais de `idle_ttl` saem do cache, e sessões paradas há
+    mais de `session_expiry` são apagadas do backend.
+
+    Só vale para um único processo: uma entrada em cache nunca é conferida com
+    o backend, então a gravação de outro processo não seria vista, e o próximo
+    flush deste a sobrescreveria. create_session_store não usa o cache quando
+    `processes` > 1.
+    """
+
+    def __init__(self, backend: SessionStore, max_entries: int = 10000, idle_ttl: float = 1800.0,
+                 flush_interval: float = 1.0, session_expiry: float = 0.0, expiry_check_interval: float = 300.0):
+        self.backend = backend
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        self.flush_interval = flush_interval
+        self.session_expiry = session_expiry
+        self.expiry_check_interval = expiry_check_interval
+
+        self._entries = OrderedDict()  # telefone -> (estado, último acesso)
+        self._dirty = set()
+        self._evicted_dirty = {}  # sujas que saíram do LRU antes do próximo flush
+        self._flushing = {}  # lote sendo gravado: ainda não está no backend
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._counters = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'flushes': 0,
+            'flushed_entries': 0,
+            'flush_errors': 0,
+            'flush_seconds_total': 0.0,
+            'last_flush_seconds': 0.0,
+            'expired_sessions': 0,
+        }
+
+        self._stop_event = threading.Event()
+        self._flush_thread = threading.Thread(target=self._flush_loop, name='session-flush', daemon=True)
+        self._flush_thread.start()
+        atexit.register(self.close)
+
+    def get(self, phone_number: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(phone_number)
+            if entry is not None:
+                self._entries[phone_number] = (entry[0], now)
+                self._entries.move_to_end(phone_number)
+                self._counters['hits'] += 1
+                return copy.deepcopy(entry[0])
+            pending = self._evicted_dirty.get(phone_number, self._flushing.get(phone_number))
+            if pending is not None:
+                self._counters['hits'] += 1
+                return copy.deepcopy(pending)
+            self._counters['misses'] += 1
+
+        state = self.backend.get(phone_number)
+        if state is None:
+            return None
+
+        with self._lock:
+            # Outra thread pode ter gravado um estado mais novo enquanto líamos o backend
+            if phone_number not in self._entries and phone_number not in self._evicted_dirty \
+                    and phone_number not in self._flushing:
+                self._entries[phone_number] = (state, now)
+                self._evict_locked()
+        return copy.deepcopy(state)
+
+    def set(self, phone_number: str, state: Dict[str, Any]):
+        with self._lock:
+            self._entries[phone_number] = (copy.deepcopy(state), time.time())
+            self._entries.move_to_end(phone_number)
+            self._dirty.add(phone_number)
+            self._evicted_dirty.pop(phone_number, None)
+            self._evict_locked()
+
+    def delete(self, phone_number: str):
+        with self._lock:
+            self._entries.pop(phone_number, None)
+            self._dirty.discard(phone_number)
+            self._evicted_dirty.pop(phone_number, None)
+            self._flushing.pop(phone_number, None)
+        self.backend.delete(phone_number)
+
+    def delete_expired(self, max_age: float) -> int:
+        cutoff = time.time() - max_age
+        with self._lock:
+            for phone_number in [p for p, (_, last_access) in self._entries.items()
+                                 if last_access < cutoff and p not in self._dirty]:
+                del self._entries[phone_number]
+        removed = self.backend.delete_expired(max_age)
+        self._counters['expired_sessions'] += removed
+        return removed
+
+    def _evict_locked(self):
+        while len(self._entries) > self.max_entries:
+            phone_number, (state, _) = self._entries.popitem(last=False)
+            if phone_number in self._dirty:
+                self._dirty.discard(phone_number)
+                self._evicted_dirty[phone_number] = state
+            self._counters['evictions'] += 1
+
+    def _evict_idle(self):
+        cutoff = time.time() - self.idle_ttl
+        with self._lock:
+            # O OrderedDict está em ordem de acesso: basta olhar o início
+            while self._entries:
+                phone_number, (_, last_access) = next(iter(self._entries.items()))
+                if last_access >= cutoff or phone_number in self._dirty:
+                    break
+                del self._entries[phone_number]
+                self._counters['evictions'] += 1
+
+    def flush(self):
+        """Write every dirty entry to the backend in a single batch"""
+        with self._flush_lock:
+            with self._lock:
+                batch = dict(self._evicted_dirty)
+                batch.update((phone_number, self._entries[phone_number][0]) for phone_number in self._dirty)
+                self._dirty.clear()
+                self._evicted_dirty.clear()
+                # Visível para get() até o backend confirmar a gravação
+                self._flushing = dict(batch)
+            if not batch:
+                return
+
+            start = time.perf_counter()
+            try:
+                self.backend.set_many(batch)
+            except Exception:
+                # Remarca como sujo o que não foi sobrescrito nesse meio tempo
+                with self._lock:
+                    self._counters['flush_errors'] += 1
+                    for phone_number, state in batch.items():
+                        entry = self._entries.get(phone_number)
+                        if entry is not None and entry[0] is state:
+                            self._dirty.add(phone_number)
+                        elif entry is None:
+                            self._evicted_dirty.setdefault(phone_number, state)
+                    self._flushing = {}
+                raise
+            elapsed = time.perf_counter() - start
+
+            with self._lock:
+                self._flushing = {}
+                self._counters['flushes'] += 1
+                self._counters['flushed_entries'] += len(batch)
+                self._counters['flush_seconds_total'] += elapsed
+                self._counters['last_flush_seconds'] = elapsed
+
+    def _flush_loop(self):
+        last_expiry_check = time.monotonic()
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+                self._evict_idle()
+                if self.session_expiry > 0 and time.monotonic() - last_expiry_check >= self.expiry_check_interval:
+                    last_expiry_check = time.monotonic()
+                    self.delete_expired(self.session_expiry)
+            except Exception as e:
+                print(f"Error flushing session cache: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats['entries'] = len(self._entries)
+            stats['dirty'] = len(self._dirty) + len(self._evicted_dirty)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    def close(self):
+        if self._stop_event.is_set():
+            return
+        self._stop_event.set()
+        self._flush_thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+        self.backend.close()
+
+
+def create_session_store(backend: str, path: str, encoder: Type[json.JSONEncoder] = json.JSONEncoder,
+                         legacy_json_path: Optional[str] = None, cache_size: int = 0,
+                         cache_ttl: float = 1800.0, flush_interval: float = 1.0,
+                         session_expiry: float = 0.0, processes: int = 1) -> SessionStore:
+    """
+    Build the configured session store ('sqlite' or 'json'), optionally behind the
+    in-memory cache. `processes` is how many processes share the store; the cache
+    is single-process only and is skipped when there are more.
+    """
+    if backend == 'json':
+        store = JsonSessionStore(path, encoder=encoder)
+    elif backend == 'sqlite':
+        store = SqliteSessionStore(path, encoder=encoder)
+        if legacy_json_path:
+            migrated = store.migrate_from_json(legacy_json_path)
+            if migrated:
+                print(f"{migrated} sessões migradas de {legacy_json_path} para {path}")
+    else:
+        raise ValueError(f"Backend de sessão desconhecido: {backend}")
+
+    if cache_size > 0 and processes > 1:
+        print(f"Cache de sessões desativado: {processes} processos compartilham {path}")
+    elif cache_size > 0:
+        store = CachedSessionStore(
+            store,
+            max_entries=cache_size,
+            idle_ttl=cache_ttl,
+            flush_interval=flush_interval,
+            session_expiry=session_expiry
+        )
+    return store
@@ -0,0 +1,396 @@
+"""
+Índice de vagas fora da memória, para catálogos com milhões de linhas.
+
+A ingestão lê o CSV em blocos e vetoriza com HashingVectorizer (espaço de
+tamanho fixo, sem ajuste de vocabulário global). A matriz CSR e os metadados
+das vagas vão para arquivos que a busca abre com np.memmap: a memória
+residente não cresce com o catálogo, e vários processos de trabalho
+compartilham as mesmas páginas do cache do sistema.
+
+Layout de <index_path>/v-<versão>/:
+    data.f32, indices.i32, indptr.i64   matriz CSR (TF-IDF, linhas normalizadas)
+    idf.f32                             IDF por feature, aplicado também às consultas
+    jobs.jsonl, offsets.i64             uma vaga (RESULT_COLUMNS) por linha
+    salarios.f64, modalidade.i16, local.i32, postings.i32
+                                        colunas para os filtros
+    ids.i64, id_rows.i64                hash do id_vaga ordenado -> linha
+    meta.json
+<index_path>/CURRENT aponta para a versão em uso.
+
+Uso:
+    python streaming_index.py vagas.csv [--out vagas_ooc] [--chunk-size 100000]
+"""
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import time
+from collections import Counter
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+from job_index import (JobIndex, TEXT_COLUMNS, RESULT_COLUMNS, MAX_TITLE_TERMS, file_version, frequent_terms,
+                       normalize_key, parse_salario, top_k, stop_words)
+
+
+STREAMING_FORMAT = 2
+N_FEATURES = 1 << 20
+
+
+def _id_hash(id_vaga: Any) -> int:
+    return int.from_bytes(hashlib.blake2b(str(id_vaga).encode('utf-8'), digest_size=8).digest(), 'little', signed=True)
+
+
+class HashingTfidf:
+    """Hashing + IDF + l2, the query side of the streaming index (same interface as a fitted vectorizer)"""
+
+    def __init__(self, idf: np.ndarray, stop_words: Optional[List[str]] = None, n_features: int = N_FEATURES):
+        self.idf = idf
+        self.hashing = HashingVectorizer(n_features=n_features, alternate_sign=False, norm=None,
+                                         stop_words=stop_words, dtype=np.float32)
+
+    def transform(self, textos: List[str]) -> sp.csr_matrix:
+        vetores = self.hashing.transform(textos).tocsr()
+        vetores.data *= self.idf[vetores.indices]
+        return normalize(vetores, copy=False)
+
+
+class StreamingJobIndex:
+    """
+    Mesma interface de busca do JobIndex, sobre arquivos mapeados em memória.
+    A busca percorre a matriz em blocos de `chunk_rows` linhas e mantém só o
+    top N corrente de cada consulta (um buffer limitado de N posições).
+    """
+
+    def __init__(self, path: str, chunk_rows: int = 1 << 18):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        with open(os.path.join(path, 'meta.json'), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if self.meta.get('format') != STREAMING_FORMAT:
+            raise KeyError('format')
+        self.version = self.meta['version']
+        self.n_rows = self.meta['n_rows']
+
+        self.data = self._map('data.f32', np.float32, self.meta['nnz'])
+        self.indices = self._map('indices.i32', np.int32, self.meta['nnz'])
+        self.indptr = self._map('indptr.i64', np.int64, self.n_rows + 1)
+        self.offsets = self._map('offsets.i64', np.int64, self.n_rows + 1)
+        self.salarios = self._map('salarios.f64', np.float64, self.n_rows)
+        self.modalidade_codes = self._map('modalidade.i16', np.int16, self.n_rows)
+        self.local_codes = self._map('local.i32', np.int32, self.n_rows)
+        self.postings = self._map('postings.i32', np.int32, self.meta['n_postings'])
+        self.ids = self._map('ids.i64', np.int64, self.n_rows)
+        self.id_rows = self._map('id_rows.i64', np.int64, self.n_rows)
+
+        # Dicionários pequenos (valores distintos), usados por parse_preferencias
+        self.modalidade_index = {key: code for code, key in enumerate(self.meta['modalidades'])}
+        self.local_index = {key: code for code, key in enumerate(self.meta['locais'])}
+        self.skills_index = {key: tuple(span) for key, span in self.meta['skills'].items()}
+        self.vectorizer = HashingTfidf(self._map('idf.f32', np.float32, self.meta['n_features']),
+                                       stop_words=self.meta['stop_words'], n_features=self.meta['n_features'])
+
+        with open(os.path.join(path, 'jobs.jsonl'), 'rb') as f:
+            self._jobs = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] else b''
+
+    def _map(self, name: str, dtype, length: int) -> np.ndarray:
+        if not length:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(os.path.join(self.path, name), dtype=dtype, mode='r', shape=(length,))
+
+    # -- construção -------------------------------------------------------
+
+    @classmethod
+    def build(cls, csv_path: str, out_dir: str, stop_words: Optional[List[str]] = None,
+              chunk_size: int = 100000, n_features: int = N_FEATURES,
+              max_titles: int = MAX_TITLE_TERMS) -> 'StreamingJobIndex':
+        """Stream the CSV into `out_dir` (two passes over the matrix file, one over the CSV)"""
+        os.makedirs(out_dir, exist_ok=True)
+        hashing = HashingVectorizer(n_features=n_features, alternate_sign=False, norm=None,
+                                    stop_words=stop_words, dtype=np.float32)
+        df = np.zeros(n_features, dtype=np.int64)
+        modalidades: Dict[str, int] = {}
+        locais: Dict[str, int] = {}
+        skill_rows: Dict[str, List[np.ndarray]] = {}
+        skills_terms, titles_spelling = {}, {}
+        titles_count = Counter()
+        n_rows = nnz = offset = 0
+
+        def out(name):
+            return open(os.path.join(out_dir, name), 'wb')
+
+        with out('data.f32') as f_data, out('indices.i32') as f_indices, out('indptr.i64') as f_indptr, \
+                out('jobs.jsonl') as f_jobs, out('offsets.i64') as f_offsets, out('salarios.f64') as f_salarios, \
+                out('modalidade.i16') as f_modalidade, out('local.i32') as f_local, out('ids.i64') as f_ids:
+            np.zeros(1, dtype=np.int64).tofile(f_indptr)
+            np.zeros(1, dtype=np.int64).tofile(f_offsets)
+
+            for chunk in pd.read_csv(csv_path, encoding='utf-8', chunksize=chunk_size):
+                texto = chunk[TEXT_COLUMNS[0]].astype(str)
+                for column in TEXT_COLUMNS[1:]:
+                    texto = texto + ' ' + chunk[column].astype(str)
+                matrix = hashing.transform(texto.str.lower().tolist()).tocsr()
+                matrix.sum_duplicates()
+                df += np.bincount(matrix.indices, minlength=n_features)
+                matrix.data.astype(np.float32).tofile(f_data)
+                matrix.indices.astype(np.int32).tofile(f_indices)
+                (matrix.indptr[1:].astype(np.int64) + nnz).tofile(f_indptr)
+                nnz += matrix.nnz
+
+                registros = [json.dumps(registro, ensure_ascii=False, default=str).encode('utf-8') + b'\n'
+                             for registro in chunk[RESULT_COLUMNS].to_dict('records')]
+                f_jobs.writelines(registros)
+                (np.cumsum([len(r) for r in registros], dtype=np.int64) + offset).tofile(f_offsets)
+                offset += sum(len(r) for r in registros)
+
+                chunk['salario'].map(parse_salario).to_numpy(dtype=np.float64).tofile(f_salarios)
+                np.array([modalidades.setdefault(normalize_key(v), len(modalidades))
+                          for v in chunk['modalidade'].fillna('')], dtype=np.int16).tofile(f_modalidade)
+                np.array([locais.setdefault(normalize_key(v), len(locais))
+                          for v in chunk['local'].fillna('')], dtype=np.int32).tofile(f_local)
+                np.array([_id_hash(v) for v in chunk['id_vaga']], dtype=np.int64).tofile(f_ids)
+
+                rows_por_skill: Dict[str, List[int]] = {}
+                for row, skills in enumerate(chunk['skills_necessarias'].fillna('').astype(str).str.split(','),
+                                             start=n_rows):
+                    for skill in skills:
+                        skill = skill.strip()
+                        if skill:
+                            skills_terms.setdefault(skill.casefold(), skill)
+                            rows_por_skill.setdefault(normalize_key(skill), []).append(row)
+                for key, rows in rows_por_skill.items():
+                    skill_rows.setdefault(key, []).append(np.unique(np.asarray(rows, dtype=np.int32)))
+                for title in chunk['nome_vaga'].dropna().astype(str).str.strip():
+                    titles_spelling.setdefault(title.casefold(), title)
+                    titles_count[title.casefold()] += 1
+                n_rows += len(chunk)
+
+        # Índice invertido de habilidades: listas de linhas concatenadas, com (início, fim) por habilidade
+        spans, position = {}, 0
+        with out('postings.i32') as f_postings:
+            for key in sorted(skill_rows):
+                rows = np.concatenate(skill_rows.pop(key))
+                rows.tofile(f_postings)
+                spans[key] = (position, position + len(rows))
+                position += len(rows)
+
+        # id_vaga -> linha por busca binária sobre os hashes ordenados
+        ids = np.fromfile(os.path.join(out_dir, 'ids.i64'), dtype=np.int64)
+        order = np.argsort(ids, kind='stable')
+        ids[order].tofile(os.path.join(out_dir, 'ids.i64'))
+        order.astype(np.int64).tofile(os.path.join(out_dir, 'id_rows.i64'))
+        del ids, order
+
+        # IDF suavizado como no TfidfVectorizer, depois normalização l2 das linhas, bloco a bloco no arquivo
+        idf = (np.log((1 + n_rows) / (1 + df)) + 1).astype(np.float32)
+        idf.tofile(os.path.join(out_dir, 'idf.f32'))
+        if nnz:
+            data = np.memmap(os.path.join(out_dir, 'data.f32'), dtype=np.float32, mode='r+', shape=(nnz,))
+            indices = np.memmap(os.path.join(out_dir, 'indices.i32'), dtype=np.int32, mode='r', shape=(nnz,))
+            indptr = np.memmap(os.path.join(out_dir, 'indptr.i64'), dtype=np.int64, mode='r', shape=(n_rows + 1,))
+            for start in range(0, n_rows, chunk_size):
+                end = min(start + chunk_size, n_rows)
+                p0, p1 = int(indptr[start]), int(indptr[end])
+                bloco = sp.csr_matrix((data[p0:p1] * idf[indices[p0:p1]], indices[p0:p1], indptr[start:end + 1] - p0),
+                                      shape=(end - start, n_features))
+                data[p0:p1] = normalize(bloco, copy=False).data
+            data.flush()
+            del data, indices, indptr
+
+        with open(os.path.join(out_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'format': STREAMING_FORMAT,
+                'version': file_version(csv_path),
+                'n_rows': n_rows,
+                'nnz': nnz,
+                'n_features': n_features,
+                'n_postings': position,
+                'stop_words': stop_words,
+                'modalidades': list(modalidades),
+                'locais': list(locais),
+                'skills': spans,
+                'skills_terms': list(skills_terms.values()),
+                'titles_terms': frequent_terms(titles_count, titles_spelling, max_titles),
+            }, f, ensure_ascii=False)
+        return cls(out_dir)
+
+    @staticmethod
+    def _current_dir(index_path: str) -> Optional[str]:
+        try:
+            with open(os.path.join(index_path, 'CURRENT'), 'r', encoding='utf-8') as f:
+                return os.path.join(index_path, f.read().strip())
+        except FileNotFoundError:
+            return None
+
+    @classmethod
+    def load(cls, index_path: str) -> 'StreamingJobIndex':
+        current = cls._current_dir(index_path)
+        if current is None:
+            raise FileNotFoundError(index_path)
+        return cls(current)
+
+    @classmethod
+    def build_and_save(cls, csv_path: str, index_path: str, stop_words: Optional[List[str]] = None,
+                       chunk_size: int = 100000) -> 'StreamingJobIndex':
+        """Ingest into a new version directory and point CURRENT to it atomically"""
+        version = file_version(csv_path)
+        name = f"v-{version}"
+        tmp_dir = os.path.join(index_path, f"{name}.tmp-{os.getpid()}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        cls.build(csv_path, tmp_dir, stop_words=stop_words, chunk_size=chunk_size)
+
+        final_dir = os.path.join(index_path, name)
+        shutil.rmtree(final_dir, ignore_errors=True)
+        os.replace(tmp_dir, final_dir)
+        previous = cls._current_dir(index_path)
+        tmp_current = os.path.join(index_path, f"CURRENT.tmp-{os.getpid()}")
+        with open(tmp_current, 'w', encoding='utf-8') as f:
+            f.write(name)
+        os.replace(tmp_current, os.path.join(index_path, 'CURRENT'))
+
+        # Mantém a versão anterior (outros processos podem ainda estar com ela mapeada)
+        keep = {name, os.path.basename(previous) if previous else None}
+        for entry in os.listdir(index_path):
+            if entry.startswith('v-') and entry not in keep and '.tmp-' not in entry:
+                shutil.rmtree(os.path.join(index_path, entry), ignore_errors=True)
+        return cls(final_dir)
+
+    @classmethod
+    def load_or_build(cls, csv_path: str, index_path: str,
+                      stop_words: Optional[List[str]] = None) -> 'StreamingJobIndex':
+        try:
+            index = cls.load(index_path)
+            if index.version == file_version(csv_path):
+                return index
+        except (FileNotFoundError, KeyError, ValueError):
+            pass
+        return cls.build_and_save(csv_path, index_path, stop_words=stop_words)
+
+    # -- consulta ---------------------------------------------------------
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def catalog_terms(self) -> Tuple[List[str], List[str]]:
+        return self.meta['skills_terms'], self.meta['titles_terms']
+
+    def row_of(self, id_vaga: Any) -> Optional[int]:
+        key = _id_hash(id_vaga)
+        pos = int(np.searchsorted(self.ids, key))
+        if pos >= self.n_rows or self.ids[pos] != key:
+            return None
+        row = int(self.id_rows[pos])
+        # Confere o id de verdade (colisão de hash de 64 bits é improvável, mas barata de descartar)
+        return row if str(self._record(row)['id_vaga']) == str(id_vaga) else None
+
+    def _rows_matrix(self, start: int, end: int) -> sp.csr_matrix:
+        p0, p1 = int(self.indptr[start]), int(self.indptr[end])
+        return sp.csr_matrix((self.data[p0:p1], self.indices[p0:p1], np.asarray(self.indptr[start:end + 1]) - p0),
+                             shape=(end - start, self.meta['n_features']))
+
+    def row_vector(self, row: int) -> sp.csr_matrix:
+        return self._rows_matrix(row, row + 1)
+
+    def _record(self, row: int) -> Dict[str, Any]:
+        return json.loads(self._jobs[int(self.offsets[row]):int(self.offsets[row + 1])])
+
+    def _chunk_mask(self, filtros: Dict[str, Any], start: int, end: int) -> Optional[np.ndarray]:
+        """Rows of [start, end) that pass every filter, read from the mapped columns"""
+        mask = None
+
+        def combine(other):
+            nonlocal mask
+            mask = other if mask is None else mask & other
+
+        def codes(index, values):
+            values = [values] if isinstance(values, str) else values
+            return [index[normalize_key(v)] for v in values if normalize_key(v) in index]
+
+        if filtros.get('modalidade'):
+            combine(np.isin(self.modalidade_codes[start:end], codes(self.modalidade_index, filtros['modalidade'])))
+        if filtros.get('local'):
+            combine(np.isin(self.local_codes[start:end], codes(self.local_index, filtros['local'])))
+        if filtros.get('habilidades'):
+            skills = filtros['habilidades']
+            skills = [skills] if isinstance(skills, str) else skills
+            skill_mask = np.zeros(end - start, dtype=bool)
+            for skill in skills:
+                span = self.skills_index.get(normalize_key(skill))
+                if span:
+                    rows = self.postings[span[0]:span[1]]
+                    lo, hi = np.searchsorted(rows, [start, end])
+                    skill_mask[rows[lo:hi] - start] = True
+            combine(skill_mask)
+        if filtros.get('salario_minimo') is not None:
+            with np.errstate(invalid='ignore'):
+                combine(self.salarios[start:end] >= float(filtros['salario_minimo']))
+        return mask
+
+    parse_preferencias = JobIndex.parse_preferencias
+    search = JobIndex.search
+
+    def search_batch(self, textos: List[str], top_n: int = 5,
+                     filtros: Optional[List[Optional[Dict[str, Any]]]] = None) -> List[List[Dict[str, Any]]]:
+        """Top N jobs for each text, scanning the mapped matrix block by block"""
+        if filtros is None:
+            filtros = [None] * len(textos)
+        k = min(top_n, self.n_rows)
+        if k <= 0:
+            return [[] for _ in textos]
+        vetores = self.vectorizer.transform([texto.lower() for texto in textos])
+        best_scores = np.full((len(textos), k), -np.inf, dtype=np.float32)
+        best_rows = np.full((len(textos), k), -1, dtype=np.int64)
+        filtered = [i for i, filtro in enumerate(filtros) if filtro]
+
+        for start in range(0, self.n_rows, self.chunk_rows):
+            end = min(start + self.chunk_rows, self.n_rows)
+            scores = (vetores @ self._rows_matrix(start, end).T).toarray()
+            for i in filtered:
+                mask = self._chunk_mask(filtros[i], start, end)
+                if mask is not None:
+                    scores[i, ~mask] = -np.inf
+            # Junta o top N corrente com o top N do bloco e fica só com os N melhores
+            top = top_k(scores, k)
+            merged_scores = np.concatenate([best_scores, np.take_along_axis(scores, top, axis=1)], axis=1)
+            merged_rows = np.concatenate([best_rows, top + start], axis=1)
+            keep = top_k(merged_scores, k)
+            best_scores = np.take_along_axis(merged_scores, keep, axis=1)
+            best_rows = np.take_along_axis(merged_rows, keep, axis=1)
+
+        resultados = []
+        for scores, rows in zip(best_scores, best_rows):
+            valid = np.isfinite(scores)
+            resultados.append(self.results_for_rows(rows[valid], scores[valid]))
+        return resultados
+
+    def results_for_rows(self, rows: np.ndarray, similaridades: np.ndarray) -> List[Dict[str, Any]]:
+        resultados = []
+        for row, similaridade in zip(np.asarray(rows).tolist(), np.asarray(similaridades).tolist()):
+            resultado = self._record(row)
+            resultado['similaridade'] = float(similaridade)
+            resultado['versao_catalogo'] = self.version
+            resultados.append(resultado)
+        return resultados
+
+
+if __name__ == '__main__':
+    import argparse
+    import resource
+
+    parser = argparse.ArgumentParser(description='Stream a job catalog CSV into a memory-mapped index')
+    parser.add_argument('csv', nargs='?', default='vagas_tecnologia_atualizado.csv')
+    parser.add_argument('--out', default='vagas_ooc')
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = StreamingJobIndex.build_and_save(args.csv, args.out, stop_words=stop_words, chunk_size=args.chunk_size)
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"Índice em {index.path}: {len(index)} vagas, {index.meta['nnz']} não-zeros, "
+          f"{time.perf_counter() - start:.1f}s, pico de memória {peak_mb:.0f} MB")
@@ -0,0 +1,61 @@
+import os
+import sys
+
+import pytest
+
+# Os módulos do bot ficam na raiz do repositório
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from job_index import JobIndex  # noqa: E402
+
+
+CATALOG = """id_vaga,nome_vaga,descricao,skills_necessarias,salario,modalidade,local
+1,Engenheiro de Dados,Pipelines de dados,"Python, SQL","R$ 7,683,00",Híbrido,Belo Horizonte
+2,Desenvolvedor Backend,APIs em Python,"Python, Docker","R$ 9.500,00",Remoto,Recife
+3,Analista de Suporte,Atendimento,"Redes, Linux","R$ 3.200,00",Presencial,São Paulo
+"""
+
+
+@pytest.fixture(scope='session')
+def catalog_path(tmp_path_factory) -> str:
+    path = tmp_path_factory.mktemp('catalogo') / 'vagas.csv'
+    path.write_text(CATALOG, encoding='utf-8')
+    return str(path)
+
+
+@pytest.fixture(scope='session')
+def job_index(catalog_path) -> JobIndex:
+    return JobIndex.build(catalog_path)
+
+
+@pytest.fixture(scope='session')
+def bot(tmp_path_factory):
+    """
+    The webhook bot over the test catalog. main.py resolves its files relative to the
+    working directory, so it is imported from a temporary one (catalog, sessions,
+    candidates and indexes all stay there).
+    """
+    workdir = tmp_path_factory.mktemp('bot')
+    (workdir / 'vagas_tecnologia_atualizado.csv').write_text(CATALOG, encoding='utf-8')
+    environ = dict(os.environ)
+    os.environ.update({
+        'PRELOAD_APP': '1',  # a importação só carrega o catálogo; o bot é criado abaixo
+        'CATALOG_POLL_INTERVAL': '0',
+        'SESSION_PATH': str(workdir / 'sessoes.db'),
+        'CANDIDATE_STORE': str(workdir / 'candidatos'),
+        'LLM_CACHE_PATH': '',
+        'EXTRACTION_MODE': 'local',
+        'WEB_CONCURRENCY': '1',
+        'ASYNC_REPLIES': '0',
+    })
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        import main
+        bot = main.init_bot()
+        yield bot
+        bot.session_store.close()
+    finally:
+        os.chdir(cwd)
+        os.environ.clear()
+        os.environ.update(environ)
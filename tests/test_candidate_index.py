@@ -0,0 +1,81 @@
+import threading
+
+import pytest
+
+from candidate_index import CandidateIndex
+from candidate_store import CandidateStore
+
+
+def candidate(i, cargo='Desenvolvedor Python', habilidades=('Python', 'Docker')):
+    return {'email': f'pessoa{i}@exemplo.com', 'nome_completo': f'Pessoa {i}', 'telefone': f'1199999{i:04d}',
+            'experiencias': [{'cargo': cargo, 'responsabilidades': 'APIs', 'habilidades': list(habilidades),
+                              'resultados': ''}]}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = CandidateStore(str(tmp_path / 'store'), shards=2)
+    for i in range(10):
+        store.append(candidate(i))
+    return store
+
+
+@pytest.fixture
+def index(store, tmp_path):
+    return CandidateIndex(store, path=str(tmp_path / 'candidatos.pkl'), refresh_interval=3600)
+
+
+def test_top_candidates(index, job_index):
+    assert index.top_candidates('999', job_index) is None
+    candidatos = index.top_candidates('2', job_index, top_n=3)
+    assert len(candidatos) == 3
+    assert all(c['similaridade'] > 0 for c in candidatos)
+
+
+def test_candidate_replaced_before_vectorized(store, index, job_index):
+    index.top_candidates('2', job_index)
+    # Dois cadastros do mesmo email antes da próxima consulta: a linha intermediária
+    # é substituída sem ter sido vetorizada
+    store.append(candidate(3, cargo='Analista de Suporte', habilidades=('Redes',)))
+    index.refresh()
+    store.append(candidate(3, cargo='Analista de Suporte', habilidades=('Redes', 'Linux')))
+    index.refresh()
+
+    for _ in range(2):
+        candidatos = index.top_candidates('3', job_index, top_n=1)
+        assert [c['email'] for c in candidatos] == ['pessoa3@exemplo.com']
+    assert len(index) == 10
+
+
+def test_refresh_skips_while_a_query_holds_the_index(store, index, job_index):
+    index.top_candidates('2', job_index)
+    store.append(candidate(20, cargo='Analista de Suporte', habilidades=('Redes', 'Linux')))
+
+    held, release = threading.Event(), threading.Event()
+
+    def busy():
+        with index._lock:
+            held.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=busy)
+    thread.start()
+    held.wait(5)
+    assert index.refresh(blocking=False) == 0
+    release.set()
+    thread.join()
+
+    # A consulta seguinte faz a leitura pendente, sem esperar o intervalo
+    assert index.top_candidates('3', job_index, top_n=1)[0]['email'] == 'pessoa20@exemplo.com'
+
+
+def test_changes_are_saved(store, index, job_index, tmp_path):
+    index.top_candidates('2', job_index)
+    store.append(candidate(30, cargo='Analista de Suporte', habilidades=('Redes', 'Linux')))
+    index.refresh()
+    index.top_candidates('2', job_index)
+
+    reloaded = CandidateIndex(store, path=index.path, refresh_interval=3600)
+    reloaded._ensure_ready(job_index)
+    assert len(reloaded) == 11
+    assert reloaded._last_seq == index._last_seq
@@ -0,0 +1,100 @@
+import os
+
+import pytest
+
+from candidate_store import CandidateStore
+
+
+def candidate(i, versao=0):
+    return {'email': f'Pessoa{i}@Exemplo.com', 'telefone': f'(11) 99999-{i:04d}', 'nome_completo': f'Pessoa {i}',
+            'versao': versao}
+
+
+@pytest.fixture
+def store(tmp_path):
+    # Segmentos pequenos para forçar rotação
+    store = CandidateStore(str(tmp_path / 'store'), shards=4, max_segment_bytes=1024)
+    for versao in range(3):
+        for i in range(20):
+            store.append(candidate(i, versao))
+    return store
+
+
+def latest(store):
+    return {record['key']: record['data'] for _, record in store.iter_latest()}
+
+
+def segment_files(store):
+    return [store.segment_path(shard, segment) for shard in range(store.shards) for segment in store._segments(shard)]
+
+
+def test_lookup_by_email_and_phone(store):
+    assert store.get_by_email(' pessoa3@exemplo.COM ')['versao'] == 2
+    assert store.get_by_phone('11999990003')['nome_completo'] == 'Pessoa 3'
+    assert store.get_by_email('ninguem@exemplo.com') is None
+    assert len(store) == 20
+
+
+def test_compact_keeps_latest_records(store):
+    antes = latest(store)
+    bytes_antes = sum(os.path.getsize(path) for path in segment_files(store))
+
+    stats = store.compact()
+    assert stats['registros_mantidos'] == 20
+    assert stats['bytes_antes'] == bytes_antes
+    assert stats['bytes_depois'] < bytes_antes
+    assert latest(store) == antes
+    assert store.get_by_phone('11999990007')['versao'] == 2
+
+    # Novos cadastros continuam no segmento ativo depois da compactação
+    store.append(candidate(7, versao=3))
+    assert store.get_by_email('pessoa7@exemplo.com')['versao'] == 3
+
+
+def test_reindex_rebuilds_the_index_from_segments(store):
+    antes = latest(store)
+    store._connection().execute('DELETE FROM records')
+    assert len(store) == 0
+
+    # Conta as linhas de todos os segmentos; o último cadastro de cada candidato vence
+    assert store.reindex() == {'registros': 60, 'linhas_descartadas': 0}
+    assert len(store) == 20
+    assert latest(store) == antes
+
+
+def test_reindex_after_compact_round_trip(store):
+    antes = latest(store)
+    store.compact()
+    assert store.reindex()['registros'] == 20
+    assert latest(store) == antes
+
+
+def test_reindex_skips_truncated_line(store):
+    path = segment_files(store)[-1]
+    with open(path, 'ab') as f:
+        f.write(b'{"key": "interrompido"')
+    assert store.reindex() == {'registros': 60, 'linhas_descartadas': 1}
+
+
+def test_append_after_torn_write(store):
+    antes = latest(store)
+    for shard in range(store.shards):
+        with open(store.segment_path(shard, store._segments(shard)[-1]), 'ab') as f:
+            f.write(b'{"key": "interrompido", "da')
+    # O próximo cadastro começa em uma linha própria, legível pelo índice e pelo reindex
+    store.append(candidate(4, versao=3))
+    assert store.get_by_email('pessoa4@exemplo.com')['versao'] == 3
+
+    stats = store.reindex()
+    assert stats == {'registros': 61, 'linhas_descartadas': store.shards}
+    assert latest(store) == {**antes, 'pessoa4@exemplo.com': candidate(4, versao=3)}
+
+
+def test_reader_follows_records_moved_by_compact(store):
+    # Posição lida do índice antes de uma compactação em outro processo
+    row = store._connection().execute(
+        "SELECT key, shard, segment, offset, length FROM records WHERE email = 'pessoa5@exemplo.com'"
+    ).fetchone()
+    store.compact()
+    assert not os.path.exists(store.segment_path(row[1], row[2]))
+    assert store._read_indexed(*row)['data'] == candidate(5, versao=2)
@@ -0,0 +1,46 @@
+import pytest
+
+from job_index import normalize_key, parse_salario, parse_salario_preferencia
+
+@pytest.mark.parametrize('valor, esperado', [
+    ('R$ 7,683,00', 7683.0),
+    ('R$ 7.683,00', 7683.0),
+    ('R$ 12.000', 12000.0),
+])
+def test_parse_salario(valor, esperado):
+    assert parse_salario(valor) == esperado
+
+
+@pytest.mark.parametrize('texto, esperado', [
+    ('8,5 mil', 8500.0),
+    ('1.5k', 1500.0),
+    ('10k', 10000.0),
+    ('5 mil reais', 5000.0),
+    ('R$ 5.000,00', 5000.0),
+    ('R$8000', 8000.0),
+    ('acima de 3000', 3000.0),
+    ('remoto, 2 anos', None),
+    ('tenho 25 anos', None),
+    ('15 milhões', None),
+])
+def test_parse_salario_preferencia(texto, esperado):
+    assert parse_salario_preferencia(normalize_key(texto)) == esperado
+
+
+def test_parse_preferencias(job_index):
+    assert job_index.parse_preferencias('Remoto em Recife, a partir de 8,5 mil') == {
+        'modalidade': ['remoto'], 'local': ['recife'], 'salario_minimo': 8500.0
+    }
+    assert job_index.parse_preferencias('remoto, 2 anos') == {'modalidade': ['remoto']}
+    assert job_index.parse_preferencias('não') == {}
+
+
+def test_salary_filter(job_index):
+    vagas = job_index.search('python', top_n=5, filtros=job_index.parse_preferencias('R$ 9.000'))
+    assert [vaga['id_vaga'] for vaga in vagas] == [2]
+
+
+def test_parse_preferencias_skills(job_index):
+    assert job_index.parse_preferencias('vagas com Docker ou Linux') == {'habilidades': ['docker', 'linux']}
+    vagas = job_index.search('python', top_n=5, filtros=job_index.parse_preferencias('linux'))
+    assert [vaga['id_vaga'] for vaga in vagas] == [3]
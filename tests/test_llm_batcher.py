@@ -0,0 +1,137 @@
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from llm_batcher import ExtractionBatcher
+from llm_cache import ExtractionCache
+from llm_client import LLMUnavailableError
+
+
+def batcher(process_batch, process_item, max_items=3):
+    # Janela longa: os pedidos enviados juntos no teste caem sempre no mesmo lote
+    return ExtractionBatcher(process_batch, process_item, max_items=max_items, max_wait_ms=500, workers=1)
+
+
+def no_fallback(item):
+    # AssertionError (e não pytest.fail) chega ao future em vez de travar o teste
+    raise AssertionError(f'item {item!r} refeito sem necessidade')
+
+
+def submit_all(b, messages):
+    return [b.submit(message) for message in messages]
+
+
+def test_batch_results_reach_their_callers():
+    batches = []
+
+    def process_batch(items):
+        batches.append(list(items))
+        return [{'cargo': item.upper()} for item in items]
+
+    b = batcher(process_batch, no_fallback)
+    futures = submit_all(b, ['a', 'b', 'c'])
+
+    assert [f.result(timeout=5) for f in futures] == [({'cargo': 'A'}, True), ({'cargo': 'B'}, True),
+                                                      ({'cargo': 'C'}, True)]
+    assert batches == [['a', 'b', 'c']]
+    assert b.stats()['lotes'] == 1
+
+
+def test_missing_item_is_retried_alone():
+    retried = []
+
+    def process_item(item):
+        retried.append(item)
+        return {'cargo': 'sozinho'}
+
+    b = batcher(lambda items: [{'cargo': 'A'}, None, {'cargo': 'C'}], process_item)
+    futures = submit_all(b, ['a', 'b', 'c'])
+
+    assert [f.result(timeout=5) for f in futures] == [({'cargo': 'A'}, True), ({'cargo': 'sozinho'}, False),
+                                                      ({'cargo': 'C'}, True)]
+    assert retried == ['b']
+    assert b.stats()['fallbacks_item'] == 1
+
+
+def test_unreadable_batch_falls_back_concurrently():
+    def process_batch(items):
+        raise ValueError('JSON inválido')
+
+    running = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def process_item(item):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.2)
+        with lock:
+            running -= 1
+        return {'cargo': item}
+
+    b = batcher(process_batch, process_item)
+    futures = submit_all(b, ['a', 'b', 'c'])
+
+    assert [f.result(timeout=5) for f in futures] == [({'cargo': 'a'}, False), ({'cargo': 'b'}, False),
+                                                      ({'cargo': 'c'}, False)]
+    assert peak == 3
+    assert b.stats()['fallbacks_item'] == 3
+
+
+def test_transport_error_reaches_every_future():
+    def process_batch(items):
+        raise LLMUnavailableError('disjuntor aberto')
+
+    b = batcher(process_batch, no_fallback)
+    futures = submit_all(b, ['a', 'b', 'c'])
+
+    for future in futures:
+        with pytest.raises(LLMUnavailableError):
+            future.result(timeout=5)
+    assert b.stats()['lotes_com_falha'] == 1
+
+
+class StubLLM:
+    def __init__(self, content):
+        self.content = content
+
+    def chat_completion(self, **kwargs):
+        return SimpleNamespace(choices=[SimpleNamespace(message={'content': self.content})])
+
+
+def test_batch_reply_is_split_by_item_number(bot, monkeypatch):
+    # O LLM devolve os itens fora de ordem e sem cargo para o segundo
+    content = json.dumps([{'item': 3, 'cargo': 'Analista'}, {'item': 1, 'cargo': 'Engenheiro'},
+                          {'item': 2, 'habilidades': ['Java']}])
+    monkeypatch.setattr(bot, 'llm_client', StubLLM(content))
+
+    resultados = bot._request_experience_batch(['primeiro', 'segundo', 'terceiro'])
+
+    assert [r and r['cargo'] for r in resultados] == ['Engenheiro', None, 'Analista']
+
+
+def test_batch_results_are_cached_under_the_batch_prompt(bot, monkeypatch):
+    monkeypatch.setattr(bot, 'extraction_cache', ExtractionCache())
+    monkeypatch.setattr(bot, 'extraction_batcher',
+                        batcher(lambda items: [{'cargo': 'do lote'} for _ in items],
+                                lambda item: {'cargo': 'sozinho'}, max_items=2))
+    # Duas mensagens simultâneas: as duas seguem no mesmo lote
+    messages = ['Trabalhei com Python', 'Trabalhei com Java']
+    threads = [threading.Thread(target=bot._parse_experience_with_prompt, args=(m,)) for m in messages]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    # Repetida com o lote ativo, a extração sai do cache
+    assert bot._parse_experience_with_prompt(messages[0]) == {'cargo': 'do lote'}
+
+    # Sem o lote, o resultado do prompt de lote não responde pelo prompt individual
+    monkeypatch.setattr(bot, 'extraction_batcher', None)
+    monkeypatch.setattr(bot, '_request_experience', lambda message: {'cargo': 'individual'})
+    assert bot._parse_experience_with_prompt(messages[0]) == {'cargo': 'individual'}
@@ -0,0 +1,106 @@
+import json
+import time
+
+from llm_cache import ExtractionCache, cache_key, normalize_text, warm_from_file
+
+
+def test_cache_key_ignores_trivial_differences():
+    assert normalize_text('  Trabalhei com\n\nPYTHON  ') == 'trabalhei com python'
+    assert cache_key('Trabalhei com  Python', 'modelo', 'prompt') == cache_key('trabalhei com python\n', 'modelo', 'prompt')
+
+
+def test_cache_key_depends_on_prompt_and_model():
+    base = cache_key('Trabalhei com Python', 'modelo', 'prompt')
+    assert cache_key('Trabalhei com Python', 'outro modelo', 'prompt') != base
+    assert cache_key('Trabalhei com Python', 'modelo', 'outro prompt') != base
+    # As partes são separadas: mover texto de uma para a outra muda a chave
+    assert cache_key('m', 'ab', 'c') != cache_key('m', 'a', 'bc')
+
+
+def test_memory_lru_evicts_least_recently_used():
+    cache = ExtractionCache(max_entries=2)
+    cache.put('a', {'cargo': 'A'})
+    cache.put('b', {'cargo': 'B'})
+    cache.get('a')
+    cache.put('c', {'cargo': 'C'})
+
+    assert cache.get('b') is None
+    assert cache.get('a') == {'cargo': 'A'}
+    assert cache.get('c') == {'cargo': 'C'}
+    assert cache.stats()['memory_entries'] == 2
+
+
+def test_values_are_copied():
+    cache = ExtractionCache()
+    value = {'habilidades': ['Python']}
+    cache.put('a', value)
+    value['habilidades'].append('SQL')
+    cache.get('a')['habilidades'].append('Docker')
+
+    assert cache.get('a') == {'habilidades': ['Python']}
+
+
+def test_disk_serves_entries_evicted_from_memory(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    cache = ExtractionCache(max_entries=1, path=path)
+    cache.put('a', {'cargo': 'A'})
+    cache.put('b', {'cargo': 'B'})
+
+    assert cache.get('a') == {'cargo': 'A'}
+    assert cache.stats()['disk_hits'] == 1
+
+    # E sobrevivem à reabertura do arquivo
+    reopened = ExtractionCache(path=path)
+    assert reopened.get('b') == {'cargo': 'B'}
+    assert reopened.stats()['disk_bytes'] == cache.stats()['disk_bytes']
+
+
+def test_disk_evicts_least_recently_accessed_beyond_max_bytes(tmp_path):
+    value = {'responsabilidades': 'x' * 100}
+    size = len(json.dumps(value).encode('utf-8'))
+    cache = ExtractionCache(max_entries=1, path=str(tmp_path / 'cache.db'), max_bytes=size * 5)
+    for key in 'abcde':
+        cache.put(key, value)
+        time.sleep(0.002)
+    # Acessar "a" o torna o mais recente no disco
+    cache.get('a')
+    time.sleep(0.002)
+    cache.put('f', value)
+
+    stats = cache.stats()
+    assert stats['disk_bytes'] <= size * 5 * 0.9
+    assert stats['disk_evictions'] == 2
+    assert cache.get('b') is None and cache.get('c') is None
+    assert all(cache.get(key) == value for key in 'adef')
+
+
+def test_warm_from_file_fills_the_extraction_cache(bot, monkeypatch, tmp_path):
+    calls = []
+
+    def request(message):
+        calls.append(message)
+        return {'cargo': 'Desenvolvedor', 'habilidades': [], 'responsabilidades': message, 'resultados': ''}
+
+    monkeypatch.setattr(bot, 'extraction_cache', ExtractionCache())
+    monkeypatch.setattr(bot, 'extraction_batcher', None)
+    monkeypatch.setattr(bot, '_request_experience', request)
+    history = tmp_path / 'mensagens.jsonl'
+    history.write_text('\n'.join([json.dumps({'message': 'Trabalhei com Python'}), '',
+                                  json.dumps({'outro': 'sem mensagem'}),
+                                  json.dumps({'message': 'Trabalhei com SQL'})]), encoding='utf-8')
+
+    assert warm_from_file(str(history), bot._parse_experience_with_prompt) == 2
+    assert calls == ['Trabalhei com Python', 'Trabalhei com SQL']
+
+    # A mesma mensagem, colada com outra caixa e espaços, já não chama o LLM
+    assert bot._parse_experience_with_prompt('trabalhei  com python')['responsabilidades'] == 'Trabalhei com Python'
+    assert len(calls) == 2
+
+
+def test_warm_from_plain_text(tmp_path):
+    history = tmp_path / 'mensagens.txt'
+    history.write_text('Trabalhei com Python\n\nTrabalhei com SQL\n', encoding='utf-8')
+    seen = []
+
+    assert warm_from_file(str(history), seen.append) == 2
+    assert seen == ['Trabalhei com Python', 'Trabalhei com SQL']
@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+import fake_llm
+from llm_client import LLMClient, CircuitBreaker, LLMUnavailableError
+
+
+RESET_TIMEOUT = 0.3
+
+
+@pytest.fixture
+def server():
+    server = fake_llm.serve(port=0, error_rate=1.0)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(server):
+    # Sem retentativas: cada chamada é exatamente uma falha ou um sucesso para o disjuntor
+    return LLMClient(
+        request_timeout=2, deadline=5, max_retries=0,
+        breaker=CircuitBreaker(failure_threshold=2, reset_timeout=RESET_TIMEOUT),
+        api_key='fake', api_base=f'http://127.0.0.1:{server.server_address[1]}/v1'
+    )
+
+
+def call(client):
+    return client.chat_completion(model='fake', messages=[{'role': 'user', 'content': 'Python e SQL'}])
+
+
+def served(server) -> int:
+    return server.RequestHandlerClass.requests
+
+
+def test_breaker_opens_after_consecutive_failures(server, client):
+    for _ in range(2):
+        with pytest.raises(Exception) as error:
+            call(client)
+        assert not isinstance(error.value, LLMUnavailableError)
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+    before = served(server)
+    with pytest.raises(LLMUnavailableError):
+        call(client)
+    # Circuito aberto: falha na hora, sem chegar ao servidor
+    assert served(server) == before
+    assert client.stats()['rejeitadas_circuito'] == 1
+
+
+def test_half_open_probe_reopens_on_failure(server, client):
+    for _ in range(2):
+        with pytest.raises(Exception):
+            call(client)
+    time.sleep(RESET_TIMEOUT + 0.05)
+    assert client.breaker.state == CircuitBreaker.HALF_OPEN
+
+    with pytest.raises(Exception) as error:
+        call(client)
+    assert not isinstance(error.value, LLMUnavailableError)
+    assert client.breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(LLMUnavailableError):
+        call(client)
+
+
+def test_half_open_probe_closes_on_success(server, client):
+    for _ in range(2):
+        with pytest.raises(Exception):
+            call(client)
+    time.sleep(RESET_TIMEOUT + 0.05)
+    server.RequestHandlerClass.error_rate = 0.0
+
+    response = call(client)
+    assert response['choices'][0]['message']['content']
+    assert client.breaker.state == CircuitBreaker.CLOSED
+    assert client.breaker.failures == 0
+    call(client)
+
+
+def test_half_open_allows_a_single_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.cancel()
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,63 @@
+import pytest
+
+from local_extractor import LocalExperienceExtractor
+
+
+@pytest.fixture
+def extractor():
+    return LocalExperienceExtractor(['Python', 'SQL', 'Docker', 'C++', 'Node.js'],
+                                    ['Engenheiro de Dados', 'Desenvolvedor Backend'])
+
+
+def test_confident_extraction(extractor):
+    data, confidence = extractor.extract(
+        'Fui Engenheiro de Dados usando Python, SQL e Docker. Reduzi o custo das consultas em 30%.')
+
+    assert data['cargo'] == 'Engenheiro de Dados'
+    assert data['habilidades'] == ['Python', 'SQL', 'Docker']
+    assert data['resultados'] == 'Reduzi o custo das consultas em 30%.'
+    assert confidence == 1.0
+
+
+def test_confidence_drops_with_missing_fields(extractor):
+    # Só o cargo e uma habilidade: 0.4 + 0.4 / 3
+    data, confidence = extractor.extract('Cargo: Analista. Usei C++ no dia a dia')
+
+    assert data['cargo'] == 'Analista'
+    assert data['habilidades'] == ['C++']
+    assert data['resultados'] == 'Resultados não detalhados'
+    assert confidence == pytest.approx(0.533, abs=0.001)
+
+    _, confidence = extractor.extract('Trabalhei em várias empresas')
+    assert confidence == 0.0
+
+
+@pytest.fixture
+def hybrid(bot, monkeypatch):
+    calls = []
+
+    def llm(message):
+        calls.append(message)
+        return {'cargo': 'do LLM', 'habilidades': [], 'responsabilidades': '', 'resultados': ''}
+
+    monkeypatch.setattr(bot, 'extraction_mode', 'hybrid')
+    monkeypatch.setattr(bot, 'local_extraction_threshold', 0.8)
+    monkeypatch.setattr(bot, '_parse_experience_with_prompt', llm)
+    return bot, calls
+
+
+def test_hybrid_keeps_local_extraction_above_threshold(hybrid):
+    bot, calls = hybrid
+    data = bot._extract_experience(
+        'Cargo: Desenvolvedor Backend. Criei APIs com Python, SQL e Docker e reduzi a latência em 40%.')
+
+    assert data['cargo'] == 'Desenvolvedor Backend'
+    assert calls == []
+
+
+def test_hybrid_falls_back_to_llm_below_threshold(hybrid):
+    bot, calls = hybrid
+    data = bot._extract_experience('Cargo: Desenvolvedor Backend. Trabalhei com Python')
+
+    assert data['cargo'] == 'do LLM'
+    assert calls == ['Cargo: Desenvolvedor Backend. Trabalhei com Python']
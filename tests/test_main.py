@@ -0,0 +1,90 @@
+import itertools
+
+import pytest
+
+
+_phones = itertools.count(1)
+
+
+@pytest.fixture
+def phone():
+    return f'whatsapp:+55119000{next(_phones):05d}'
+
+
+def converse(bot, phone, *messages):
+    return [bot.process_message(phone, message)['reply'] for message in messages]
+
+
+def register_experience(bot, phone):
+    converse(bot, phone, 'oi', 'pessoa@exemplo.com', 'Pessoa Teste', '10/05/1990',
+             'Cargo: Desenvolvedor Backend. Trabalhei com Python e Docker criando APIs')
+
+
+def test_no_more_experiences_lists_jobs_without_extra_question(bot, phone):
+    register_experience(bot, phone)
+    reply, = converse(bot, phone, 'não')
+    assert 'Vagas Compatíveis Encontradas' in reply
+    assert bot._load_state(phone)['current_step'] == 'selecionar_vaga'
+
+
+def test_preferences_stated_with_the_answer_filter_the_jobs(bot, phone):
+    register_experience(bot, phone)
+    assert bot.is_slow_step(phone, 'não, presencial em São Paulo')
+    reply, = converse(bot, phone, 'não, presencial em São Paulo')
+    assert 'Nenhuma vaga atende' not in reply
+    referencias = bot._load_state(phone)['vagas_compativeis']
+    assert [ref['id_vaga'] for ref in referencias] == [3]
+
+
+def test_unmatched_preferences_fall_back_to_the_closest_jobs(bot, phone):
+    register_experience(bot, phone)
+    reply, = converse(bot, phone, 'não, remoto acima de 20 mil')
+    assert reply.startswith('Nenhuma vaga atende a todas as suas preferências')
+    assert len(bot._load_state(phone)['vagas_compativeis']) == 3
+
+
+def test_preferences_step_is_opt_in(bot, phone, monkeypatch):
+    monkeypatch.setattr(bot, 'ask_preferences', True)
+    register_experience(bot, phone)
+    assert not bot.is_slow_step(phone, 'não')
+    reply, = converse(bot, phone, 'não')
+    assert 'preferência' in reply
+    assert bot.is_slow_step(phone, 'Recife')
+    converse(bot, phone, 'Recife')
+    assert [ref['id_vaga'] for ref in bot._load_state(phone)['vagas_compativeis']] == [2]
+
+
+def test_session_keeps_only_job_references(bot, phone):
+    register_experience(bot, phone)
+    converse(bot, phone, 'não')
+    state = bot._load_state(phone)
+    assert state['versao_catalogo'] == bot.catalog.current.version
+    assert all(set(ref) == {'id_vaga', 'similaridade'} for ref in state['vagas_compativeis'])
+
+    vaga = bot._resolver_vaga(state['vagas_compativeis'][0])
+    assert vaga['nome_vaga'] == 'Desenvolvedor Backend'
+    assert vaga['similaridade'] == state['vagas_compativeis'][0]['similaridade']
+    reply, = converse(bot, phone, '1')
+    assert reply.startswith('Você se candidatou à vaga: Desenvolvedor Backend!')
+
+
+def test_old_session_with_full_job_is_still_accepted(bot, phone):
+    vaga = {'id_vaga': 2, 'nome_vaga': 'Desenvolvedor Backend', 'salario': 'R$ 9.500,00', 'modalidade': 'Remoto',
+            'local': 'Recife', 'skills_necessarias': 'Python, Docker', 'similaridade': 0.8}
+    bot._save_state(phone, {'current_step': 'selecionar_vaga', 'vagas_compativeis': [vaga]})
+
+    reply, = converse(bot, phone, '1')
+    assert reply.startswith('Você se candidatou à vaga: Desenvolvedor Backend!')
+
+
+def test_job_removed_from_catalog_is_reported(bot, phone):
+    bot._save_state(phone, {'current_step': 'selecionar_vaga', 'versao_catalogo': 'antiga',
+                            'vagas_compativeis': [{'id_vaga': 99, 'similaridade': 0.5},
+                                                  {'id_vaga': 3, 'similaridade': 0.2}]})
+
+    assert bot._resolver_vaga({'id_vaga': 99, 'similaridade': 0.5}) is None
+    reply, = converse(bot, phone, '1')
+    assert reply == "Essa vaga não está mais disponível. Por favor, escolha outro número da lista."
+    # A sessão continua na seleção, e as demais vagas da lista seguem válidas
+    reply, = converse(bot, phone, '2')
+    assert reply.startswith('Você se candidatou à vaga: Analista de Suporte!')
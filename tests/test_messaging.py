@@ -0,0 +1,145 @@
+import threading
+import time
+
+import pytest
+
+from messaging import AsyncReplyDispatcher, RecentMessages, SqliteRecentMessages, StubMessageSender
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'condição não atingida a tempo'
+        time.sleep(0.01)
+
+
+def test_replies_of_one_phone_run_serially_in_order():
+    sender = StubMessageSender(echo=False)
+    dispatcher = AsyncReplyDispatcher(sender, max_workers=4)
+    running = []
+    overlaps = []
+
+    def reply(text, delay):
+        def produce():
+            if running:
+                overlaps.append(text)
+            running.append(text)
+            # As primeiras demoram mais: em paralelo, as respostas sairiam invertidas
+            time.sleep(delay)
+            running.remove(text)
+            return text
+        return produce
+
+    futures = [dispatcher.submit('+5511', reply(f'm{i}', 0.05 - i * 0.01)) for i in range(5)]
+    for future in futures:
+        future.result(timeout=5)
+
+    assert sender.sent == [('+5511', f'm{i}') for i in range(5)]
+    assert overlaps == []
+    dispatcher.shutdown()
+
+
+def test_phones_do_not_wait_for_each_other():
+    sender = StubMessageSender(echo=False)
+    dispatcher = AsyncReplyDispatcher(sender, max_workers=2)
+    release = threading.Event()
+
+    blocked = dispatcher.submit('+5511', lambda: release.wait(5) and 'lento')
+    dispatcher.submit('+5521', lambda: 'rápido').result(timeout=5)
+
+    assert sender.sent == [('+5521', 'rápido')]
+    release.set()
+    blocked.result(timeout=5)
+    dispatcher.shutdown()
+
+
+def test_has_pending_until_the_last_reply_is_sent():
+    sender = StubMessageSender(echo=False)
+    dispatcher = AsyncReplyDispatcher(sender, max_workers=2)
+    release = threading.Event()
+
+    assert not dispatcher.has_pending('+5511')
+    dispatcher.submit('+5511', lambda: release.wait(5) and 'primeira')
+    last = dispatcher.submit('+5511', lambda: 'segunda')
+    assert dispatcher.has_pending('+5511')
+    assert not dispatcher.has_pending('+5521')
+
+    release.set()
+    last.result(timeout=5)
+    wait_until(lambda: not dispatcher.has_pending('+5511'))
+    assert [body for _, body in sender.sent] == ['primeira', 'segunda']
+    dispatcher.shutdown()
+
+
+def test_error_reply_when_produce_reply_raises():
+    sender = StubMessageSender(echo=False)
+    dispatcher = AsyncReplyDispatcher(sender, max_workers=2, error_reply='erro')
+
+    def fail():
+        raise RuntimeError('falha no passo')
+
+    dispatcher.submit('+5511', fail).result(timeout=5)
+    # A fila do telefone segue atendendo depois do erro
+    dispatcher.submit('+5511', lambda: 'depois').result(timeout=5)
+
+    assert sender.sent == [('+5511', 'erro'), ('+5511', 'depois')]
+    wait_until(lambda: not dispatcher.has_pending('+5511'))
+    dispatcher.shutdown()
+
+
+@pytest.fixture(params=['memoria', 'sqlite'])
+def recent(request, tmp_path):
+    if request.param == 'sqlite':
+        return lambda max_entries=10000: SqliteRecentMessages(str(tmp_path / 'mensagens.db'), max_entries)
+    return RecentMessages
+
+
+def test_retry_gets_the_stored_reply(recent):
+    messages = recent()
+    assert messages.claim('SM1') == (True, None)
+    # Reenvio enquanto a primeira ainda está em andamento: sem resposta, sem reprocessar
+    assert messages.claim('SM1') == (False, None)
+
+    messages.complete('SM1', 'resposta')
+    assert messages.claim('SM1') == (False, 'resposta')
+    assert messages.duplicates == 2
+
+
+def test_failed_message_is_released(recent):
+    messages = recent()
+    messages.claim('SM1')
+    messages.release('SM1')
+
+    assert messages.claim('SM1') == (True, None)
+
+
+def test_lru_respects_max_entries():
+    messages = RecentMessages(max_entries=3)
+    for sid in ('SM1', 'SM2', 'SM3'):
+        messages.claim(sid)
+    # O reenvio de SM1 o torna o mais recente: quem sai é SM2
+    messages.claim('SM1')
+    messages.claim('SM4')
+
+    assert list(messages._replies) == ['SM3', 'SM1', 'SM4']
+    assert messages.claim('SM2') == (True, None)
+
+
+def test_sqlite_prunes_beyond_max_entries(tmp_path):
+    messages = SqliteRecentMessages(str(tmp_path / 'mensagens.db'), max_entries=10)
+    for i in range(100):
+        messages.claim(f'SM{i}')
+
+    # A poda roda a cada 100 registros e mantém só os `max_entries` mais novos
+    assert messages.claim('SM89') == (True, None)
+    assert messages.claim('SM95') == (False, None)
+
+
+def test_sqlite_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / 'mensagens.db')
+    first, second = SqliteRecentMessages(path), SqliteRecentMessages(path)
+    first.claim('SM1')
+    first.complete('SM1', 'resposta')
+
+    # O reenvio cai em outro worker
+    assert second.claim('SM1') == (False, 'resposta')
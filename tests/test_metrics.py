@@ -0,0 +1,93 @@
+import time
+
+import pytest
+
+from metrics import MetricsRegistry, SamplingProfiler
+
+
+def test_counter_renders_labels_escaped_and_sorted():
+    registry = MetricsRegistry()
+    counter = registry.counter('bot_mensagens_total', 'Mensagens recebidas', ('passo',))
+    counter.inc(passo='nome')
+    counter.inc(2, passo='email')
+    counter.inc(passo='com "aspas"\n')
+
+    assert registry.render() == (
+        '# HELP bot_mensagens_total Mensagens recebidas\n'
+        '# TYPE bot_mensagens_total counter\n'
+        'bot_mensagens_total{passo="com \\"aspas\\"\\n"} 1\n'
+        'bot_mensagens_total{passo="email"} 2\n'
+        'bot_mensagens_total{passo="nome"} 1\n'
+    )
+    assert counter.value(passo='email') == 2
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram('bot_latencia_segundos', 'Latência', ('passo',), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, passo='experiencia')
+
+    assert histogram.samples() == [
+        'bot_latencia_segundos_bucket{passo="experiencia",le="0.1"} 2',
+        'bot_latencia_segundos_bucket{passo="experiencia",le="1"} 3',
+        'bot_latencia_segundos_bucket{passo="experiencia",le="+Inf"} 4',
+        'bot_latencia_segundos_sum{passo="experiencia"} 3.650000',
+        'bot_latencia_segundos_count{passo="experiencia"} 4',
+    ]
+
+
+def test_gauge_reads_at_collection_time():
+    registry = MetricsRegistry()
+    queue = []
+    registry.gauge('bot_fila', 'Tamanho da fila', lambda: len(queue))
+    registry.gauge('bot_disjuntor', 'Estado do disjuntor', lambda: {('aberto',): 1, ('fechado',): 0}, ('estado',))
+
+    def broken():
+        raise RuntimeError('indisponível')
+
+    registry.gauge('bot_quebrado', 'Leitura com erro', broken)
+    queue.extend([1, 2])
+
+    lines = registry.render().splitlines()
+    assert 'bot_fila 2' in lines
+    assert 'bot_disjuntor{estado="aberto"} 1' in lines
+    assert 'bot_disjuntor{estado="fechado"} 0' in lines
+    # Uma leitura com erro fica sem amostras, sem derrubar o resto da coleta
+    assert lines[-2:] == ['# HELP bot_quebrado Leitura com erro', '# TYPE bot_quebrado gauge']
+
+
+def test_duplicate_metric_is_refused():
+    registry = MetricsRegistry()
+    registry.counter('bot_mensagens_total', 'Mensagens recebidas')
+    with pytest.raises(ValueError):
+        registry.counter('bot_mensagens_total', 'De novo')
+
+
+def test_profiler_takes_only_the_matching_request():
+    profiler = SamplingProfiler()
+    assert not profiler.take(telefone='+5511', passo='experiencia')
+
+    profiler.arm(telefone='+5511', passo='experiencia')
+    assert not profiler.take(telefone='+5511', passo='nome')
+    assert not profiler.take(telefone='+5521', passo='experiencia')
+    assert profiler.take(telefone='+5511', passo='experiencia')
+    # Armado para uma única requisição
+    assert not profiler.armed
+
+
+def test_profiler_records_the_profiled_function():
+    profiler = SamplingProfiler(interval=0.001)
+
+    def busy_step():
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            pass
+
+    with profiler.profile('+5511 experiencia'):
+        busy_step()
+
+    [result] = profiler.results()
+    assert result['requisicao'] == '+5511 experiencia'
+    assert result['amostras'] > 0
+    assert result['funcoes'][0]['funcao'].startswith('busy_step ')
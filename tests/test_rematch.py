@@ -0,0 +1,96 @@
+import csv
+
+import pytest
+
+from candidate_store import CandidateStore
+from rematch import RematchState, rematch
+from conftest import CATALOG
+
+
+NEW_JOB = '4,Engenheiro de Dados Sênior,Pipelines de dados em nuvem,"Python, SQL","R$ 12.000,00",Remoto,Recife\n'
+
+
+def candidate(i, cargo, habilidades):
+    return {'email': f'pessoa{i}@exemplo.com', 'nome_completo': f'Pessoa {i}', 'telefone': f'1199999{i:04d}',
+            'experiencias': [{'cargo': cargo, 'responsabilidades': 'Projetos', 'habilidades': list(habilidades),
+                              'resultados': ''}]}
+
+
+@pytest.fixture
+def paths(tmp_path):
+    (tmp_path / 'vagas.csv').write_text(CATALOG, encoding='utf-8')
+    store = CandidateStore(str(tmp_path / 'store'), shards=2)
+    store.append(candidate(1, 'Engenheiro de Dados', ['Python', 'SQL']))
+    store.append(candidate(2, 'Desenvolvedor Backend', ['Python', 'Docker']))
+    store.append(candidate(3, 'Analista de Suporte', ['Redes', 'Linux']))
+    return tmp_path
+
+
+def run(paths, **kwargs):
+    return rematch(str(paths / 'store'), str(paths / 'vagas.csv'), str(paths / 'vagas_index.pkl'),
+                   str(paths / 'rematch_state.db'), str(paths / 'matches.csv'), top_n=2, workers=1, **kwargs)
+
+
+def matches(paths):
+    with open(paths / 'matches.csv', newline='', encoding='utf-8') as f:
+        return {(row['email'], row['id_vaga']): float(row['similaridade']) for row in csv.DictReader(f)}
+
+
+def test_unchanged_run_keeps_previous_results(paths):
+    first = run(paths)
+    assert (first['candidatos'], first['completos']) == (3, 3)
+    before = matches(paths)
+
+    second = run(paths)
+    assert (second['completos'], second['incrementais'], second['inalterados']) == (0, 0, 3)
+    assert matches(paths) == before
+
+
+def test_only_new_or_changed_candidates_are_recomputed(paths):
+    run(paths)
+    before = matches(paths)
+
+    store = CandidateStore(str(paths / 'store'), shards=2)
+    store.append(candidate(3, 'Desenvolvedor Backend', ['Python', 'Docker']))
+    store.append(candidate(4, 'Analista de Suporte', ['Linux']))
+    stats = run(paths)
+
+    assert (stats['candidatos'], stats['completos'], stats['inalterados']) == (4, 2, 2)
+    after = matches(paths)
+    assert ('pessoa3@exemplo.com', '2') in after
+    assert ('pessoa4@exemplo.com', '3') in after
+    # Os inalterados mantêm as linhas da execução anterior
+    for email in ('pessoa1@exemplo.com', 'pessoa2@exemplo.com'):
+        assert {k: v for k, v in after.items() if k[0] == email} == {k: v for k, v in before.items() if k[0] == email}
+
+
+def test_new_job_is_merged_into_previous_top(paths):
+    run(paths)
+    before = matches(paths)
+
+    with open(paths / 'vagas.csv', 'a', encoding='utf-8') as f:
+        f.write(NEW_JOB)
+    stats = run(paths)
+
+    # Só a vaga nova é comparada com cada candidato
+    assert stats['vagas_alteradas'] == 1
+    assert (stats['completos'], stats['incrementais']) == (0, 3)
+    after = matches(paths)
+    assert ('pessoa1@exemplo.com', '4') in after
+    # As vagas mantidas no top N conservam o score da execução anterior
+    assert all(before[key] == score for key, score in after.items() if key[1] != '4')
+    assert all(len([k for k in after if k[0] == email]) == 2 for email, _ in before)
+
+
+def test_removed_candidates_are_forgotten(paths, tmp_path):
+    run(paths)
+    # Outro store, sem a pessoa 3: o mesmo estado fica com dois candidatos
+    store = CandidateStore(str(tmp_path / 'outro'), shards=2)
+    store.append(candidate(1, 'Engenheiro de Dados', ['Python', 'SQL']))
+    store.append(candidate(2, 'Desenvolvedor Backend', ['Python', 'Docker']))
+    stats = rematch(str(tmp_path / 'outro'), str(paths / 'vagas.csv'), str(paths / 'vagas_index.pkl'),
+                    str(paths / 'rematch_state.db'), str(paths / 'matches.csv'), top_n=2, workers=1)
+
+    assert stats['candidatos_removidos'] == 1
+    assert {email for email, _ in matches(paths)} == {'pessoa1@exemplo.com', 'pessoa2@exemplo.com'}
+    assert RematchState(str(paths / 'rematch_state.db')).get_meta('run_id') == '2'
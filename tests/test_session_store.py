@@ -0,0 +1,126 @@
+import threading
+
+import pytest
+
+from session_store import CachedSessionStore, SqliteSessionStore, create_session_store
+
+
+class FlakySqliteStore(SqliteSessionStore):
+    """SQLite store whose batch writes can be made to fail"""
+
+    fail = False
+
+    def set_many(self, states):
+        if self.fail:
+            raise OSError('disco cheio')
+        super().set_many(states)
+
+
+@pytest.fixture
+def backend(tmp_path):
+    return FlakySqliteStore(str(tmp_path / 'sessoes.db'))
+
+
+@pytest.fixture
+def cache(backend):
+    # Intervalo longo: os flushes do teste são explícitos, nunca da thread
+    cache = CachedSessionStore(backend, max_entries=2, flush_interval=3600)
+    yield cache
+    backend.fail = False
+    cache.close()
+
+
+def test_write_behind_until_flush(backend, cache):
+    cache.set('5511900000001', {'step': 'email'})
+    assert cache.get('5511900000001') == {'step': 'email'}
+    assert backend.get('5511900000001') is None
+
+    cache.flush()
+    assert backend.get('5511900000001') == {'step': 'email'}
+    assert cache.stats()['dirty'] == 0
+
+
+def test_cached_state_is_a_copy(cache):
+    state = {'step': 'email', 'data': {}}
+    cache.set('5511900000001', state)
+    state['data']['email'] = 'mudou@exemplo.com'
+    cache.get('5511900000001')['step'] = 'nome'
+    assert cache.get('5511900000001') == {'step': 'email', 'data': {}}
+
+
+def test_evicted_dirty_entries_are_still_read_and_flushed(backend, cache):
+    for i in range(3):
+        cache.set(f'551190000000{i}', {'step': i})
+    stats = cache.stats()
+    assert stats['entries'] == 2 and stats['evictions'] == 1 and stats['dirty'] == 3
+
+    # A entrada despejada antes do flush ainda é lida do cache, não do backend vazio
+    assert cache.get('5511900000000') == {'step': 0}
+    cache.flush()
+    assert [backend.get(f'551190000000{i}') for i in range(3)] == [{'step': 0}, {'step': 1}, {'step': 2}]
+
+
+def test_failed_flush_is_requeued(backend, cache):
+    cache.set('5511900000001', {'step': 'email'})
+    cache.set('5511900000002', {'step': 'nome'})
+    cache.set('5511900000003', {'step': 'telefone'})  # despeja o primeiro, ainda sujo
+
+    backend.fail = True
+    with pytest.raises(OSError):
+        cache.flush()
+    assert cache.stats()['flush_errors'] == 1
+    assert cache.stats()['dirty'] == 3
+
+    # Gravado de novo durante a falha: vale o estado mais novo
+    cache.set('5511900000002', {'step': 'experiencia'})
+    backend.fail = False
+    cache.flush()
+    assert backend.get('5511900000001') == {'step': 'email'}
+    assert backend.get('5511900000002') == {'step': 'experiencia'}
+    assert backend.get('5511900000003') == {'step': 'telefone'}
+    assert cache.stats()['dirty'] == 0
+
+
+def test_close_flushes_pending_writes(tmp_path):
+    path = str(tmp_path / 'sessoes.db')
+    cache = CachedSessionStore(SqliteSessionStore(path), flush_interval=3600)
+    cache.set('5511900000001', {'step': 'email'})
+    cache.close()
+    assert SqliteSessionStore(path).get('5511900000001') == {'step': 'email'}
+
+
+def test_cache_skipped_with_several_processes(tmp_path):
+    path = str(tmp_path / 'sessoes.db')
+    assert isinstance(create_session_store('sqlite', path, cache_size=10, processes=2), SqliteSessionStore)
+    store = create_session_store('sqlite', path, cache_size=10, flush_interval=3600)
+    assert isinstance(store, CachedSessionStore)
+    store.close()
+
+
+def test_entries_being_flushed_are_still_read_from_the_cache(tmp_path):
+    class SlowStore(SqliteSessionStore):
+        def __init__(self, path):
+            super().__init__(path)
+            self.writing, self.release = threading.Event(), threading.Event()
+
+        def set_many(self, states):
+            self.writing.set()
+            self.release.wait(5)
+            super().set_many(states)
+
+    backend = SlowStore(str(tmp_path / 'sessoes.db'))
+    cache = CachedSessionStore(backend, max_entries=1, flush_interval=3600)
+    cache.set('5511900000001', {'step': 'email'})
+    cache.set('5511900000002', {'step': 'nome'})  # despeja o primeiro, ainda sujo
+
+    flush = threading.Thread(target=cache.flush)
+    flush.start()
+    assert backend.writing.wait(5)
+    # O lote ainda não chegou ao backend: a leitura não pode cair nele
+    assert cache.get('5511900000001') == {'step': 'email'}
+    backend.release.set()
+    flush.join()
+
+    assert cache.stats()['entries'] == 1
+    assert cache.get('5511900000001') == {'step': 'email'}
+    cache.close()
@@ -0,0 +1,87 @@
+import csv
+import random
+
+import pytest
+
+from job_index import JobIndex, stop_words
+from streaming_index import StreamingJobIndex
+
+
+TITLES = ['Engenheiro de Dados', 'Desenvolvedor Backend', 'Analista de Suporte', 'Cientista de Dados',
+          'Desenvolvedor Frontend', 'Engenheiro DevOps']
+SKILLS = ['Python', 'SQL', 'Docker', 'Linux', 'React', 'Java', 'Kubernetes', 'Redes', 'C++']
+PLACES = ['Recife', 'São Paulo', 'Belo Horizonte', 'Curitiba']
+MODES = ['Remoto', 'Híbrido', 'Presencial']
+QUERIES = ['Desenvolvedor Python com Docker', 'Analista de suporte em redes Linux', 'Engenheiro de dados SQL',
+           'Frontend React', 'Kubernetes e C++']
+
+
+@pytest.fixture(scope='module')
+def catalog(tmp_path_factory):
+    rng = random.Random(7)
+    path = tmp_path_factory.mktemp('paridade') / 'vagas.csv'
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id_vaga', 'nome_vaga', 'descricao', 'skills_necessarias', 'salario', 'modalidade', 'local'])
+        for i in range(1, 301):
+            skills = rng.sample(SKILLS, 3)
+            salario = f"R$ {rng.randint(2, 20)}.{rng.choice(['000', '500'])},00" if i % 10 else 'A combinar'
+            writer.writerow([i, rng.choice(TITLES), f'Atuação com {skills[0]} e {rng.choice(TITLES).lower()}',
+                             ', '.join(skills), salario, rng.choice(MODES), rng.choice(PLACES)])
+    return str(path)
+
+
+@pytest.fixture(scope='module')
+def indexes(catalog, tmp_path_factory):
+    memory = JobIndex.build(catalog, stop_words=stop_words)
+    # Blocos pequenos: a busca precisa juntar o top N de vários blocos
+    streaming = StreamingJobIndex.build(catalog, str(tmp_path_factory.mktemp('ooc')), stop_words=stop_words,
+                                        chunk_size=64)
+    streaming.chunk_rows = 50
+    return memory, streaming
+
+
+def ranked(resultados):
+    # Vagas empatadas podem sair em qualquer ordem entre si, e as sem nenhum termo em
+    # comum (similaridade 0) completam o top N em qualquer escolha
+    return len(resultados), sorted(((round(r['similaridade'], 4), r['id_vaga']) for r in resultados
+                                    if r['similaridade'] > 0), key=lambda r: (-r[0], r[1]))
+
+
+def test_same_results_without_filters(indexes):
+    memory, streaming = indexes
+    esperado = memory.search_batch(QUERIES, top_n=10)
+    obtido = streaming.search_batch(QUERIES, top_n=10)
+
+    assert [ranked(b) for b in obtido] == [ranked(a) for a in esperado]
+    registros = {r['id_vaga']: r for resultados in esperado for r in resultados}
+    for r in (r for resultados in obtido for r in resultados):
+        assert {k: v for k, v in r.items() if k not in ('similaridade', 'versao_catalogo')} == \
+            {k: v for k, v in registros[r['id_vaga']].items() if k not in ('similaridade', 'versao_catalogo')}
+
+
+@pytest.mark.parametrize('filtros', [
+    {'modalidade': 'remoto'},
+    {'local': ['Recife', 'Curitiba']},
+    {'habilidades': ['docker', 'c++']},
+    {'salario_minimo': 12000},
+    {'modalidade': 'Híbrido', 'local': 'São Paulo', 'salario_minimo': 5000},
+    {'habilidades': ['java'], 'modalidade': ['presencial', 'remoto']},
+    {'local': 'Manaus'},
+])
+def test_same_results_with_filters(indexes, filtros):
+    memory, streaming = indexes
+    esperado = memory.search_batch(QUERIES, top_n=10, filtros=[filtros] * len(QUERIES))
+    obtido = streaming.search_batch(QUERIES, top_n=10, filtros=[filtros] * len(QUERIES))
+
+    assert [ranked(b) for b in obtido] == [ranked(a) for a in esperado]
+
+
+def test_same_preferences_and_lookups(indexes):
+    memory, streaming = indexes
+    for texto in ('remoto em Recife acima de 8 mil', 'presencial, São Paulo, Docker ou Linux', 'tanto faz'):
+        assert streaming.parse_preferencias(texto) == memory.parse_preferencias(texto)
+    assert streaming.catalog_terms() == memory.catalog_terms()
+
+    for id_vaga in (1, '150', 300, 999):
+        assert streaming.row_of(id_vaga) == memory.row_of(id_vaga)